@@ -5,13 +5,35 @@ import xml.etree.ElementTree as ET
 import uuid
 import io
 import base64
+import hashlib
+import itertools
+import json
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
 import numpy as np
 from PIL import Image
 from werkzeug.utils import secure_filename
 
+from batch_process import process_files, records_to_rows, rows_to_csv, summarize_result
+from inkscape_pool import InkscapePool, InkscapePoolBusyError
+from jobs import JobManager
+from mask_algebra import LayerMasks, MaskCache
+from pdf_layers import PdfLayerDocument, PdfLayersUnsupported, available as pdf_layers_available
+from renderer_slots import RendererSlots
+from metrics import Counter, Gauge, Histogram, Registry, current_trace, start_trace, submit_in_context
+from result_cache import ResultCache, finish_cache_key, make_cache_key
+from svg_assembly import get_assembler
+from svg_stream import LazyPayloadStore, parse_svg_streaming, resolve_lazy_payloads
+from upload_stream import UploadCancelled, UploadError, UploadStream, UploadTooLargeError, inspect_ai_header
+from vector_area import VectorAreaEngine, parse_length
+
 # --- Flask 앱 설정 ---
 # Render 배포 환경에 맞게 static 폴더를 지정합니다.
 app = Flask(__name__, static_folder='static', static_url_path='')
@@ -23,145 +45,1823 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 SVG_OUTPUT_FOLDER = os.path.join(BASE_DIR, 'converted_svgs')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+RESULT_CACHE_FOLDER = os.path.join(BASE_DIR, 'result_cache')
 os.makedirs(SVG_OUTPUT_FOLDER, exist_ok=True)
 
+# --- 파이프라인 모드 ---
+# 'memory': 업로드/중간 SVG/PNG를 파이프(stdin/stdout)와 메모리 버퍼로 주고받습니다.
+#           여러 파일을 한 번에 내보내야 할 때만 tmpfs(/dev/shm)의 임시 파일을 씁니다.
+# 'disk': 기존처럼 uploads/, converted_svgs/ 에 임시 파일을 씁니다. (디버깅용)
+PIPELINE_MODE = os.environ.get('PIPELINE_MODE', 'memory')
+# disk 모드에서 중간 파일을 지우지 않고 남겨둘지 여부
+KEEP_DEBUG_FILES = os.environ.get('KEEP_DEBUG_FILES', '0') == '1'
+
+if PIPELINE_MODE == 'memory' and os.path.isdir('/dev/shm'):
+    SCRATCH_FOLDER = os.path.join('/dev/shm', 'bus_ad_scratch')
+else:
+    SCRATCH_FOLDER = SVG_OUTPUT_FOLDER
+os.makedirs(SCRATCH_FOLDER, exist_ok=True)
+
+# --- 업로드 제한 ---
+# MAX_UPLOAD_MB 를 넘는 요청은 본문을 읽기 전에(Content-Length) 또는 읽는 도중에 413 으로 거절합니다.
+# 파일 앞부분 HEADER_SNIFF_BYTES 만 보고 형식/페이지 정보를 확인한 뒤에야 Inkscape 를 실행합니다.
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', '200'))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+HEADER_SNIFF_BYTES = 64 * 1024
+
+def remove_temp_files(*paths):
+    if KEEP_DEBUG_FILES and PIPELINE_MODE == 'disk':
+        return
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+# --- 계측: 단계별 시간 / Inkscape 호출 / HTTP 요청 지연 ---
+# 값은 /metrics 에서 Prometheus 텍스트 형식으로 내보냅니다. (gunicorn 워커 프로세스별 값)
+# 요청에 timings=1 이 있으면 그 요청의 단계별/레이어별 시간도 응답의 "timings" 에 넣습니다.
+metrics_registry = Registry()
+HTTP_SECONDS = metrics_registry.register(Histogram(
+    'bus_ad_http_request_seconds', "HTTP request latency", ['endpoint', 'method', 'status']))
+HTTP_IN_FLIGHT = metrics_registry.register(Gauge(
+    'bus_ad_http_requests_in_flight', "HTTP requests being served"))
+STAGE_SECONDS = metrics_registry.register(Histogram(
+    'bus_ad_stage_seconds', "Processing stage duration (chunk stages are per worker)", ['stage']))
+INKSCAPE_SECONDS = metrics_registry.register(Histogram(
+    'bus_ad_inkscape_call_seconds', "Inkscape call duration", ['kind', 'status']))
+INKSCAPE_IN_FLIGHT = metrics_registry.register(Gauge(
+    'bus_ad_inkscape_calls_in_flight', "Inkscape calls in progress (cli/pipe/convert each run a process)", ['kind']))
+PROCESSING_ERRORS = metrics_registry.register(Counter(
+    'bus_ad_processing_errors_total', "Failed document processing", ['stage']))
+REJECTED_UPLOADS = metrics_registry.register(Counter(
+    'bus_ad_rejected_uploads_total', "Uploads rejected before conversion", ['reason']))
+DOCUMENTS = metrics_registry.register(Counter(
+    'bus_ad_documents_total', "Processed documents by layer source", ['source']))
+SHED_REQUESTS = metrics_registry.register(Counter(
+    'bus_ad_shed_requests_total', "Requests rejected with 503 before processing", ['reason']))
+
+def record_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+@contextmanager
+def stage_timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+# Inkscape 호출 하나 (kind: 'cli', 'shell', 'pipe', 'convert')
+# 렌더러 슬롯을 얻은 뒤부터 잽니다. (슬롯을 기다린 시간은 'slot_wait' 단계)
+@contextmanager
+def inkscape_call(kind):
+    with renderer_slot():
+        with inkscape_call_timer(kind):
+            yield
+
+@contextmanager
+def inkscape_call_timer(kind):
+    started = time.perf_counter()
+    status = 'error'
+    with INKSCAPE_IN_FLIGHT.track(kind=kind):
+        try:
+            yield
+            status = 'ok'
+        finally:
+            seconds = time.perf_counter() - started
+            INKSCAPE_SECONDS.observe(seconds, kind=kind, status=status)
+            trace = current_trace()
+            if trace is not None:
+                trace.add_subprocess(kind, seconds)
+
+def record_layer_timing(index, **timings):
+    trace = current_trace()
+    if trace is not None:
+        trace.add_layer(index, **timings)
+
 # --- SVG 네임스페이스 ---
 ns = {
     'svg': 'http://www.w3.org/2000/svg',
     'inkscape': 'http://www.inkscape.org/namespaces/inkscape'
 }
 
+# --- 렌더링 엔진 설정 ---
+# 'inkscape': Inkscape 프로세스 한 번으로 모든 레이어를 일괄 내보내기
+# 'cairosvg': 별도 프로세스 없이 cairosvg로 직접 래스터화
+RENDER_ENGINE = os.environ.get('RENDER_ENGINE', 'inkscape')
+
+# --- Inkscape 워커 풀 설정 ---
+# INKSCAPE_POOL_SIZE 가 0이면 풀 없이 매번 inkscape 프로세스를 실행합니다.
+INKSCAPE_POOL_SIZE = int(os.environ.get('INKSCAPE_POOL_SIZE', '0'))
+INKSCAPE_QUEUE_SIZE = int(os.environ.get('INKSCAPE_QUEUE_SIZE', '8'))
+INKSCAPE_JOB_TIMEOUT = int(os.environ.get('INKSCAPE_JOB_TIMEOUT', '100'))
+# 쉬는 워커를 기다리는 최대 시간 (넘으면 503)
+INKSCAPE_QUEUE_TIMEOUT = int(os.environ.get('INKSCAPE_QUEUE_TIMEOUT', '30'))
+
+_inkscape_pool = None
+_inkscape_pool_lock = threading.Lock()
+
+def get_inkscape_pool():
+    global _inkscape_pool
+    if INKSCAPE_POOL_SIZE <= 0:
+        return None
+    with _inkscape_pool_lock:
+        if _inkscape_pool is None:
+            _inkscape_pool = InkscapePool(
+                size=INKSCAPE_POOL_SIZE,
+                queue_size=INKSCAPE_QUEUE_SIZE,
+                queue_timeout=INKSCAPE_QUEUE_TIMEOUT,
+                job_timeout=INKSCAPE_JOB_TIMEOUT,
+            )
+    return _inkscape_pool
+
+# --- 헬퍼 함수: Inkscape 액션 실행 (풀이 있으면 풀의 워커 사용) ---
+# 셸 세션에서는 내보내기 옵션(대상, 영역, DPI, 배경)이 다음 작업까지 남으므로 작업마다 기본값으로 되돌립니다.
+# (남아 있으면 앞 요청의 dpi 로 다음 요청의 면적이 계산됩니다)
+# 앞 작업이 남긴 export-area 도 비워야 페이지 영역이 적용됩니다. (둘 다 있으면 Inkscape 가 경고로 실패)
+SHELL_EXPORT_RESET = ["export-id:", "export-id-only:false", "export-area:", "export-area-page", "export-dpi:96",
+                      "export-background-opacity:0"]
+
+def run_inkscape(input_path, actions):
+    pool = get_inkscape_pool()
+    if pool is not None:
+        with inkscape_call('shell'):
+            return pool.run(SHELL_EXPORT_RESET + [f"file-open:{input_path}"] + actions + ["file-close"])
+    command = ["inkscape", input_path, f"--actions={';'.join(actions)}"]
+    with inkscape_call('cli'):
+        subprocess.run(command, check=True, capture_output=True, text=True, timeout=INKSCAPE_JOB_TIMEOUT)
+
+# --- 헬퍼 함수: stdin으로 입력을 넣고 stdout으로 결과를 받는 Inkscape 실행 ---
+def run_inkscape_pipe(input_bytes, export_type):
+    command = ["inkscape", "--pipe", f"--export-type={export_type}", "--export-filename=-"]
+    with inkscape_call('pipe'):
+        completed = subprocess.run(command, input=input_bytes, check=True, capture_output=True,
+                                   timeout=INKSCAPE_JOB_TIMEOUT)
+    return completed.stdout
+
+# 파이프로 주고받을 수 있는 경우: memory 모드이고, 셸 워커 풀을 쓰지 않을 때
+def use_inkscape_pipe():
+    return PIPELINE_MODE == 'memory' and get_inkscape_pool() is None
+
+# --- 렌더러 동시 실행 제한 (모든 gunicorn 워커가 공유) ---
+# RENDER_SLOTS: 서버 전체에서 동시에 돌아가는 렌더러(Inkscape 호출, cairosvg/PDF 렌더링) 수 상한
+#               (0 이면 제한 없음). 슬롯은 RENDER_SLOT_DIR 의 파일 잠금이라 워커 간에 공유됩니다.
+# RENDER_SLOT_WAIT: 슬롯을 기다리는 최대 시간(초). 넘으면 503 으로 응답합니다.
+RENDER_SLOTS = int(os.environ.get('RENDER_SLOTS', str(os.cpu_count() or 2)))
+RENDER_SLOT_WAIT = float(os.environ.get('RENDER_SLOT_WAIT', '30'))
+RENDER_SLOT_DIR = os.environ.get('RENDER_SLOT_DIR', os.path.join(SCRATCH_FOLDER, 'slots'))
+renderer_slots = RendererSlots(RENDER_SLOT_DIR, RENDER_SLOTS, RENDER_SLOT_WAIT) if RENDER_SLOTS > 0 else None
+
+@contextmanager
+def renderer_slot():
+    if renderer_slots is None:
+        yield
+        return
+    with stage_timer('slot_wait'):
+        fd = renderer_slots.acquire()
+    try:
+        yield
+    finally:
+        renderer_slots.release(fd)
+
+# --- 결과 캐시 설정 ---
+# 같은 .ai 파일을 다시 올리면 변환/렌더링 없이 저장된 결과를 돌려줍니다.
+RESULT_CACHE_ITEMS = int(os.environ.get('RESULT_CACHE_ITEMS', '16'))
+RESULT_CACHE_DISK_MB = int(os.environ.get('RESULT_CACHE_DISK_MB', '512'))
+# 워커가 여럿이면 결과를 바로 디스크에도 써서, 이미지/마스크 요청이 다른 워커로 가도 찾을 수 있게 합니다.
+# (gunicorn.conf.py 가 workers > 1 일 때 켭니다)
+CACHE_WRITE_THROUGH = os.environ.get('CACHE_WRITE_THROUGH', '0') == '1'
+result_cache = ResultCache(
+    max_items=RESULT_CACHE_ITEMS,
+    disk_dir=RESULT_CACHE_FOLDER if RESULT_CACHE_DISK_MB > 0 else None,
+    disk_max_bytes=RESULT_CACHE_DISK_MB * 1024 * 1024,
+    write_through=CACHE_WRITE_THROUGH,
+)
+
+# 캐시 키에 포함되는 렌더러 설정 (결과가 달라지는 설정이 추가되면 여기에 넣습니다)
+def renderer_settings():
+    return {"engine": RENDER_ENGINE, "version": 3, "pdf_layers": USE_PDF_LAYERS}
+
+# --- 레이어 캐시 설정 ---
+# 파일 전체가 같지 않아도, 레이어 지문(그룹 하위 트리 + 참조하는 defs + 페이지 속성 + 처리 옵션)이
+# 같은 레이어는 이전 결과(면적, 이미지)를 그대로 쓰고 바뀐 레이어만 다시 렌더링합니다.
+LAYER_CACHE_ITEMS = int(os.environ.get('LAYER_CACHE_ITEMS', '64'))
+LAYER_CACHE_DISK_MB = int(os.environ.get('LAYER_CACHE_DISK_MB', '512'))
+layer_cache = ResultCache(
+    max_items=LAYER_CACHE_ITEMS,
+    disk_dir=os.path.join(RESULT_CACHE_FOLDER, 'layers') if LAYER_CACHE_DISK_MB > 0 else None,
+    disk_max_bytes=LAYER_CACHE_DISK_MB * 1024 * 1024,
+)
+
+def layer_fingerprint(group, root_attrib, defs, settings):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"root": root_attrib, **settings}, sort_keys=True).encode('utf-8'))
+    for part in get_assembler(root_attrib, defs).content_parts([group]):
+        digest.update(b"\0")
+        # 큰 이미지는 요청마다 다른 지연 토큰으로 바뀌어 있으므로 원래 데이터로 해시합니다.
+        digest.update(resolve_lazy_payloads(part).encode('utf-8'))
+    return digest.hexdigest()
+
+# 전체 이미지는 보이는 레이어 지문 목록 전체로 찾습니다.
+def composite_cache_key(layer_keys):
+    return 'composite-' + hashlib.sha256('\n'.join(layer_keys).encode('utf-8')).hexdigest()
+
+# --- 면적 계산 엔진 ---
+# 'pixel': 렌더링된 PNG에서 alpha > 0 인 픽셀 수
+# 'vector': SVG 경로 도형으로 직접 계산한 면적 (문서 px² 단위, 래스터화 없음)
+AREA_ENGINES = ('pixel', 'vector')
+
+# --- 해상도 설정 ---
+# 화면에 보내는 이미지(및 /api/ratio 마스크)는 항상 IMAGE_DPI 로 렌더링합니다.
+# 요청에 dpi 또는 targetPixels(페이지 전체 픽셀 수)가 있으면 pixel 엔진의 면적은
+# 그 해상도로 따로 측정하며, 이때는 페이지를 가로 띠(strip) 단위로 렌더링/집계해
+# 한 번에 디코딩하는 크기가 STRIP_PIXELS 를 넘지 않습니다. (해상도와 무관하게 메모리 일정)
+IMAGE_DPI = 96
+MIN_DPI = float(os.environ.get('MIN_DPI', '24'))
+MAX_DPI = float(os.environ.get('MAX_DPI', '1200'))
+STRIP_PIXELS = int(os.environ.get('STRIP_PIXELS', str(4 * 1024 * 1024)))
+
+# --- 헬퍼 함수: 요청 폼에서 처리 옵션 읽기 ---
+def parse_calculate_options(form):
+    area_engine = form.get('areaEngine', 'pixel')
+    if area_engine not in AREA_ENGINES:
+        raise ValueError(f"Unknown area engine: {area_engine}")
+    options = {"area_engine": area_engine}
+
+    dpi, target_pixels = form.get('dpi'), form.get('targetPixels')
+    if dpi and target_pixels:
+        raise ValueError("Use either dpi or targetPixels, not both")
+    try:
+        if dpi and float(dpi) != IMAGE_DPI:
+            options["dpi"] = float(dpi)
+        elif target_pixels:
+            options["target_pixels"] = int(target_pixels)
+    except ValueError:
+        raise ValueError("dpi and targetPixels must be numbers")
+    if not math.isfinite(options.get("dpi", 1)) or options.get("dpi", 1) <= 0 or options.get("target_pixels", 1) <= 0:
+        raise ValueError("dpi and targetPixels must be positive")
+
+    # images=0 이면 레이어 이미지를 만들지 않습니다.
+    # images=lazy 이면 계산할 때는 만들지 않고, 이미지 URL 을 처음 요청할 때 그 레이어만 렌더링합니다.
+    # (pixel 엔진은 해상도를 따로 지정해 면적을 측정할 때만 이미지 없이 계산할 수 있습니다.)
+    images = form.get('images', '1')
+    measured_separately = "dpi" in options or "target_pixels" in options
+    options["with_images"] = images not in ('0', 'lazy') or (area_engine == 'pixel' and not measured_separately)
+    if images == 'lazy' and not options["with_images"]:
+        options["lazy_images"] = True
+    return options
+
+# --- 비동기 작업 설정 ---
+# JOB_STATE_DIR: 작업 상태를 파일로도 남길 폴더. 워커가 여럿이면 상태/이벤트 조회가 다른 워커로 갈 수 있으므로
+#                모든 워커가 같은 폴더를 씁니다. (gunicorn.conf.py 가 workers > 1 일 때 지정합니다)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_STATE_DIR = os.environ.get('JOB_STATE_DIR') or None
+job_manager = JobManager(max_workers=JOB_WORKERS, state_dir=JOB_STATE_DIR)
+
+# --- 헬퍼 함수: 진행 상황 알림 (progress 콜백이 없으면 무시) ---
+def notify(progress, stage, **data):
+    if progress is not None:
+        progress('progress', stage=stage, **data)
+
+# --- 헬퍼 함수: PNG 에서 alpha 채널만 꺼내기 (RGBA 전체를 배열로 만들지 않음) ---
+def png_alpha(png_bytes):
+    img = Image.open(io.BytesIO(png_bytes))
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    return np.asarray(img.getchannel('A'))
+
+# alpha > 0 픽셀 수와, 그중 일부만 덮인(안티에일리어싱된) 경계 픽셀 수
+def alpha_coverage(alpha):
+    covered = alpha > 0
+    return int(np.count_nonzero(covered)), int(np.count_nonzero(covered & (alpha < 255))), covered
+
+# --- 헬퍼 함수: PNG 바이트에서 면적과 base64 이미지 계산 ---
+def png_bytes_to_result(png_bytes):
+    pixel_area, edge_pixels, covered = alpha_coverage(png_alpha(png_bytes))
+
+    base64_image = base64.b64encode(png_bytes).decode('utf-8')
+
+    return {"image": base64_image, "area": pixel_area, "bbox": alpha_bbox(covered), "edge_pixels": edge_pixels}
+
+# --- 헬퍼 함수: 면적 정밀도 ---
+# alpha > 0 으로 세면 경계 픽셀은 일부만 덮여 있어도 1로 세어지므로,
+# 실제 면적은 [area - area_error, area] 범위에 있습니다. (해상도를 높이면 경계 비중이 줄어듭니다)
+def area_precision(area, edge_pixels, dpi):
+    pixel_size = (IMAGE_DPI / dpi) ** 2  # 측정 픽셀 하나의 면적 (96 DPI 픽셀 단위)
+    return {
+        "dpi": dpi,
+        "edge_pixels": edge_pixels,
+        "area_error": round(edge_pixels * pixel_size, 2),
+        "relative_error": round(edge_pixels * pixel_size / area, 6) if area else 0.0,
+    }
+
+# --- 헬퍼 함수: 마스크에서 내용이 있는 영역의 경계 상자 [x0, y0, x1, y1] (픽셀) ---
+def alpha_bbox(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return [int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1]
+
+# --- 헬퍼 함수: 그룹들로 새 SVG 문서 문자열 생성 ---
+# defs 는 그룹들이 참조하는 항목만 남기고, 직렬화한 조각은 문서 단위로 재사용합니다.
+def build_svg_string(groups, root_attrib, defs):
+    return resolve_lazy_payloads(get_assembler(root_attrib, defs).build(groups))
+
 # --- 헬퍼 함수: SVG 그룹으로 PNG 생성 ---
 def create_png_from_groups(groups, root_attrib, defs):
     if not any(g is not None for g in groups):
         return {"image": None, "area": 0}
-    
+
+    return png_bytes_to_result(render_svg_png_inkscape(build_svg_string(groups, root_attrib, defs)))
+
+def render_svg_png_inkscape(svg_string):
+    if use_inkscape_pipe():
+        return run_inkscape_pipe(svg_string.encode('utf-8'), 'png')
+
     temp_svg_filename = f"{uuid.uuid4()}.svg"
     temp_png_filename = f"{uuid.uuid4()}.png"
-    temp_svg_path = os.path.join(SVG_OUTPUT_FOLDER, temp_svg_filename)
-    temp_png_path = os.path.join(SVG_OUTPUT_FOLDER, temp_png_filename)
-
-    try:
-        new_root = ET.Element('svg', attrib=root_attrib)
-        if defs is not None:
-            new_root.append(defs)
-        for group in groups:
-            if group is not None:
-                new_root.append(group)
-        
-        svg_string = ET.tostring(new_root, encoding='unicode')
-        
+    temp_svg_path = os.path.join(SCRATCH_FOLDER, temp_svg_filename)
+    temp_png_path = os.path.join(SCRATCH_FOLDER, temp_png_filename)
+
+    try:
         with open(temp_svg_path, 'w', encoding='utf-8') as f:
             f.write(svg_string)
 
-        # Inkscape CLI를 사용하여 PNG로 변환합니다.
-        command = [
-            "inkscape",
-            temp_svg_path,
-            "--export-type=png",
-            f"--export-filename={temp_png_path}"
-        ]
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        # Inkscape를 사용하여 PNG로 변환합니다.
+        run_inkscape(temp_svg_path, ["export-type:png", "export-area-page", f"export-dpi:{IMAGE_DPI}",
+                                     f"export-filename:{temp_png_path}", "export-do"])
 
         with open(temp_png_path, 'rb') as f:
-            png_bytes = f.read()
-
-        img_rgba = Image.open(io.BytesIO(png_bytes)).convert('RGBA')
-        img_array = np.array(img_rgba)
-        
-        alpha_channel = img_array[:, :, 3]
-        pixel_area = np.sum(alpha_channel > 0)
-        
-        base64_image = base64.b64encode(png_bytes).decode('utf-8')
-        
-        return {"image": base64_image, "area": int(pixel_area)}
+            return f.read()
+
+    finally:
+        remove_temp_files(temp_svg_path, temp_png_path)
+
+# --- 헬퍼 함수: 레이어 id 확보 (Inkscape --actions 에서 쓸 수 있는 id) ---
+def ensure_export_id(group, index):
+    group_id = group.get('id')
+    if not group_id or any(c in group_id for c in ';:, '):
+        group_id = f"export-layer-{index}"
+        group.set('id', group_id)
+    return group_id
+
+# --- 페이지 좌표 ---
+# 문서 크기(96 DPI 픽셀)와 viewBox(사용자 단위)
+def page_geometry(root_attrib):
+    width = parse_length(root_attrib.get('width'), 1000)
+    height = parse_length(root_attrib.get('height'), 1000)
+    view_box = [float(v) for v in root_attrib.get('viewBox', '').replace(',', ' ').split()]
+    if len(view_box) != 4:
+        view_box = [0.0, 0.0, width, height]
+    return width, height, view_box
+
+# 해당 해상도에서 페이지 전체 PNG 의 픽셀 크기
+def page_pixel_size(root_attrib, dpi=IMAGE_DPI):
+    width, height, _ = page_geometry(root_attrib)
+    scale = dpi / IMAGE_DPI
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+# dpi 해상도 픽셀 사각형 [left, top, right, bottom] → viewBox 사용자 단위 영역 (x0, y0, x1, y1)
+def region_user_area(root_attrib, dpi, rect):
+    width, height, (vb_x, vb_y, vb_w, vb_h) = page_geometry(root_attrib)
+    scale = dpi / IMAGE_DPI
+    left, top, right, bottom = rect
+    return (vb_x + vb_w * left / (width * scale), vb_y + vb_h * top / (height * scale),
+            vb_x + vb_w * right / (width * scale), vb_y + vb_h * bottom / (height * scale))
+
+# 그 영역만 보이도록 viewBox 를 바꾸고 출력 크기를 픽셀 단위로 지정한 루트 속성 (cairosvg 용)
+def region_root_attrib(root_attrib, dpi, rect):
+    x0, y0, x1, y1 = region_user_area(root_attrib, dpi, rect)
+    return {
+        **root_attrib, 'width': str(rect[2] - rect[0]), 'height': str(rect[3] - rect[1]),
+        'viewBox': f"{x0} {y0} {x1 - x0} {y1 - y0}", 'preserveAspectRatio': 'none',
+    }
+
+# export-area-page 는 끌 때까지 남고, export-area 와 함께 켜져 있으면 Inkscape 는 경고
+# ("cannot use --export-area-page and --export-area ...")와 함께 페이지 전체를 내보냅니다.
+# 그래서 영역을 바꿀 때는 둘을 항상 함께 지정합니다. rect 가 None 이면 페이지 전체
+def export_area_actions(root_attrib, dpi, rect):
+    if rect is None:
+        return ["export-area:", "export-area-page"]
+    x0, y0, x1, y1 = region_user_area(root_attrib, dpi, rect)
+    return ["export-area-page:false", f"export-area:{x0}:{y0}:{x1}:{y1}"]
+
+# --- 레이어 경계 상자로 렌더링 영역 자르기 ---
+# 작은 스티커 레이어를 페이지 전체 크기로 렌더링하지 않도록, 벡터 도형으로 구한
+# 경계 상자(+ 안티에일리어싱 여유) 영역만 렌더링합니다. 잘린 이미지의 페이지 내 위치는
+# 레이어 결과의 offset [x, y] 로 돌려줍니다.
+# 벡터 경계 상자는 mask/clip 이 얽힌 파일에서 실제 렌더링보다 작을 수 있어 기본은 끕니다. (CROP_LAYERS=1 로 켬)
+CROP_LAYERS = os.environ.get('CROP_LAYERS', '0') == '1'
+CROP_MARGIN_PX = 2
 
+# 페이지 픽셀 경계 상자(실수) → 렌더링할 정수 픽셀 영역 [left, top, right, bottom]
+def crop_rect(bounds, root_attrib):
+    width_px, height_px = page_pixel_size(root_attrib)
+    if bounds is None:
+        return [0, 0, 1, 1]  # 그려지는 내용이 없는 레이어
+    left = min(max(0, math.floor(bounds[0]) - CROP_MARGIN_PX), width_px - 1)
+    top = min(max(0, math.floor(bounds[1]) - CROP_MARGIN_PX), height_px - 1)
+    right = max(min(width_px, math.ceil(bounds[2]) + CROP_MARGIN_PX), left + 1)
+    bottom = max(min(height_px, math.ceil(bounds[3]) + CROP_MARGIN_PX), top + 1)
+    return [left, top, right, bottom]
+
+# 잘린 이미지 기준 결과를 페이지 기준으로 옮깁니다.
+def offset_layer_result(result, crop):
+    left, top = (crop[0], crop[1]) if crop else (0, 0)
+    if result.get('bbox') is not None:
+        x0, y0, x1, y1 = result['bbox']
+        result['bbox'] = [x0 + left, y0 + top, x1 + left, y1 + top]
+    result['offset'] = [left, top]
+    return result
+
+# --- 렌더링 엔진: Inkscape 한 번 실행으로 (전체 +) 레이어별 PNG 일괄 생성 ---
+# composite_groups 가 주어지면 그 그룹들을 합친 전체 이미지도 함께 내보냅니다.
+# crops[i] 가 있으면 레이어 i 는 그 영역만 내보냅니다.
+def render_layers_inkscape(groups, root_attrib, defs, composite_groups=None, crops=None):
+    batch_id = uuid.uuid4()
+    # 한 프로세스에서 여러 PNG를 내보내므로 파일이 필요합니다. (memory 모드에서는 tmpfs)
+    temp_svg_path = os.path.join(SCRATCH_FOLDER, f"{batch_id}.svg")
+    composite_png_path = os.path.join(SCRATCH_FOLDER, f"{batch_id}_all.png")
+    layer_png_paths = [
+        os.path.join(SCRATCH_FOLDER, f"{batch_id}_{i}.png") for i in range(len(groups))
+    ]
+    crops = crops or [None] * len(groups)
+
+    try:
+        export_ids = [ensure_export_id(g, i) for i, g in enumerate(groups)]
+        with open(temp_svg_path, 'w', encoding='utf-8') as f:
+            f.write(build_svg_string(composite_groups or groups, root_attrib, defs))
+
+        # 1) 페이지 전체(보이는 레이어 합성)를 먼저 내보내고,
+        # 2) export-id-only 로 레이어 하나씩 (잘린 영역 또는 페이지 크기 그대로) 내보냅니다.
+        actions = ["export-type:png", *export_area_actions(root_attrib, IMAGE_DPI, None), f"export-dpi:{IMAGE_DPI}"]
+        if composite_groups is not None:
+            actions += [f"export-filename:{composite_png_path}", "export-do"]
+        for export_id, png_path, crop in zip(export_ids, layer_png_paths, crops):
+            actions += [f"export-id:{export_id}", "export-id-only", *export_area_actions(root_attrib, IMAGE_DPI, crop),
+                        f"export-filename:{png_path}", "export-do"]
+
+        run_inkscape(temp_svg_path, actions)
+
+        composite_png = None
+        if composite_groups is not None:
+            with open(composite_png_path, 'rb') as f:
+                composite_png = f.read()
+        layer_pngs = []
+        for png_path in layer_png_paths:
+            with open(png_path, 'rb') as f:
+                layer_pngs.append(f.read())
+        return composite_png, layer_pngs
+
+    finally:
+        remove_temp_files(temp_svg_path, composite_png_path, *layer_png_paths)
+
+# --- 렌더링 엔진: cairosvg로 프로세스 없이 렌더링 ---
+def render_svg_strings_cairosvg(svg_strings):
+    import cairosvg
+    with renderer_slot():
+        return [cairosvg.svg2png(bytestring=svg_string.encode('utf-8')) for svg_string in svg_strings]
+
+# (전체 +) 레이어별 SVG 문자열. 잘린 레이어는 viewBox 로 영역을 지정합니다.
+def layer_svg_strings(groups, root_attrib, defs, composite_groups=None, crops=None):
+    assembler = get_assembler(root_attrib, defs)
+    crops = crops or [None] * len(groups)
+    svg_strings = [
+        resolve_lazy_payloads(assembler.build([g], region_root_attrib(root_attrib, IMAGE_DPI, crop) if crop else None))
+        for g, crop in zip(groups, crops)
+    ]
+    if composite_groups is not None:
+        svg_strings.insert(0, build_svg_string(composite_groups, root_attrib, defs))
+    return svg_strings
+
+def render_layers_cairosvg(groups, root_attrib, defs, composite_groups=None, crops=None):
+    pngs = render_svg_strings_cairosvg(layer_svg_strings(groups, root_attrib, defs, composite_groups, crops))
+    if composite_groups is not None:
+        return pngs[0], pngs[1:]
+    return None, pngs
+
+RENDER_ENGINES = {
+    'inkscape': render_layers_inkscape,
+    'cairosvg': render_layers_cairosvg,
+}
+
+# --- 레이어 병렬 처리 설정 ---
+# LAYER_WORKERS: 한 번에 동시에 렌더링하는 레이어 묶음 수 (서버 전체 공유)
+# LAYER_EXECUTOR: 'thread' 또는 'process' (process 는 cairosvg 엔진에서만 의미가 있습니다)
+# LAYER_MEMORY_MB: 동시에 디코딩 중인 레이어 이미지들이 쓸 수 있는 메모리 상한
+LAYER_WORKERS = int(os.environ.get('LAYER_WORKERS', str(os.cpu_count() or 2)))
+LAYER_EXECUTOR = os.environ.get('LAYER_EXECUTOR', 'thread')
+LAYER_MEMORY_MB = int(os.environ.get('LAYER_MEMORY_MB', '1024'))
+
+layer_thread_executor = ThreadPoolExecutor(max_workers=LAYER_WORKERS, thread_name_prefix='layer')
+layer_process_executor = None
+
+def get_layer_process_executor():
+    global layer_process_executor
+    if layer_process_executor is None:
+        layer_process_executor = ProcessPoolExecutor(max_workers=LAYER_WORKERS)
+    return layer_process_executor
+
+# 요청 전체에서 공유하는 메모리 예산 (바이트 단위로 빌리고 돌려줍니다)
+class MemoryBudget:
+    def __init__(self, limit_bytes):
+        self.limit = limit_bytes
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount):
+        amount = min(amount, self.limit)  # 혼자서 예산을 넘는 작업도 단독으로는 실행되도록
+        with self._cond:
+            self._cond.wait_for(lambda: self.used + amount <= self.limit)
+            self.used += amount
+        return amount
+
+    def release(self, amount):
+        with self._cond:
+            self.used -= amount
+            self._cond.notify_all()
+
+layer_memory_budget = MemoryBudget(LAYER_MEMORY_MB * 1024 * 1024)
+
+# 레이어 이미지 한 장(잘린 영역 또는 페이지 전체)을 디코딩하는 데 드는 메모리 추정치
+def estimate_layer_bytes(root_attrib, crops=None):
+    if crops:
+        return max((c[2] - c[0]) * (c[3] - c[1]) for c in crops) * 5
+    width_px, height_px = page_pixel_size(root_attrib)
+    return width_px * height_px * 5  # alpha 채널 + 마스크 (+ 디코딩 버퍼)
+
+def split_chunks(items, count):
+    size, extra = divmod(len(items), count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return [c for c in chunks if c]
+
+# 레이어 묶음 하나: 렌더링 → 면적 계산 (메모리 예산 안에서)
+# indices 는 묶음 레이어들의 문서 내 순번입니다. (레이어별 시간 기록용)
+def render_chunk(chunk, crops, root_attrib, defs, engine, composite_groups, layer_bytes, indices):
+    reserved = layer_memory_budget.acquire(layer_bytes)
+    try:
+        raster_started = time.perf_counter()
+        with stage_timer('raster'):
+            if engine == 'cairosvg' and LAYER_EXECUTOR == 'process':
+                # 직렬화는 여기서 하고, 래스터화만 별도 프로세스에서 수행합니다.
+                svg_strings = layer_svg_strings(chunk, root_attrib, defs, composite_groups, crops)
+                pngs = get_layer_process_executor().submit(render_svg_strings_cairosvg, svg_strings).result()
+                composite_png, layer_pngs = (pngs[0], pngs[1:]) if composite_groups is not None else (None, pngs)
+            else:
+                composite_png, layer_pngs = RENDER_ENGINES[engine](chunk, root_attrib, defs, composite_groups, crops)
+        # 한 번의 렌더링으로 묶음 전체를 내보내므로 레이어별 래스터화 시간은 묶음 시간입니다.
+        chunk_seconds = time.perf_counter() - raster_started
+
+        with stage_timer('decode'):
+            composite = png_bytes_to_result(composite_png) if composite_png is not None else None
+            results = []
+            for i, (png, crop) in enumerate(zip(layer_pngs, crops or [None] * len(layer_pngs))):
+                started = time.perf_counter()
+                results.append(offset_layer_result(png_bytes_to_result(png), crop))
+                record_layer_timing(indices[i], raster_chunk=chunk_seconds,
+                                    decode=time.perf_counter() - started)
+        return composite, results
     finally:
-        if os.path.exists(temp_svg_path):
-            os.remove(temp_svg_path)
-        if os.path.exists(temp_png_path):
-            os.remove(temp_png_path)
+        layer_memory_budget.release(reserved)
+
+# --- 헬퍼 함수: 전체 시각화 + 레이어별 결과를 생성 (레이어 묶음 단위 병렬 처리) ---
+# crops 가 있으면 각 레이어는 그 영역만 렌더링되고, 결과에 offset 이 붙습니다.
+# 일부 레이어만 다시 렌더링할 때는 composite_groups 로 전체 이미지에 들어갈 레이어들을,
+# indices 로 groups 각각의 문서 내 순번을 넘깁니다. (with_composite=False 면 전체 이미지 생략)
+def create_pngs_for_layers(groups, root_attrib, defs, engine=None, progress=None, crops=None,
+                           composite_groups=None, with_composite=True, indices=None):
+    groups = [g for g in groups if g is not None]
+    if not groups:
+        return {"image": None, "area": 0}, []
+    composite_groups = (composite_groups or groups) if with_composite else None
+    indices = indices or list(range(len(groups)))
+
+    engine = engine or RENDER_ENGINE
+    # 묶음 간 id 충돌이 없도록 렌더링 전에 모든 레이어 id를 확정합니다.
+    for i, g in enumerate(groups):
+        ensure_export_id(g, i)
+
+    # Inkscape 풀을 쓰면 풀 크기 이상으로 나눠도 대기열만 길어집니다.
+    parallelism = min(LAYER_WORKERS, len(groups))
+    if engine == 'inkscape' and get_inkscape_pool() is not None:
+        parallelism = min(parallelism, INKSCAPE_POOL_SIZE)
+    chunks = split_chunks(groups, max(1, parallelism))
+    crop_chunks = split_chunks(crops, len(chunks)) if crops else [None] * len(chunks)
+    index_chunks = split_chunks(indices, len(chunks))
+
+    notify(progress, 'rendering', total=len(groups), chunks=len(chunks))
+    # 전체 이미지를 만드는 첫 묶음은 페이지 크기만큼 예약합니다.
+    page_bytes = estimate_layer_bytes(root_attrib)
+    futures = [
+        submit_in_context(
+            layer_thread_executor, render_chunk, chunk, chunk_crops, root_attrib, defs, engine,
+            composite_groups if i == 0 else None,  # 전체 이미지는 첫 묶음에서 함께 생성
+            page_bytes if (i == 0 and composite_groups is not None) or not chunk_crops
+            else estimate_layer_bytes(root_attrib, chunk_crops),
+            chunk_indices,
+        )
+        for i, (chunk, chunk_crops, chunk_indices) in enumerate(zip(chunks, crop_chunks, index_chunks))
+    ]
+
+    done = 0
+    for future in as_completed(futures):
+        done += len(chunks[futures.index(future)])
+        notify(progress, 'rasterized', done=done, total=len(groups))
+
+    # 결과는 원래 레이어 순서대로 모읍니다.
+    composite, layer_results = None, []
+    for future in futures:
+        chunk_composite, chunk_results = future.result()
+        composite = composite or chunk_composite
+        layer_results.extend(chunk_results)
+    return composite, layer_results
+
+# --- 해상도 지정 면적 측정: 띠 단위 렌더링 + 집계 ---
+def resolve_measure_dpi(root_attrib, dpi=None, target_pixels=None):
+    if target_pixels:
+        width, height, _ = page_geometry(root_attrib)
+        dpi = IMAGE_DPI * math.sqrt(target_pixels / (width * height))
+    if dpi is None:
+        return None
+    return round(min(max(dpi, MIN_DPI), MAX_DPI), 2)
+
+# 측정 해상도의 띠 목록 [left, top, right, bottom] (픽셀).
+# crop(96 DPI 픽셀 영역)이 있으면 그 영역 안만 나눕니다.
+def plan_strips(root_attrib, dpi, crop=None):
+    width_px, height_px = page_pixel_size(root_attrib, dpi)
+    scale = dpi / IMAGE_DPI
+    left, top, right, bottom = 0, 0, width_px, height_px
+    if crop is not None:
+        left, top = min(math.floor(crop[0] * scale), width_px - 1), min(math.floor(crop[1] * scale), height_px - 1)
+        right, bottom = max(min(width_px, math.ceil(crop[2] * scale)), left + 1), max(min(height_px, math.ceil(crop[3] * scale)), top + 1)
+    rows = max(1, min(bottom - top, STRIP_PIXELS // (right - left)))
+    return [[left, y, right, min(y + rows, bottom)] for y in range(top, bottom, rows)]
+
+# targets 의 각 항목은 레이어 그룹, 또는 None(페이지 전체 = doc_groups 합성)입니다.
+# 띠 PNG 를 (대상 번호, 띠 번호, PNG 바이트) 순서로 하나씩 돌려줍니다.
+def iter_strips_inkscape(targets, doc_groups, root_attrib, defs, dpi, target_strips):
+    batch_id = uuid.uuid4()
+    temp_svg_path = os.path.join(SCRATCH_FOLDER, f"{batch_id}.svg")
+    png_paths = {
+        (t, k): os.path.join(SCRATCH_FOLDER, f"{batch_id}_{t}_{k}.png")
+        for t, strips in enumerate(target_strips) for k in range(len(strips))
+    }
+    try:
+        with open(temp_svg_path, 'w', encoding='utf-8') as f:
+            f.write(build_svg_string(doc_groups, root_attrib, defs))
+
+        # 페이지 전체 대상을 먼저 내보낸 뒤 export-id 로 레이어별 띠를 내보냅니다.
+        order = sorted(range(len(targets)), key=lambda t: targets[t] is not None)
+        actions = ["export-type:png", f"export-dpi:{dpi}"]
+        for t in order:
+            if targets[t] is not None:
+                actions += [f"export-id:{targets[t].get('id')}", "export-id-only"]
+            for k, strip in enumerate(target_strips[t]):
+                actions += [*export_area_actions(root_attrib, dpi, strip), f"export-filename:{png_paths[t, k]}",
+                            "export-do"]
+        run_inkscape(temp_svg_path, actions)
+
+        # 디코딩은 띠 하나씩, 읽은 파일은 바로 지웁니다.
+        for t, strips in enumerate(target_strips):
+            for k in range(len(strips)):
+                with open(png_paths[t, k], 'rb') as f:
+                    png_bytes = f.read()
+                remove_temp_files(png_paths[t, k])
+                yield t, k, png_bytes
+    finally:
+        remove_temp_files(temp_svg_path, *png_paths.values())
+
+def iter_strips_cairosvg(targets, doc_groups, root_attrib, defs, dpi, target_strips):
+    import cairosvg
+    assembler = get_assembler(root_attrib, defs)
+    for t, target in enumerate(targets):
+        groups = doc_groups if target is None else [target]
+        for k, strip in enumerate(target_strips[t]):
+            svg_string = resolve_lazy_payloads(assembler.build(groups, region_root_attrib(root_attrib, dpi, strip)))
+            with renderer_slot():
+                png_bytes = cairosvg.svg2png(bytestring=svg_string.encode('utf-8'))
+            yield t, k, png_bytes
+
+STRIP_RENDERERS = {
+    'inkscape': iter_strips_inkscape,
+    'cairosvg': iter_strips_cairosvg,
+}
+
+def measure_chunk(targets, crops, doc_groups, root_attrib, defs, engine, dpi, indices):
+    target_strips = [plan_strips(root_attrib, dpi, crop) for crop in crops]
+    # 동시에 디코딩하는 것은 띠 하나뿐입니다.
+    strip_bytes = max((s[2] - s[0]) * (s[3] - s[1]) for strips in target_strips for s in strips) * 5
+    reserved = layer_memory_budget.acquire(strip_bytes)
+    try:
+        totals = [{"area": 0, "edge": 0, "bbox": None} for _ in targets]
+        strips = STRIP_RENDERERS[engine](targets, doc_groups, root_attrib, defs, dpi, target_strips)
+        # 띠를 받는 시간(렌더링)과 집계 시간을 묶음 단위로 더해 한 번에 기록합니다.
+        # (Inkscape 엔진은 첫 띠를 받을 때 묶음 전체 렌더링이 끝나 있습니다)
+        raster_seconds, decode_seconds = 0.0, [0.0] * len(targets)
+        while True:
+            started = time.perf_counter()
+            item = next(strips, None)
+            raster_seconds += time.perf_counter() - started
+            if item is None:
+                break
+            t, k, png_bytes = item
+            started = time.perf_counter()
+            accumulate_strip(totals[t], png_alpha(png_bytes), target_strips[t][k])
+            decode_seconds[t] += time.perf_counter() - started
+        record_stage('measure_raster', raster_seconds)
+        record_stage('measure_decode', sum(decode_seconds))
+        for t, seconds in enumerate(decode_seconds):
+            record_layer_timing(indices[t], measure_decode=seconds)
+        return [measurement_result(total, dpi) for total in totals]
+    finally:
+        layer_memory_budget.release(reserved)
+
+# 띠 하나의 alpha 를 대상의 합계(면적, 경계 픽셀, 경계 상자)에 더합니다.
+def accumulate_strip(total, alpha, strip):
+    area, edge, covered = alpha_coverage(alpha)
+    total["area"] += area
+    total["edge"] += edge
+    bbox = alpha_bbox(covered)
+    if bbox is not None:
+        left, top = strip[:2]
+        bbox = [bbox[0] + left, bbox[1] + top, bbox[2] + left, bbox[3] + top]
+        prev = total["bbox"] or bbox
+        total["bbox"] = [min(prev[0], bbox[0]), min(prev[1], bbox[1]), max(prev[2], bbox[2]), max(prev[3], bbox[3])]
+
+# 측정 해상도의 픽셀 수를 96 DPI 픽셀 단위 면적으로 환산합니다. (화면 이미지의 면적과 같은 단위)
+def measurement_result(total, dpi):
+    scale = dpi / IMAGE_DPI
+    bbox = total["bbox"]
+    if bbox is not None:
+        bbox = [math.floor(bbox[0] / scale), math.floor(bbox[1] / scale),
+                math.ceil(bbox[2] / scale), math.ceil(bbox[3] / scale)]
+    area = total["area"] / scale ** 2
+    return {
+        "area": round(area, 2),
+        "area_pixels": total["area"],
+        "bbox": bbox,
+        "precision": area_precision(area, total["edge"], dpi),
+    }
+
+# --- 헬퍼 함수: 지정 해상도로 레이어별 면적 측정 (레이어 묶음 단위 병렬 처리) ---
+def measure_layer_areas(targets, doc_groups, root_attrib, defs, dpi, engine=None, progress=None, crops=None,
+                        indices=None):
+    engine = engine or RENDER_ENGINE
+    for i, target in enumerate(targets):
+        if target is not None:
+            ensure_export_id(target, i)
+    crops = crops or [None] * len(targets)
+
+    parallelism = min(LAYER_WORKERS, len(targets))
+    if engine == 'inkscape' and get_inkscape_pool() is not None:
+        parallelism = min(parallelism, INKSCAPE_POOL_SIZE)
+    chunks = split_chunks(targets, max(1, parallelism))
+    crop_chunks = split_chunks(crops, len(chunks))
+    index_chunks = split_chunks(indices or list(range(len(targets))), len(chunks))
+
+    width_px, height_px = page_pixel_size(root_attrib, dpi)
+    notify(progress, 'measuring', dpi=dpi, width=width_px, height=height_px)
+    futures = [
+        submit_in_context(layer_thread_executor, measure_chunk, chunk, chunk_crops, doc_groups, root_attrib, defs,
+                          engine, dpi, chunk_indices)
+        for chunk, chunk_crops, chunk_indices in zip(chunks, crop_chunks, index_chunks)
+    ]
+    measurements = []
+    for future in futures:
+        measurements.extend(future.result())
+    notify(progress, 'measured', total=len(targets))
+    return measurements
 
 # --- 핵심 로직: AI 파일 처리 함수 (최신 로직 적용) ---
-def process_ai_file(ai_path, original_filename):
-    unique_filename = f"{uuid.uuid4()}.svg"
-    svg_path = os.path.join(SVG_OUTPUT_FOLDER, unique_filename)
-    
+# --- 헬퍼 함수: Inkscape stdout 을 받는 즉시 점진적으로 파싱 (변환 결과 전체를 메모리에 두지 않음) ---
+# ai_source 가 UploadStream 이면 업로드를 받는 대로 stdin 에 넘깁니다. (전송과 변환이 겹침)
+# stderr 는 처음부터 따로 읽어 Inkscape 가 stderr 에 막혀 멈추지 않게 하고, 변환이 INKSCAPE_JOB_TIMEOUT 안에
+# 끝나지 않으면 (Inkscape 가 멈추거나 업로드가 너무 느리면) 감시 타이머가 프로세스를 끝냅니다.
+def convert_ai_via_pipe(ai_source, store):
+    command = ["inkscape", "--pipe", "--export-type=svg", "--export-filename=-"]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_chunks = []
+    feed_errors = []  # 업로드 읽기 중 오류 (크기 초과, 연결 끊김, 캐시 적중으로 취소)
+    timed_out = threading.Event()
+
+    def feed_stdin():
+        try:
+            for chunk in ai_source.iter_chunks() if isinstance(ai_source, UploadStream) else [ai_source]:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            feed_errors.append(e)
+            process.kill()
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def drain_stderr():
+        stderr_chunks.append(process.stderr.read())
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    watchdog = threading.Timer(INKSCAPE_JOB_TIMEOUT, kill_on_timeout)
+    watchdog.daemon = True
+    threads = [threading.Thread(target=feed_stdin, daemon=True), threading.Thread(target=drain_stderr, daemon=True)]
+    watchdog.start()
+    for thread in threads:
+        thread.start()
+    error = None
+    try:
+        doc = parse_svg_streaming(process.stdout, store)
+        process.wait()
+    except BaseException as e:
+        process.kill()
+        process.wait()
+        error = e
+    finally:
+        watchdog.cancel()
+        # 느린 업로드를 읽다 멈춘 feeder 는 기다리지 않습니다. (프로세스가 끝나 다음 쓰기에서 멈춥니다)
+        for thread in threads:
+            thread.join(timeout=5)
+    # 잘린 출력의 파싱 오류보다 원인(시간 초과, 업로드 오류)을 먼저 알립니다.
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, INKSCAPE_JOB_TIMEOUT)
+    if feed_errors:
+        raise feed_errors[0]
+    if error is not None:
+        raise error
+    if process.returncode != 0:
+        stderr = b''.join(stderr_chunks).decode('utf-8', 'replace')
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+    return doc
+
+# --- 헬퍼 함수: AI → SVG 변환 후 점진적 파싱 (ai_source 는 파일 경로, 바이트 또는 UploadStream) ---
+def convert_ai_to_svg_document(ai_source, store):
+    if use_inkscape_pipe():
+        if isinstance(ai_source, str):
+            with open(ai_source, 'rb') as f:
+                ai_source = f.read()
+        # 파이프 모드에서는 변환과 파싱이 겹쳐 진행되므로 둘을 합친 시간입니다.
+        with inkscape_call('convert'):
+            return convert_ai_via_pipe(ai_source, store)
+
+    if isinstance(ai_source, UploadStream):
+        ai_source = ai_source.read_all()  # 파일로 넘겨야 하는 모드는 다 받은 뒤 변환합니다.
+    temp_paths = []
+    try:
+        if isinstance(ai_source, bytes):
+            ai_path = os.path.join(SCRATCH_FOLDER, f"{uuid.uuid4()}.ai")
+            temp_paths.append(ai_path)
+            with open(ai_path, 'wb') as f:
+                f.write(ai_source)
+        else:
+            ai_path = ai_source
+        svg_path = os.path.join(SCRATCH_FOLDER, f"{uuid.uuid4()}.svg")
+        temp_paths.append(svg_path)
+        run_inkscape(ai_path, ["export-type:svg", f"export-filename:{svg_path}", "export-do"])
+        with stage_timer('parse'):
+            return parse_svg_streaming(svg_path, store)
+    finally:
+        remove_temp_files(*temp_paths)
+
+# pixel 엔진 면적: 지정 해상도 측정값이 있으면 그것을, 없으면 화면 이미지에서 센 값을 씁니다.
+def apply_pixel_measurement(layer_result, png_data, measurement):
+    if measurement is not None:
+        layer_result.update(area=measurement["area"], area_pixels=measurement["area_pixels"],
+                            precision=measurement["precision"])
+        if layer_result["bbox"] is None:
+            layer_result["bbox"] = measurement["bbox"]
+    elif png_data.get('image') is not None:
+        layer_result["precision"] = area_precision(png_data['area'], png_data.get('edge_pixels', 0), IMAGE_DPI)
+
+# images=lazy: 레이어별 SVG 문자열(잘린 영역)만 만들어 두고 렌더링은 이미지를 요청할 때 합니다.
+def lazy_render_source(groups, root_attrib, defs, vector_engine):
+    crops = [crop_rect(vector_engine.layer_bounds(g), root_attrib) for g in groups] if CROP_LAYERS else None
+    svg_strings = layer_svg_strings(groups, root_attrib, defs, composite_groups=groups, crops=crops)
+    return {
+        "visualization": svg_strings[0],
+        "layers": svg_strings[1:],
+        "offsets": [crop[:2] for crop in crops] if crops else [[0, 0]] * len(groups),
+    }
+
+# --- PDF 빠른 경로: OCG 레이어를 Inkscape 변환 없이 직접 렌더링 ---
+# PDF_LAYERS=auto 이고 PyMuPDF 가 설치되어 있으면 pixel 엔진 요청을 이 경로로 먼저 처리하고,
+# 처리할 수 없는 파일만 Inkscape 변환으로 넘깁니다. (vector 엔진은 SVG 도형이 필요해 항상 Inkscape)
+# 기본값 PDF_LAYERS=off 는 항상 Inkscape 를 씁니다. PyMuPDF 는 AGPL 라이선스라 배포 조건을 확인한 뒤
+# requirements-pdf.txt 로 따로 설치하고 켭니다. (렌더러가 달라 면적이 Inkscape 와 조금 다를 수 있습니다)
+PDF_LAYERS = os.environ.get('PDF_LAYERS', 'off')
+USE_PDF_LAYERS = PDF_LAYERS == 'auto' and pdf_layers_available()
+
+# 레이어 밖 내용 검사용 해상도 (있는지 없는지만 보면 되므로 낮게)
+PDF_CHECK_DPI = 24
+
+def source_head(ai_source, size=1024):
+    if isinstance(ai_source, UploadStream):
+        return ai_source.peek(size)  # 미리 읽은 앞부분은 변환기로 그대로 넘어갑니다.
+    if isinstance(ai_source, str):
+        with open(ai_source, 'rb') as f:
+            return f.read(size)
+    return ai_source[:size]
+
+def read_source_bytes(ai_source):
+    if isinstance(ai_source, UploadStream):
+        return ai_source.read_all()
+    if isinstance(ai_source, str):
+        with open(ai_source, 'rb') as f:
+            return f.read()
+    return ai_source
+
+# 렌더링한 이미지 → 결과. crop(96 DPI 픽셀 영역)이 있으면 그 부분만 남기고 offset 을 붙입니다.
+def pdf_image_result(image, crop=None, with_image=True):
+    if crop is not None:
+        image = image.crop(crop)
+    area, edge_pixels, covered = alpha_coverage(np.asarray(image.getchannel('A')))
+    result = {"image": None, "area": area, "bbox": alpha_bbox(covered), "edge_pixels": edge_pixels}
+    if with_image:
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        result["image"] = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return result
+
+# 렌더러 슬롯을 잡은 상태에서 호출됩니다.
+# PyMuPDF 문서는 스레드 간에 나눠 쓸 수 없으므로 한 문서에서 레이어를 차례로 렌더링합니다.
+def render_pdf_layers(pdf, visible, root_attrib, with_images, measure_dpi, progress):
+    # 어느 레이어에도 속하지 않은 내용이 있으면 레이어별로 나눌 수 없습니다.
+    with stage_timer('pdf_check'):
+        if pdf.render([], PDF_CHECK_DPI).getchannel('A').getbbox() is not None:
+            raise PdfLayersUnsupported("Content outside layers")
+    notify(progress, 'parsed', layers=len(visible))
+
+    composite = {"image": None, "area": 0}
+    pngs, crops = [], []
+    notify(progress, 'rendering', total=len(visible), chunks=1)
+    with stage_timer('render'):
+        if with_images:
+            composite = pdf_image_result(pdf.render([layer.xref for layer in visible], IMAGE_DPI))
+        for index, layer in enumerate(visible):
+            started = time.perf_counter()
+            image = pdf.render([layer.xref], IMAGE_DPI)
+            crop = crop_rect(alpha_bbox(np.asarray(image.getchannel('A')) > 0), root_attrib) if CROP_LAYERS else None
+            pngs.append(offset_layer_result(pdf_image_result(image, crop, with_images), crop))
+            crops.append(crop)
+            record_layer_timing(index, raster=time.perf_counter() - started)
+            notify(progress, 'rasterized', done=index + 1, total=len(visible))
+
+    measurements = [None] * len(visible)
+    if measure_dpi is not None:
+        width_px, height_px = page_pixel_size(root_attrib, measure_dpi)
+        notify(progress, 'measuring', dpi=measure_dpi, width=width_px, height=height_px)
+        with stage_timer('measure'):
+            for index, (layer, crop) in enumerate(zip(visible, crops)):
+                started = time.perf_counter()
+                total = {"area": 0, "edge": 0, "bbox": None}
+                for strip in plan_strips(root_attrib, measure_dpi, crop):
+                    alpha = np.asarray(pdf.render([layer.xref], measure_dpi, strip).getchannel('A'))
+                    accumulate_strip(total, alpha, strip)
+                measurements[index] = measurement_result(total, measure_dpi)
+                record_layer_timing(index, measure=time.perf_counter() - started)
+        notify(progress, 'measured', total=len(visible))
+    return composite, pngs, measurements
+
+def process_pdf_document(data, with_images, dpi, target_pixels, progress):
+    notify(progress, 'converting', source='pdf')
+    with stage_timer('pdf_open'):
+        pdf = PdfLayerDocument(data)
+    with pdf:
+        visible = [layer for layer in pdf.layers if layer.visible]
+        if not visible:
+            raise PdfLayersUnsupported("No visible layers")
+        root_attrib = pdf.root_attrib()
+        measure_dpi = resolve_measure_dpi(root_attrib, dpi, target_pixels)
+
+        # render_chunk 와 같은 순서(메모리 예산 → 렌더러 슬롯)로 잡습니다.
+        reserved = layer_memory_budget.acquire(estimate_layer_bytes(root_attrib))
+        try:
+            with renderer_slot():
+                composite, pngs, measurements = render_pdf_layers(pdf, visible, root_attrib, with_images,
+                                                                  measure_dpi, progress)
+        finally:
+            layer_memory_budget.release(reserved)
+
+    layer_results = []
+    for layer, png_data, measurement in zip(visible, pngs, measurements):
+        layer_result = {
+            "name": layer.name,
+            "image": png_data['image'],
+            "area": png_data['area'],
+            "bbox": png_data['bbox'],
+            "offset": png_data['offset'],
+        }
+        apply_pixel_measurement(layer_result, png_data, measurement)
+        layer_results.append(layer_result)
+    return {
+        "visualization": composite['image'],
+        "layers": layer_results,
+        "area_engine": 'pixel',
+        "dpi": measure_dpi or IMAGE_DPI,
+        "page_size": list(page_pixel_size(root_attrib)),
+        "layer_source": 'pdf',
+    }
+
+def process_ai_file(ai_source, original_filename, area_engine='pixel', with_images=True,
+                    dpi=None, target_pixels=None, progress=None, lazy_images=False):
+    # PostScript 형식 AI 는 OCG 가 없으므로 업로드를 읽어 두지 않고 바로 변환기로 흘려보냅니다.
+    if USE_PDF_LAYERS and area_engine == 'pixel' and source_head(ai_source).find(b'%PDF-') >= 0:
+        ai_source = read_source_bytes(ai_source)
+        try:
+            # PDF 에서 바로 렌더링하는 비용은 작으므로 images=lazy 여도 이미지를 함께 만듭니다.
+            result = process_pdf_document(ai_source, with_images or lazy_images, dpi, target_pixels, progress)
+            DOCUMENTS.inc(source='pdf')
+            return result
+        except PdfLayersUnsupported as e:
+            notify(progress, 'fallback', reason=str(e))
+        except Exception as e:
+            print(f"PDF layer extraction error: {e}")
+            notify(progress, 'fallback', reason=str(e))
+        DOCUMENTS.inc(source='pdf_fallback')
+    else:
+        DOCUMENTS.inc(source='inkscape')
+
+    # 큰 이미지 데이터는 요청이 끝날 때까지 지연 저장소에 보관됩니다.
+    with LazyPayloadStore() as store:
+        return process_ai_document(ai_source, original_filename, store, area_engine, with_images,
+                                   dpi, target_pixels, progress, lazy_images)
+
+def process_ai_document(ai_source, original_filename, store, area_engine, with_images, dpi, target_pixels, progress,
+                        lazy_images=False):
     try:
-        # 1. Inkscape를 사용해 AI를 SVG로 변환
-        command = ["inkscape", ai_path, f"--export-filename={svg_path}"]
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        # 1. Inkscape를 사용해 AI를 SVG로 변환 (출력은 받는 대로 파싱)
+        notify(progress, 'converting')
+        with stage_timer('convert'):
+            doc = convert_ai_to_svg_document(ai_source, store)
+        notify(progress, 'converted')
+    except (InkscapePoolBusyError, UploadError, UploadCancelled):
+        raise
+    except subprocess.TimeoutExpired:
+        PROCESSING_ERRORS.inc(stage='convert')
+        raise  # 504 로 응답합니다.
     except Exception as e:
+        PROCESSING_ERRORS.inc(stage='convert')
         raise RuntimeError(f"Inkscape conversion failed: {e}")
 
     try:
-        # 2. SVG 파일 파싱 및 처리
-        tree = ET.parse(svg_path)
-        root = tree.getroot()
-        defs = root.find('svg:defs', ns)
-        all_top_level_groups = root.findall('svg:g', ns)
+        # 2. SVG 파싱 결과 처리
+        root = doc.root
+        defs = doc.defs
+        # 보이는 레이어만 필터링 (보이는 레이어가 있으면 숨김 레이어는 파싱 중에 이미 버려졌습니다)
+        visible_layers = [layer for layer in doc.layers if layer.visible]
+        visible_groups = [layer.element for layer in visible_layers]
+        all_top_level_groups = visible_groups or doc.groups()
+        notify(progress, 'parsed', layers=len(visible_groups))
 
-        # 보이는 레이어만 필터링
-        visible_groups = [g for g in all_top_level_groups if 'display:none' not in g.get('style', '')]
+        lazy_images = lazy_images and not with_images
+        vector_engine = VectorAreaEngine(root) if area_engine == 'vector' or CROP_LAYERS else None
+        no_image = {"image": None, "area": 0}
+        render_source = None
+        # pixel 엔진에서 해상도가 지정되면 면적은 화면 이미지와 별도로 띠 단위로 측정합니다.
+        measure_dpi = resolve_measure_dpi(root.attrib, dpi, target_pixels) if area_engine == 'pixel' else None
 
-        # 전체 시각화를 위한 PNG 생성
-        all_visible_layers_png = create_png_from_groups(visible_groups, root.attrib, defs)
-        
-        # 각 레이어를 개별적으로 처리
+        # 전체 시각화와 각 레이어를 한 번의 렌더링으로 처리
         layer_results = []
         if visible_groups:
-            for g_element in visible_groups:
-                png_data = create_png_from_groups([g_element], root.attrib, defs)
-                layer_name = g_element.get(f'{{{ns["inkscape"]}}}label') or g_element.get('id', 'Unnamed Layer')
-                layer_results.append({
+            # 이름은 파싱 시점의 속성으로 정해집니다. (렌더링 중 id가 보정되어도 그대로)
+            layer_names = [layer.name for layer in visible_layers]
+            # 지문에 들어가는 id 가 렌더링 중에 바뀌지 않도록 먼저 확정합니다.
+            for i, g in enumerate(visible_groups):
+                ensure_export_id(g, i)
+
+            # 레이어 지문이 같으면 이전 결과를 쓰고, 바뀐 레이어만 렌더링/측정합니다.
+            layer_settings = {**renderer_settings(), "area_engine": area_engine, "with_images": with_images,
+                              "dpi": measure_dpi, "crop": CROP_LAYERS}
+            with stage_timer('fingerprint'):
+                layer_keys = [layer_fingerprint(g, root.attrib, defs, layer_settings) for g in visible_groups]
+            cached_layers = [layer_cache.get(key) for key in layer_keys]
+            changed = [i for i, cached in enumerate(cached_layers) if cached is None]
+            changed_groups = [visible_groups[i] for i in changed]
+            notify(progress, 'fingerprinted', reused=len(visible_groups) - len(changed), changed=len(changed))
+
+            # 레이어별 경계 상자 (렌더링/측정 영역을 그 안으로 제한)
+            crops = None
+            if CROP_LAYERS and changed:
+                with stage_timer('bounds'):
+                    crops = [crop_rect(vector_engine.layer_bounds(g), root.attrib) for g in changed_groups]
+            all_visible_layers_png, layer_pngs = no_image, [no_image] * len(changed)
+            if with_images:
+                composite_key = composite_cache_key(layer_keys)
+                cached_composite = layer_cache.get(composite_key)
+                with stage_timer('render'):
+                    if changed:
+                        all_visible_layers_png, layer_pngs = create_pngs_for_layers(
+                            changed_groups, root.attrib, defs, progress=progress, crops=crops,
+                            composite_groups=visible_groups, with_composite=cached_composite is None, indices=changed,
+                        )
+                    elif cached_composite is None:
+                        all_visible_layers_png = create_png_from_groups(visible_groups, root.attrib, defs)
+                if cached_composite is not None:
+                    all_visible_layers_png = cached_composite
+                elif all_visible_layers_png.get('image') is not None:
+                    layer_cache.put(composite_key, all_visible_layers_png)
+            measurements = [None] * len(changed)
+            if measure_dpi is not None and changed:
+                with stage_timer('measure'):
+                    measurements = measure_layer_areas(changed_groups, visible_groups, root.attrib, defs, measure_dpi,
+                                                       progress=progress, crops=crops, indices=changed)
+
+            rendered = dict(zip(changed, zip(layer_pngs, measurements)))
+            for index, (g_element, layer_name, layer_key, cached) in enumerate(
+                    zip(visible_groups, layer_names, layer_keys, cached_layers)):
+                if cached is not None:
+                    layer_results.append({"name": layer_name, **cached})
+                    record_layer_timing(index, reused=True)
+                    continue
+                png_data, measurement = rendered[index]
+                layer_result = {
                     "name": layer_name,
                     "image": png_data['image'],
-                    "area": png_data['area']
-                })
+                    "area": png_data['area'],
+                    "bbox": png_data.get('bbox'),
+                }
+                if 'offset' in png_data:
+                    layer_result["offset"] = png_data['offset']
+                if area_engine == 'vector':
+                    started = time.perf_counter()
+                    with stage_timer('vector_area'):
+                        layer_result.update(vector_engine.layer_area(g_element))
+                    record_layer_timing(index, vector_area=time.perf_counter() - started)
+                else:
+                    apply_pixel_measurement(layer_result, png_data, measurement)
+                layer_cache.put(layer_key, {k: v for k, v in layer_result.items() if k != 'name'})
+                layer_results.append(layer_result)
+
+            if lazy_images:
+                with stage_timer('lazy_source'):
+                    render_source = lazy_render_source(visible_groups, root.attrib, defs, vector_engine)
         else: # 보이는 그룹이 없을 경우 예외 처리
-            all_layers_png_data = create_png_from_groups(all_top_level_groups, root.attrib, defs)
+            all_visible_layers_png = no_image
+            if with_images:
+                with stage_timer('render'):
+                    all_layers_png_data = create_png_from_groups(all_top_level_groups, root.attrib, defs)
+            else:
+                all_layers_png_data = no_image
             layer_name = os.path.splitext(original_filename)[0]
-            layer_results.append({
+            layer_result = {
                 "name": layer_name, 
                 "image": all_layers_png_data['image'],
-                "area": all_layers_png_data['area']
-            })
+                "area": all_layers_png_data['area'],
+                "bbox": all_layers_png_data.get('bbox'),
+            }
+            measurement = None
+            if measure_dpi is not None and all_top_level_groups:
+                with stage_timer('measure'):
+                    measurement = measure_layer_areas([None], all_top_level_groups, root.attrib, defs, measure_dpi, progress=progress)[0]
+            if area_engine == 'vector':
+                with stage_timer('vector_area'):
+                    layer_result.update(vector_engine.layer_area(*all_top_level_groups))
+            else:
+                apply_pixel_measurement(layer_result, all_layers_png_data, measurement)
+            layer_results.append(layer_result)
+            if lazy_images and all_top_level_groups:
+                with stage_timer('lazy_source'):
+                    svg_string = build_svg_string(all_top_level_groups, root.attrib, defs)
+                    render_source = {"visualization": svg_string, "layers": [svg_string], "offsets": [[0, 0]]}
+
+        # 지연 렌더링할 이미지의 위치는 미리 알려 줍니다. (SVG 는 store_result 에서 따로 보관)
+        if render_source is not None:
+            for layer_result, offset in zip(layer_results, render_source.pop("offsets")):
+                layer_result["offset"] = offset
 
         # 최종 데이터 반환 (special_visuals 제거, 클라이언트 중심 구조)
         return {
             "visualization": all_visible_layers_png['image'],
             "layers": layer_results,
+            "area_engine": area_engine,
+            "dpi": measure_dpi or IMAGE_DPI,
+            "page_size": list(page_pixel_size(root.attrib)),
+            "layer_source": 'inkscape',
+            "render_source": render_source,
         }
 
+    except InkscapePoolBusyError:
+        raise
     except Exception as e:
+        PROCESSING_ERRORS.inc(stage='process')
         print(f"SVG processing error: {e}")
         return {"visualization": None, "layers": []}
+
+# --- 헬퍼 함수: 캐시 확인 → 업로드 저장 → 처리 → 캐시 저장 ---
+# with_timings 이면 이번 요청의 단계별/레이어별 시간을 결과 사본의 "timings" 에 넣습니다.
+# (캐시에는 시간 정보 없는 결과만 저장합니다)
+# file_source 는 바이트 또는 UploadStream(스트리밍 업로드) 입니다.
+def run_calculation(file_source, filename, options, progress=None, with_timings=False):
+    with start_trace() as trace:
+        result, cached = calculate_with_cache(file_source, filename, options, progress)
+        if with_timings:
+            result = {**result, "timings": {**trace.to_dict(), "cached": cached}}
+        return result
+
+def calculate_with_cache(file_source, filename, options, progress):
+    settings = {**renderer_settings(), **options}
+    if isinstance(file_source, UploadStream):
+        if use_inkscape_pipe():
+            return calculate_streamed(file_source, filename, options, settings, progress)
+        file_source = file_source.read_all()
+    file_bytes = file_source
+
+    with stage_timer('cache_lookup'):
+        cache_key = make_cache_key(file_bytes, settings)
+        cached = result_cache.get(cache_key)
+    if cached is not None:
+        notify(progress, 'cached')
+        return cached, True
+
+    # memory 모드에서는 업로드를 디스크에 저장하지 않고 바이트 그대로 넘깁니다.
+    ai_save_path = None
+    try:
+        if PIPELINE_MODE == 'disk':
+            ai_save_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_{filename}")
+            with open(ai_save_path, 'wb') as f:
+                f.write(file_bytes)
+        processed_data = process_ai_file(ai_save_path or file_bytes, filename, progress=progress, **options)
+        store_result(cache_key, processed_data)
+        return processed_data, False
     finally:
-        if os.path.exists(svg_path):
-            os.remove(svg_path)
+        if ai_save_path:
+            remove_temp_files(ai_save_path)
+
+# 업로드를 받는 동안 변환이 진행되므로, 캐시는 업로드가 끝나 해시가 정해진 시점에 확인합니다.
+# 적중하면 진행 중인 변환을 멈추고 캐시된 결과를 돌려줍니다.
+def calculate_streamed(upload, filename, options, settings, progress):
+    lookup = {}
+
+    def check_cache(upload):
+        lookup["key"] = finish_cache_key(upload.sha256, settings)
+        lookup["result"] = result_cache.get(lookup["key"])
+        return lookup["result"] is not None
+
+    upload.on_complete = check_cache
+    try:
+        processed_data = process_ai_file(upload, filename, progress=progress, **options)
+    except UploadCancelled:
+        notify(progress, 'cached')
+        return lookup["result"], True
+    # Inkscape 가 입력을 끝까지 읽지 않고 끝난 경우에는 해시가 없으므로 캐시하지 않습니다.
+    store_result(lookup.get("key"), processed_data)
+    return processed_data, False
+
+def store_result(cache_key, processed_data):
+    # 지연 렌더링용 SVG 는 응답/결과에 넣지 않고 result_id 로 따로 보관합니다.
+    render_source = processed_data.pop("render_source", None)
+    # 처리 실패(빈 결과)는 캐시하지 않습니다.
+    # 캐시된 결과는 result_id 로 이미지 URL(/api/results/...)에서 다시 찾을 수 있습니다.
+    if processed_data["layers"] and cache_key:
+        processed_data["result_id"] = cache_key
+        with stage_timer('cache_store'):
+            if render_source is not None:
+                render_source_cache.put(cache_key, render_source)
+                processed_data["lazy_images"] = True
+            result_cache.put(cache_key, processed_data)
+
+# --- 헬퍼 함수: 파일 앞부분 검사 (변환 전에 잘못된 파일 거르기) ---
+def check_upload_header(head):
+    try:
+        return inspect_ai_header(head)
+    except UploadError:
+        REJECTED_UPLOADS.inc(reason='header')
+        raise
+
+# 폼으로 받은 파일은 앞부분만 읽어 검사하고 처음 위치로 되돌립니다.
+def check_uploaded_file(file):
+    head = file.stream.read(HEADER_SNIFF_BYTES)
+    file.stream.seek(0)
+    return check_upload_header(head)
+
+# --- 헬퍼 함수: 업로드 요청 검증 (오류 응답 또는 (파일명, 바이트, 옵션)) ---
+def read_upload_request():
+    if 'aiFile' not in request.files: return (jsonify({"error": "No file part"}), 400), None
+    file = request.files['aiFile']
+    if file.filename == '': return (jsonify({"error": "No selected file"}), 400), None
+    if not file.filename.endswith('.ai'):
+        return (jsonify({"error": "Invalid file type"}), 400), None
+
+    try:
+        options = parse_calculate_options(request.form)
+        check_uploaded_file(file)
+    except ValueError as e:
+        return (jsonify({"error": str(e)}), 400), None
+    return None, (secure_filename(file.filename), file.read(), options)
+
+# --- 스트리밍 업로드 ---
+# 폼(multipart) 대신 요청 본문에 파일 자체를 보내면(Content-Type: application/pdf 등)
+# 앞부분 검사 후 받는 대로 변환기에 넘깁니다. 파일명과 옵션은 쿼리 문자열로 받습니다.
+#   curl -X POST --data-binary @a.ai -H 'Content-Type: application/pdf' '/api/calculate?filename=a.ai&dpi=150'
+STREAM_UPLOAD_TYPES = ('application/pdf', 'application/postscript', 'application/illustrator',
+                       'application/octet-stream')
+
+def is_streamed_upload():
+    return request.mimetype in STREAM_UPLOAD_TYPES
+
+def read_streamed_upload():
+    filename = secure_filename(request.args.get('filename') or request.headers.get('X-Filename', ''))
+    if not filename: return (jsonify({"error": "filename is required"}), 400), None
+    if not filename.endswith('.ai'):
+        return (jsonify({"error": "Invalid file type"}), 400), None
+
+    upload = UploadStream(request.stream, MAX_UPLOAD_BYTES)
+    try:
+        options = parse_calculate_options(request.args)
+        check_upload_header(upload.peek(HEADER_SNIFF_BYTES))
+    except UploadError as e:
+        return (jsonify({"error": str(e)}), e.status_code), None
+    except ValueError as e:
+        return (jsonify({"error": str(e)}), 400), None
+    return None, (filename, upload, options)
+
+# --- 응답 형식 ---
+# 'full': 기존처럼 모든 이미지를 base64 로 포함한 JSON
+# 'meta': 이름/면적/경계 상자만 먼저 보내고, 이미지는 별도 URL(캐시 가능)로 받습니다.
+RESPONSE_FORMATS = ('full', 'meta')
+
+def requested_format():
+    response_format = request.values.get('format', 'full')
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format: {response_format}")
+    return response_format
+
+def to_metadata_response(result, image_ext='png'):
+    result_id = result.get("result_id")
+    base_url = f"/api/results/{result_id}" if result_id else None
+    layers = []
+    lazy = result.get("lazy_images")
+    for index, layer in enumerate(result["layers"]):
+        meta = {k: v for k, v in layer.items() if k != 'image'}
+        meta["image_url"] = f"{base_url}/layers/{index}.{image_ext}" if base_url and (layer.get('image') or lazy) else None
+        layers.append(meta)
+    data = {k: v for k, v in result.items() if k not in ('visualization', 'layers')}
+    data["visualization_url"] = f"{base_url}/visualization.{image_ext}" if base_url and (result.get('visualization') or lazy) else None
+    data["layers"] = layers
+    return data
+
+# timings=1 이면 처리 단계별/레이어별 시간을 응답에 포함합니다.
+def requested_timings():
+    return request.values.get('timings', '0') == '1'
+
+def format_result(result, response_format):
+    if "files" in result:  # 일괄 처리 결과는 이미지 없이 면적만 담고 있습니다.
+        return result
+    if response_format == 'meta':
+        return to_metadata_response(result, request.values.get('imageFormat', 'png'))
+    return result
 
 # --- API 엔드포인트 ---
 @app.route('/api/calculate', methods=['POST'])
 def calculate_endpoint():
-    if 'aiFile' not in request.files: return jsonify({"error": "No file part"}), 400
-    file = request.files['aiFile']
-    if file.filename == '': return jsonify({"error": "No selected file"}), 400
+    error_response, upload = read_streamed_upload() if is_streamed_upload() else read_upload_request()
+    if error_response: return error_response
+    filename, file_source, options = upload
+    try:
+        response_format = requested_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = run_calculation(file_source, filename, options, with_timings=requested_timings())
+        with stage_timer('encode'):
+            return jsonify(format_result(result, response_format))
+    except InkscapePoolBusyError as e:
+        return busy_response(str(e), 'renderer')
+    except subprocess.TimeoutExpired as e:
+        # 변환기가 멈췄거나 스트리밍 업로드가 제한 시간 안에 다 오지 않은 경우
+        return jsonify({"error": f"Inkscape conversion did not finish within {e.timeout}s"}), 504
+    except UploadError as e:
+        if isinstance(e, UploadTooLargeError):
+            REJECTED_UPLOADS.inc(reason='size')
+        return jsonify({"error": str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- 비동기 작업 API ---
+# POST로 작업을 등록하면 바로 job_id를 돌려주고, 진행 상황은 SSE로 받습니다.
+@app.route('/api/jobs', methods=['POST'])
+def create_job_endpoint():
+    error_response, upload = read_upload_request()
+    if error_response: return error_response
+    filename, file_bytes, options = upload
+
+    job = job_manager.submit(filename, run_calculation, file_bytes, filename, options,
+                             with_timings=requested_timings())
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
+    }), 202
 
-    if file and file.filename.endswith('.ai'):
-        filename = secure_filename(file.filename)
-        ai_save_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_{filename}")
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status_endpoint(job_id):
+    job = job_manager.get(job_id)
+    if job is None: return jsonify({"error": "Job not found"}), 404
+
+    try:
+        response_format = requested_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    data = job.summary()
+    if job.status == 'done':
+        data["result"] = format_result(job.result, response_format)
+    with stage_timer('encode'):
+        return jsonify(data)
+
+# --- 일괄 처리 API ---
+# 여러 aiFile 을 한 작업으로 등록합니다. 파일은 BATCH_WORKERS 개씩 동시에 처리되고,
+# 끝난 파일마다 'file' 이벤트가 나갑니다. 중간에 실패한 배치를 다시 보내면
+# 이미 처리된 파일은 결과 캐시에서 바로 나옵니다.
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '2'))
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', '50'))
+
+def run_batch_uploads(uploads, options, progress=None):
+    done_count = itertools.count(1)
+
+    def report(index, record):
+        notify(progress, 'file', index=index, file=record["file"], status=record["status"],
+               done=next(done_count), total=len(uploads))
+
+    items = [(name, hashlib.sha256(data).hexdigest(), lambda data=data: data) for name, data in uploads]
+    records = process_files(items, lambda data, name: run_calculation(data, name, options), BATCH_WORKERS, report)
+    return {"files": records, "failed": sum(1 for r in records if r["status"] != 'done')}
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch_endpoint():
+    files = [f for f in request.files.getlist('aiFile') if f.filename]
+    if not files: return jsonify({"error": "No file part"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"Too many files (max {BATCH_MAX_FILES})"}), 400
+    if any(not f.filename.endswith('.ai') for f in files):
+        return jsonify({"error": "Invalid file type"}), 400
+    try:
+        options = parse_calculate_options(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for f in files:
         try:
-            file.save(ai_save_path)
-            processed_data = process_ai_file(ai_save_path, filename)
-            return jsonify(processed_data)
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
-        finally:
-            if os.path.exists(ai_save_path):
-                os.remove(ai_save_path)
-    
-    return jsonify({"error": "Invalid file type"}), 400
+            check_uploaded_file(f)
+        except UploadError as e:
+            return jsonify({"error": f"{f.filename}: {e}"}), 400
+
+    uploads = [(secure_filename(f.filename), f.read()) for f in files]
+    job = job_manager.submit(f"{len(uploads)} files", run_batch_uploads, uploads, options)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "files": len(uploads),
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
+        "csv_url": f"/api/jobs/{job.id}/areas.csv",
+    }), 202
+
+@app.route('/api/jobs/<job_id>/areas.csv', methods=['GET'])
+def job_areas_csv_endpoint(job_id):
+    job = job_manager.get(job_id)
+    if job is None: return jsonify({"error": "Job not found"}), 404
+    if job.status != 'done': return jsonify(job.summary()), 409
+
+    result = job.result
+    records = result["files"] if "files" in result else [summarize_result(job.filename, None, result)]
+    return Response(rows_to_csv(records_to_rows(records)), mimetype='text/csv',
+                    headers={"Content-Disposition": f'attachment; filename="areas_{job_id}.csv"'})
+
+# --- 지연 렌더링 (images=lazy) ---
+# 계산할 때 보관한 레이어별 SVG 를 이미지 URL 을 처음 요청할 때 렌더링하고, 결과 PNG 를 캐시합니다.
+LAZY_SOURCE_ITEMS = int(os.environ.get('LAZY_SOURCE_ITEMS', '8'))
+LAZY_IMAGE_ITEMS = int(os.environ.get('LAZY_IMAGE_ITEMS', '64'))
+LAZY_CACHE_DISK_MB = int(os.environ.get('LAZY_CACHE_DISK_MB', '512'))
+render_source_cache = ResultCache(
+    max_items=LAZY_SOURCE_ITEMS,
+    disk_dir=os.path.join(RESULT_CACHE_FOLDER, 'sources') if LAZY_CACHE_DISK_MB > 0 else None,
+    disk_max_bytes=LAZY_CACHE_DISK_MB * 1024 * 1024,
+    write_through=CACHE_WRITE_THROUGH,
+)
+lazy_image_cache = ResultCache(
+    max_items=LAZY_IMAGE_ITEMS,
+    disk_dir=os.path.join(RESULT_CACHE_FOLDER, 'lazy_images') if LAZY_CACHE_DISK_MB > 0 else None,
+    disk_max_bytes=LAZY_CACHE_DISK_MB * 1024 * 1024,
+)
+
+def render_svg_png(svg_string):
+    if RENDER_ENGINE == 'cairosvg':
+        return render_svg_strings_cairosvg([svg_string])[0]
+    return render_svg_png_inkscape(svg_string)
+
+def lazy_png_bytes(result_id, key):
+    image_key = f"{result_id}-{key}"
+    cached = lazy_image_cache.get(image_key)
+    if cached is not None:
+        return base64.b64decode(cached["image"])
+
+    source = render_source_cache.get(result_id)
+    if source is None:
+        raise LookupError(result_id)
+    if key == 'visualization':
+        svg_string = source["visualization"]
+    else:
+        svg_string = source["layers"][key] if 0 <= key < len(source["layers"]) else None
+    if not svg_string:
+        raise LookupError(key)
+    with stage_timer('lazy_render'):
+        png_bytes = render_svg_png(svg_string)
+    lazy_image_cache.put(image_key, {"image": base64.b64encode(png_bytes).decode('utf-8')})
+    return png_bytes
+
+# --- 결과 이미지 제공 (내용 주소 기반이므로 오래 캐시해도 안전) ---
+IMAGE_MIMETYPES = {'png': 'image/png', 'webp': 'image/webp'}
+# ?size=N 이면 페이지를 N px 안에 맞춘 미리보기(레이어는 페이지 안 위치에 놓입니다)를 돌려줍니다.
+THUMBNAIL_MAX_SIZE = 512
+
+def result_png_bytes(result_id, key):
+    result = result_cache.get(result_id)
+    if result is None:
+        raise LookupError(result_id)
+    if key == 'visualization':
+        image = result.get('visualization')
+    else:
+        layers = result["layers"]
+        if not 0 <= key < len(layers):
+            raise LookupError(key)
+        image = layers[key].get('image')
+    if not image and result.get('lazy_images'):
+        return lazy_png_bytes(result_id, key)
+    if not image:
+        raise LookupError(key)
+    return base64.b64decode(image)
+
+# WebP 변환 결과만 캐시합니다. (찾지 못한 경우는 예외라서 캐시되지 않습니다)
+@lru_cache(maxsize=64)
+def result_webp_bytes(result_id, key):
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(result_png_bytes(result_id, key))).save(buffer, format='WEBP', lossless=True)
+    return buffer.getvalue()
+
+@lru_cache(maxsize=256)
+def result_thumbnail_bytes(result_id, key, size, ext):
+    image = Image.open(io.BytesIO(result_png_bytes(result_id, key))).convert('RGBA')
+    result = result_cache.get(result_id) or {}
+    page_width, page_height = result.get("page_size") or image.size
+    left, top = (0, 0) if key == 'visualization' else result["layers"][key].get('offset') or (0, 0)
+    scale = min(1.0, size / max(page_width, page_height))
+    thumbnail = Image.new('RGBA', (max(1, round(page_width * scale)), max(1, round(page_height * scale))))
+    scaled = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    thumbnail.alpha_composite(scaled, (min(round(left * scale), thumbnail.width - 1), min(round(top * scale), thumbnail.height - 1)))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format='PNG' if ext == 'png' else 'WEBP')
+    return buffer.getvalue()
+
+def result_image_response(result_id, key, ext):
+    if ext not in IMAGE_MIMETYPES: return jsonify({"error": "Unsupported image format"}), 400
+    size = request.args.get('size', type=int)
+    if size is not None and not 0 < size <= THUMBNAIL_MAX_SIZE:
+        return jsonify({"error": f"size must be between 1 and {THUMBNAIL_MAX_SIZE}"}), 400
+    etag = f'"{result_id}-{key}-{ext}"' if size is None else f'"{result_id}-{key}-{size}-{ext}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={"ETag": etag})
+
+    try:
+        if size is not None:
+            image_bytes = result_thumbnail_bytes(result_id, key, size, ext)
+        else:
+            image_bytes = result_png_bytes(result_id, key) if ext == 'png' else result_webp_bytes(result_id, key)
+    except LookupError:
+        return jsonify({"error": "Result not found"}), 404
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    return Response(image_bytes, mimetype=IMAGE_MIMETYPES[ext], headers=headers)
+
+@app.route('/api/results/<result_id>/visualization.<ext>', methods=['GET'])
+def result_visualization_endpoint(result_id, ext):
+    return result_image_response(result_id, 'visualization', ext)
+
+@app.route('/api/results/<result_id>/layers/<int:index>.<ext>', methods=['GET'])
+def result_layer_image_endpoint(result_id, index, ext):
+    return result_image_response(result_id, index, ext)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events_endpoint(job_id):
+    job = job_manager.get(job_id)
+    if job is None: return jsonify({"error": "Job not found"}), 404
+
+    def stream():
+        sent = 0
+        while True:
+            events = job.wait_events(sent, timeout=15)
+            if not events:
+                yield ": keep-alive\n\n"  # 프록시가 연결을 끊지 않도록
+                continue
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            sent += len(events)
+            if events[-1]["event"] in ('done', 'error'):
+                return
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream(), mimetype='text/event-stream', headers=headers)
     
+# --- 레이어 마스크 연산 API ---
+# 캐시된 결과의 레이어 이미지에서 alpha 마스크를 한 번만 만들어 비트 단위로 보관하고,
+# 선택한 레이어 조합의 합집합/교집합/차집합 면적을 다시 렌더링하지 않고 계산합니다.
+mask_cache = MaskCache(max_items=int(os.environ.get('MASK_CACHE_RESULTS', '8')))
+
+def build_layer_masks(result_id):
+    result = result_cache.get(result_id)
+    if result is None:
+        raise LookupError(result_id)
+    layers = result["layers"]
+    if not result.get('lazy_images') and any(not layer.get('image') for layer in layers):
+        raise LookupError("Layer image missing")
+    alphas = [png_alpha(result_png_bytes(result_id, index)) for index in range(len(layers))]
+    # 잘린 레이어 이미지는 offset 위치에 놓아 페이지 크기 마스크로 맞춥니다.
+    width, height = result.get("page_size") or (alphas[0].shape[1], alphas[0].shape[0])
+    masks = []
+    for layer, alpha in zip(layers, alphas):
+        left, top = layer.get('offset') or (0, 0)
+        mask = np.zeros((height, width), dtype=bool)
+        h, w = min(alpha.shape[0], height - top), min(alpha.shape[1], width - left)
+        mask[top:top + h, left:left + w] = alpha[:h, :w] > 0
+        masks.append(mask)
+    return LayerMasks(masks)
+
+@app.route('/api/ratio', methods=['POST'])
+def ratio_endpoint():
+    data = request.get_json(silent=True) or {}
+    result_id = data.get('result_id')
+    if not result_id: return jsonify({"error": "result_id is required"}), 400
+
+    try:
+        masks = mask_cache.get_or_build(result_id, lambda: build_layer_masks(result_id))
+    except LookupError:
+        return jsonify({"error": "Result not found"}), 404
+
+    try:
+        numerator = [int(i) for i in data.get('numerator', [])]
+        denominator = [int(i) for i in data.get('denominator', [])]
+    except (TypeError, ValueError):
+        return jsonify({"error": "numerator/denominator must be lists of layer indices"}), 400
+    if any(not 0 <= i < len(masks) for i in numerator + denominator):
+        return jsonify({"error": "Layer index out of range"}), 400
+
+    return jsonify({"result_id": result_id, **masks.selection_areas(numerator, denominator)})
+
+# 본문이 MAX_UPLOAD_MB 를 넘으면 Flask 가 읽기 전에 413 을 냅니다.
+@app.errorhandler(413)
+def upload_too_large(error):
+    REJECTED_UPLOADS.inc(reason='size')
+    return jsonify({"error": f"File too large (max {MAX_UPLOAD_MB} MB)"}), 413
+
+# --- 워커 시작/종료 (gunicorn.conf.py 의 post_fork / worker_exit 에서 호출) ---
+WARMUP_SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="8" height="8"><rect width="4" height="4"/></svg>'
+
+# 셸 워커 풀을 띄우고 작은 SVG 를 한 번 렌더링해 두어 첫 요청이 시작 비용을 치르지 않게 합니다.
+def warm_up():
+    started = time.perf_counter()
+    try:
+        get_inkscape_pool()
+        render_svg_png(WARMUP_SVG)
+    except Exception as e:
+        print(f"Renderer warm-up failed: {e}")
+        return
+    print(f"Renderer warm-up done in {time.perf_counter() - started:.2f}s (pid {os.getpid()})")
+
+# 새 작업은 받지 않고, 실행 중인 작업이 끝나기를 timeout 초까지 기다린 뒤 셸 워커를 내립니다.
+def drain(timeout):
+    if not job_manager.drain(timeout):
+        print(f"Drain timed out with {job_manager.active_count()} unfinished jobs (pid {os.getpid()})")
+    if _inkscape_pool is not None:
+        _inkscape_pool.shutdown()
+
+# --- 모니터링: 요청 지연 측정 + /metrics ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_latency(response):
+    # 스트리밍 응답(SSE)은 응답 객체를 만들 때까지의 시간입니다.
+    if 'request_started' in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=request.endpoint or 'unmatched',
+                             method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_timer(error=None):
+    if g.pop('request_started', None) is not None:
+        HTTP_IN_FLIGHT.dec()
+
+# --- 과부하 보호 ---
+# 업로드를 처리하는 요청은 이 워커에 들어와 있는 일(처리 중인 업로드 요청 + 끝나지 않은 작업)이
+# MAX_QUEUE_DEPTH 이상이면 본문을 읽기 전에 503 + Retry-After 로 돌려보냅니다.
+# 렌더러 슬롯/Inkscape 풀을 기다리다 시간이 지난 경우도 같은 형식으로 응답합니다.
+MAX_QUEUE_DEPTH = int(os.environ.get('MAX_QUEUE_DEPTH', '16'))
+RETRY_AFTER_SECONDS = int(os.environ.get('RETRY_AFTER_SECONDS', '10'))
+HEAVY_ENDPOINTS = ('calculate_endpoint', 'create_job_endpoint', 'create_batch_endpoint')
+
+heavy_requests = 0
+heavy_requests_lock = threading.Lock()
+
+def queue_depth():
+    return heavy_requests + job_manager.active_count()
+
+def busy_response(message, reason):
+    SHED_REQUESTS.inc(reason=reason)
+    response = jsonify({"error": message})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+@app.errorhandler(InkscapePoolBusyError)
+def renderer_busy(error):
+    return busy_response(str(error), 'renderer')
+
+@app.before_request
+def shed_load():
+    global heavy_requests
+    if request.endpoint not in HEAVY_ENDPOINTS:
+        return None
+    with heavy_requests_lock:
+        if queue_depth() >= MAX_QUEUE_DEPTH:
+            return busy_response("Server is busy, please retry", 'queue')
+        heavy_requests += 1
+    g.heavy_request = True
+    return None
+
+@app.teardown_request
+def finish_heavy_request(error=None):
+    global heavy_requests
+    if g.pop('heavy_request', False):
+        with heavy_requests_lock:
+            heavy_requests -= 1
+
+def job_counts():
+    return {(status,): count for status, count in job_manager.status_counts().items()}
+
+# 셸 워커 풀의 Inkscape 프로세스 (풀을 쓰지 않으면 0)
+def inkscape_pool_counts():
+    stats = _inkscape_pool.stats() if _inkscape_pool is not None else {"size": 0, "idle": 0}
+    return {('busy',): stats["size"] - stats["idle"], ('idle',): stats["idle"]}
+
+def renderer_slot_counts():
+    stats = renderer_slots.stats() if renderer_slots is not None else {"in_use": 0, "waiting": 0}
+    return {('in_use',): stats["in_use"], ('waiting',): stats["waiting"]}
+
+def inkscape_pool_restarts():
+    return {(): _inkscape_pool.stats()["restarts"] if _inkscape_pool is not None else 0}
+
+def cache_lookups():
+    webp = result_webp_bytes.cache_info()
+    return {
+        ('result', 'hit'): result_cache.hits, ('result', 'miss'): result_cache.misses,
+        ('layer', 'hit'): layer_cache.hits, ('layer', 'miss'): layer_cache.misses,
+        ('mask', 'hit'): mask_cache.hits, ('mask', 'miss'): mask_cache.misses,
+        ('webp', 'hit'): webp.hits, ('webp', 'miss'): webp.misses,
+        ('lazy_image', 'hit'): lazy_image_cache.hits, ('lazy_image', 'miss'): lazy_image_cache.misses,
+    }
+
+def cache_hit_ratios():
+    lookups = cache_lookups()
+    ratios = {}
+    for cache in ('result', 'layer', 'mask', 'webp', 'lazy_image'):
+        hits, misses = lookups[cache, 'hit'], lookups[cache, 'miss']
+        ratios[(cache,)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+metrics_registry.register(Gauge('bus_ad_jobs', "Unfinished background jobs", ['status'], callback=job_counts))
+metrics_registry.register(Gauge(
+    'bus_ad_inkscape_pool_processes', "Inkscape shell worker processes", ['state'], callback=inkscape_pool_counts))
+metrics_registry.register(Gauge(
+    'bus_ad_renderer_slots', "Renderer slots held or awaited by this worker", ['state'], callback=renderer_slot_counts))
+metrics_registry.register(Gauge(
+    'bus_ad_queue_depth', "Upload requests and unfinished jobs in this worker", callback=lambda: {(): queue_depth()}))
+metrics_registry.register(Counter(
+    'bus_ad_inkscape_pool_restarts_total', "Inkscape shell worker restarts", callback=inkscape_pool_restarts))
+metrics_registry.register(Counter(
+    'bus_ad_cache_lookups_total', "Cache lookups", ['cache', 'result'], callback=cache_lookups))
+metrics_registry.register(Gauge(
+    'bus_ad_cache_hit_ratio', "Cache hit ratio since start", ['cache'], callback=cache_hit_ratios))
+metrics_registry.register(Gauge(
+    'bus_ad_layer_memory_reserved_bytes', "Layer image memory reserved by running chunks",
+    callback=lambda: {(): layer_memory_budget.used}))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 # --- 웹페이지 제공 엔드포인트 ---
 @app.route('/')
 def serve_index():
@@ -0,0 +1,262 @@
+# batch_process.py
+# 여러 AI 파일(캠페인 폴더 전체)을 한 번에 처리해 레이어별 면적을 CSV/JSON/Parquet 로 저장합니다.
+# - 파일 단위로 제한된 수의 워커가 동시에 process_ai_file 을 실행합니다.
+# - 처리한 파일은 바로 작업 기록(<출력 파일>.journal.jsonl)에 추가되므로,
+#   중단된 실행을 같은 명령으로 다시 돌리면 끝난 파일은 건너뜁니다.
+#
+# 사용 예:
+#   python batch_process.py sample_data -o areas.csv --workers 2
+#   python batch_process.py a.ai b.ai -o areas.parquet --area-engine vector
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+OUTPUT_FORMATS = ('csv', 'json', 'jsonl', 'parquet')
+ROW_FIELDS = ['file', 'sha256', 'status', 'error', 'layer_index', 'layer_name', 'area',
+              'bbox_x0', 'bbox_y0', 'bbox_x1', 'bbox_y1']
+
+
+# --- 헬퍼 함수: 입력 경로(파일/폴더)를 AI 파일 목록으로 펼치기 ---
+def iter_input_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith('.ai')
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --- 헬퍼 함수: 처리 결과를 파일 단위 기록으로 요약 (이미지는 버리고 면적/경계 상자만) ---
+def summarize_result(filename, sha256, result=None, error=None):
+    record = {"file": filename, "sha256": sha256, "status": 'error' if error else 'done'}
+    if error:
+        record["error"] = error
+        record["layers"] = []
+        return record
+    record["result_id"] = result.get("result_id")
+    record["area_engine"] = result.get("area_engine")
+    record["layers"] = [
+        {"name": layer["name"], "area": layer["area"], "bbox": layer.get("bbox")}
+        for layer in result["layers"]
+    ]
+    return record
+
+
+# --- 헬퍼 함수: 파일 단위 기록 → 레이어 단위 표 형식 행 ---
+def records_to_rows(records):
+    rows = []
+    for record in records:
+        base = {"file": record["file"], "sha256": record.get("sha256"),
+                "status": record["status"], "error": record.get("error")}
+        if not record["layers"]:
+            rows.append(base)
+            continue
+        for index, layer in enumerate(record["layers"]):
+            bbox = layer.get("bbox") or [None] * 4
+            rows.append({
+                **base, "layer_index": index, "layer_name": layer["name"], "area": layer["area"],
+                "bbox_x0": bbox[0], "bbox_y0": bbox[1], "bbox_x1": bbox[2], "bbox_y1": bbox[3],
+            })
+    return rows
+
+
+def rows_to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ROW_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def write_output(records, output_path, output_format):
+    if output_format == 'parquet':
+        # Parquet 는 pandas + pyarrow 가 설치된 경우에만 지원합니다.
+        try:
+            import pandas as pd
+        except ImportError:
+            raise RuntimeError("Parquet output requires pandas and pyarrow")
+        pd.DataFrame(records_to_rows(records), columns=ROW_FIELDS).to_parquet(output_path, index=False)
+        return
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        if output_format == 'csv':
+            f.write(rows_to_csv(records_to_rows(records)))
+        elif output_format == 'jsonl':
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
+
+
+# --- 작업 기록: 파일 하나가 끝날 때마다 한 줄씩 추가 (중단 후 이어하기용) ---
+class BatchJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        # 같은 파일이 여러 번 기록되었으면 마지막 기록을 씁니다.
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 중단 시 잘린 마지막 줄
+                records[record["file"]] = record
+        return records
+
+    def append(self, record):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# --- 파일 단위 처리 (CLI 와 /api/batch 가 함께 씁니다) ---
+# items 는 (이름, sha256, 파일 바이트를 돌려주는 함수) 목록이고, 실패한 파일은 오류 기록이 됩니다.
+# on_record(i, record) 는 끝나는 순서대로 불리며, 기록은 입력 순서대로 돌려줍니다.
+def process_files(items, process, workers=2, on_record=None):
+    def process_one(name, sha256, load):
+        try:
+            result = process(load(), os.path.basename(name))
+        except Exception as e:
+            return summarize_result(name, sha256, error=str(e))
+        if not result["layers"]:
+            return summarize_result(name, sha256, error="No layers could be processed")
+        return summarize_result(name, sha256, result)
+
+    records = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='batch') as executor:
+        futures = {executor.submit(process_one, *item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            index = futures[future]
+            records[index] = future.result()
+            if on_record:
+                on_record(index, records[index])
+    return records
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# --- 일괄 처리 ---
+# process(file_bytes, filename) 는 app_for_Render.run_calculation 과 같은 결과를 돌려줍니다.
+def run_batch(files, process, workers=2, journal=None, retry_failed=True, on_record=None):
+    done = journal.load() if journal else {}
+    records = {}
+    pending = []
+    for path in files:
+        sha256 = file_sha256(path)
+        previous = done.get(path)
+        if previous and previous.get("sha256") == sha256 and (previous["status"] == 'done' or not retry_failed):
+            records[path] = previous
+        else:
+            pending.append((path, sha256, lambda path=path: read_file(path)))
+
+    def finished(index, record):
+        records[record["file"]] = record
+        if journal:
+            journal.append(record)
+        if on_record:
+            on_record(record)
+
+    process_files(pending, process, workers, finished)
+    # 입력 순서대로 돌려줍니다.
+    return [records[path] for path in files], len(files) - len(pending)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch layer area calculation for AI files")
+    parser.add_argument('inputs', nargs='+', help="AI files or folders containing AI files")
+    parser.add_argument('-o', '--output', required=True, help="output file (.csv, .json, .jsonl, .parquet)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, help="output format (default: from extension)")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('BATCH_WORKERS', '2')),
+                        help="files processed concurrently")
+    parser.add_argument('--area-engine', choices=('pixel', 'vector'), default='pixel')
+    parser.add_argument('--dpi', help="measurement resolution for the pixel engine (default: 96)")
+    parser.add_argument('--target-pixels', help="measurement resolution as total page pixels")
+    parser.add_argument('--restart', action='store_true', help="ignore the journal of a previous run")
+    parser.add_argument('--skip-failed', action='store_true', help="do not retry files that failed before")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in OUTPUT_FORMATS:
+        parser.error(f"Unknown output format: {output_format}")
+
+    if output_format == 'parquet':
+        try:
+            import pandas  # noqa: F401  (처리를 시작하기 전에 확인)
+        except ImportError:
+            parser.error("Parquet output requires pandas and pyarrow")
+
+    files = iter_input_files(args.inputs)
+    if not files:
+        parser.error("No AI files found")
+
+    # 앱 모듈은 Flask 앱/렌더러 설정을 함께 불러오므로 실제로 실행할 때만 가져옵니다.
+    from app_for_Render import parse_calculate_options, run_calculation
+
+    # 웹 요청과 같은 규칙으로 옵션을 만듭니다. (일괄 처리는 이미지가 필요 없음)
+    try:
+        options = parse_calculate_options({
+            'areaEngine': args.area_engine, 'dpi': args.dpi, 'targetPixels': args.target_pixels, 'images': '0',
+        })
+    except ValueError as e:
+        parser.error(str(e))
+    journal = BatchJournal(args.output + '.journal.jsonl')
+    if args.restart:
+        journal.reset()
+
+    started = time.perf_counter()
+    total = len(files)
+
+    def report(record):
+        status = record["status"] if record["status"] == 'done' else f"error: {record['error']}"
+        print(f"{record['file']} ({len(record['layers'])} layers) {status}", flush=True)
+
+    records, skipped = run_batch(
+        files, lambda data, name: run_calculation(data, name, options),
+        workers=args.workers, journal=journal, retry_failed=not args.skip_failed, on_record=report,
+    )
+    write_output(records, args.output, output_format)
+
+    failed = sum(1 for r in records if r["status"] != 'done')
+    print(f"{total} files ({skipped} resumed, {failed} failed) in {time.perf_counter() - started:.1f}s -> {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,341 @@
+# benchmark.py
+# 처리 파이프라인 성능 측정
+# - 대상: sample_data/*.ai, svg_output/*.svg, 합성한 다층 레이어 SVG
+# - 단계별 지연(convert / parse / raster / encode)과 end-to-end(process_ai_file) 시간, 최대 RSS
+# - /api/calculate 동시 요청 처리량
+# - app.py / app_v0.2.py / app_for_Render.py 의 process_ai_file 비교 (--variants)
+# - 저장된 기준값(--baseline)보다 느려지면 종료 코드 1
+# Inkscape 가 없으면 inkscape_stub.py 를 대신 씁니다. (--stub 으로 강제)
+#
+# 각 측정은 새 프로세스에서 실행하므로 최대 RSS 가 측정 간에 섞이지 않습니다.
+#
+# 사용 예:
+#   python benchmark.py
+#   python benchmark.py --repeat 5 --concurrency 4 --requests 16
+#   python benchmark.py --env RENDER_ENGINE=cairosvg --env CROP_LAYERS=1
+#   python benchmark.py --save-baseline benchmark_baseline.json
+#   python benchmark.py --baseline benchmark_baseline.json --tolerance 0.25
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+VARIANTS = ('app.py', 'app_v0.2.py', 'app_for_Render.py')
+SYNTHETIC_LAYERS = (10, 60)
+
+# 기준값 비교: 시간/메모리는 클수록, 처리량은 작을수록 나쁨
+LOWER_IS_BETTER = ('convert_s', 'parse_s', 'raster_s', 'encode_s', 'end_to_end_s', 'peak_rss_mb',
+                   'latency_p50_s', 'latency_p95_s')
+HIGHER_IS_BETTER = ('requests_per_s',)
+# 이보다 작은 시간 차이는 잡음으로 봅니다.
+MIN_TIME_DELTA_S = 0.02
+
+
+# --- 합성 SVG: 페이지 곳곳에 스티커 같은 작은 레이어가 많은 문서 ---
+def synthetic_svg(layers, shapes_per_layer=12, seed=0):
+    rng = random.Random(seed)
+    width, height = 3212.6, 1700.8
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        'xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+        f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        '<defs><linearGradient id="grad"><stop offset="0" stop-color="#f00"/>'
+        '<stop offset="1" stop-color="#00f"/></linearGradient></defs>',
+    ]
+    for i in range(layers):
+        # 레이어마다 페이지의 일부 영역에만 도형을 둡니다.
+        x0, y0 = rng.uniform(0, width * 0.8), rng.uniform(0, height * 0.8)
+        w, h = rng.uniform(80, width * 0.2), rng.uniform(80, height * 0.2)
+        parts.append(f'<g inkscape:groupmode="layer" id="layer{i}" inkscape:label="Layer_{i:02d}">')
+        for _ in range(shapes_per_layer):
+            x, y = x0 + rng.uniform(0, w), y0 + rng.uniform(0, h)
+            kind = rng.choice(('rect', 'circle', 'path'))
+            fill = rng.choice(('#336699', '#cc3300', 'url(#grad)'))
+            if kind == 'rect':
+                parts.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{rng.uniform(10, 60):.1f}" '
+                             f'height="{rng.uniform(10, 60):.1f}" fill="{fill}"/>')
+            elif kind == 'circle':
+                parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{rng.uniform(5, 40):.1f}" fill="{fill}"/>')
+            else:
+                parts.append(f'<path d="M{x:.1f},{y:.1f} c 20,-30 50,-30 70,0 s 10,40 -35,45 z" '
+                             f'fill="{fill}" stroke="#000" stroke-width="2"/>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def collect_inputs(include_synthetic=True, workdir=None):
+    files = sorted(glob.glob(os.path.join(BASE_DIR, 'sample_data', '*.ai')))
+    files += sorted(glob.glob(os.path.join(BASE_DIR, 'svg_output', '*.svg')))
+    if include_synthetic:
+        for layers in SYNTHETIC_LAYERS:
+            path = os.path.join(workdir, f"synthetic_{layers}_layers.svg")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(synthetic_svg(layers, seed=layers))
+            files.append(path)
+    return files
+
+
+# --- Inkscape 대역 준비 ---
+def install_stub(workdir):
+    bin_dir = os.path.join(workdir, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    wrapper = os.path.join(bin_dir, 'inkscape')
+    with open(wrapper, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(BASE_DIR, "inkscape_stub.py")}" "$@"\n')
+    os.chmod(wrapper, 0o755)
+    return bin_dir
+
+
+def peak_rss_mb():
+    # 리눅스에서 ru_maxrss 단위는 KB 입니다. (Inkscape 자식 프로세스는 fork 시점의 값을
+    # 물려받아 부정확하므로 앱 프로세스 자신만 봅니다)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def median(values):
+    return round(statistics.median(values), 4) if values else None
+
+
+# --- 측정 (자식 프로세스에서 실행) ---
+def run_stages_case(path, repeat):
+    import app_for_Render as app_module
+    from svg_stream import LazyPayloadStore, parse_svg_streaming
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    stages = {"convert_s": [], "parse_s": [], "raster_s": [], "encode_s": [], "end_to_end_s": []}
+    layers = 0
+    for _ in range(repeat):
+        svg_bytes, t = timed(app_module.run_inkscape_pipe, data, 'svg')
+        stages["convert_s"].append(t)
+        with LazyPayloadStore() as store:
+            doc, t = timed(parse_svg_streaming, io.BytesIO(svg_bytes), store)
+            stages["parse_s"].append(t)
+            groups = doc.groups(visible_only=True) or doc.groups()
+            layers = len(groups)
+            for i, g in enumerate(groups):
+                app_module.ensure_export_id(g, i)
+            render = app_module.RENDER_ENGINES[app_module.RENDER_ENGINE]
+            (composite, pngs), t = timed(render, groups, doc.root.attrib, doc.defs, groups)
+            stages["raster_s"].append(t)
+            _, t = timed(lambda: [app_module.png_bytes_to_result(p) for p in [composite] + pngs])
+            stages["encode_s"].append(t)
+        _, t = timed(app_module.process_ai_file, data, os.path.basename(path))
+        stages["end_to_end_s"].append(t)
+
+    result = {name: median(values) for name, values in stages.items()}
+    result["layers"] = layers
+    result["raster_per_layer_s"] = round(result["raster_s"] / layers, 4) if layers else None
+    return result
+
+
+def run_throughput_case(path, concurrency, requests):
+    import app_for_Render as app_module
+    client = app_module.app.test_client()
+    with open(path, 'rb') as f:
+        data = f.read()
+    name = os.path.basename(path).rsplit('.', 1)[0] + '.ai'
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            started = time.perf_counter()
+            response = client.post('/api/calculate', data={'aiFile': (io.BytesIO(data), name), 'format': 'meta'},
+                                   content_type='multipart/form-data')
+            elapsed = time.perf_counter() - started
+            with lock:
+                (latencies if response.status_code == 200 else errors).append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "requests_per_s": round(len(latencies) / wall, 3) if wall else None,
+        "latency_p50_s": median(latencies),
+        "latency_p95_s": round(latencies[int(0.95 * (len(latencies) - 1))], 4) if latencies else None,
+    }
+
+
+def run_variant_case(variant, path, repeat):
+    import importlib.util
+    # 파일 이름에 '.' 이 들어간 모듈(app_v0.2.py)도 있으므로 경로로 불러옵니다.
+    spec = importlib.util.spec_from_file_location(f"variant_{variant.replace('.', '_')}", os.path.join(BASE_DIR, variant))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    times = []
+    for _ in range(repeat):
+        # 예전 버전은 파일 경로만 받으므로 임시 파일로 넘깁니다.
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(path)[1]) as tmp:
+            shutil.copyfile(path, tmp.name)
+            result, t = timed(module.process_ai_file, tmp.name, os.path.basename(path))
+        times.append(t)
+    return {"end_to_end_s": median(times), "layers": len(result.get("layers", []))}
+
+
+def run_case(case):
+    if case["kind"] == 'stages':
+        result = run_stages_case(case["path"], case["repeat"])
+    elif case["kind"] == 'throughput':
+        result = run_throughput_case(case["path"], case["concurrency"], case["requests"])
+    else:
+        result = run_variant_case(case["variant"], case["path"], case["repeat"])
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+# --- 측정 실행 (부모 프로세스) ---
+def spawn_case(case, env):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case)],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+    if completed.returncode != 0 or not lines:
+        return {"error": (completed.stderr or completed.stdout).strip().splitlines()[-1:] or ['failed']}
+    return json.loads(lines[-1])
+
+
+def case_name(case):
+    name = os.path.basename(case["path"])
+    if case["kind"] == 'throughput':
+        return f"throughput:{name}:c{case['concurrency']}"
+    if case["kind"] == 'variant':
+        return f"variant:{case['variant']}:{name}"
+    return f"stages:{name}"
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key, value in metrics.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if key in LOWER_IS_BETTER and value > old * (1 + tolerance):
+                if key.endswith('_s') and value - old < MIN_TIME_DELTA_S:
+                    continue
+                regressions.append(f"{name} {key}: {old} -> {value}")
+            elif key in HIGHER_IS_BETTER and value < old * (1 - tolerance):
+                regressions.append(f"{name} {key}: {old} -> {value}")
+    return regressions
+
+
+def print_table(results):
+    for name, metrics in results.items():
+        shown = ', '.join(f"{k}={v}" for k, v in metrics.items() if v is not None)
+        print(f"{name}\n    {shown}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AI/SVG processing pipeline")
+    parser.add_argument('inputs', nargs='*', help="files to benchmark (default: sample_data, svg_output, synthetic)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=8)
+    parser.add_argument('--no-synthetic', action='store_true')
+    parser.add_argument('--variants', action='store_true', help="also compare app.py / app_v0.2.py / app_for_Render.py")
+    parser.add_argument('--stub', action='store_true', help="use inkscape_stub.py even if Inkscape is installed")
+    parser.add_argument('--stub-startup-ms', type=int, default=0, help="simulated Inkscape start-up time")
+    parser.add_argument('--env', action='append', default=[], help="KEY=VALUE passed to the app (repeatable)")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="fail if results regress against this file")
+    parser.add_argument('--save-baseline', help="write results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix='bus_ad_bench_')
+    try:
+        env = dict(os.environ)
+        # 결과/레이어/지연 이미지 캐시를 모두 끄고 매번 실제로 처리합니다.
+        # (켜 두면 반복 실행과 기준선 비교가 캐시 적중을 재게 됩니다)
+        env.update(RESULT_CACHE_ITEMS='0', RESULT_CACHE_DISK_MB='0',
+                   LAYER_CACHE_ITEMS='0', LAYER_CACHE_DISK_MB='0',
+                   LAZY_SOURCE_ITEMS='0', LAZY_IMAGE_ITEMS='0', LAZY_CACHE_DISK_MB='0')
+        env.update(dict(item.split('=', 1) for item in args.env))
+        use_stub = args.stub or shutil.which('inkscape', path=env.get('PATH')) is None
+        if use_stub:
+            env['PATH'] = install_stub(workdir) + os.pathsep + env.get('PATH', '')
+            env['INKSCAPE_STUB_STARTUP_MS'] = str(args.stub_startup_ms)
+        print(f"inkscape: {'stub' if use_stub else shutil.which('inkscape')}", flush=True)
+
+        files = [os.path.abspath(p) for p in args.inputs] or collect_inputs(not args.no_synthetic, workdir)
+        cases = [{"kind": 'stages', "path": p, "repeat": args.repeat} for p in files]
+        if args.concurrency > 0 and args.requests > 0 and files:
+            cases.append({"kind": 'throughput', "path": files[0],
+                          "concurrency": args.concurrency, "requests": args.requests})
+        if args.variants:
+            ai_files = [p for p in files if p.endswith('.ai')][:1] or files[:1]
+            cases += [{"kind": 'variant', "variant": v, "path": p, "repeat": args.repeat}
+                      for v in VARIANTS for p in ai_files]
+
+        results = {}
+        for case in cases:
+            name = case_name(case)
+            print(f"running {name} ...", flush=True)
+            results[name] = spawn_case(case, env)
+        print_table(results)
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+        if args.save_baseline:
+            with open(args.save_baseline, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"baseline saved to {args.save_baseline}")
+
+        failed = [name for name, r in results.items() if 'error' in r]
+        for name in failed:
+            print(f"FAILED {name}: {results[name]['error']}")
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            if regressions:
+                return 1
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+# 운영 서버 설정: gunicorn -c gunicorn.conf.py app_for_Render:app
+# - WEB_WORKERS 개의 프로세스 x WEB_THREADS 개의 스레드로 요청을 받습니다.
+# - 렌더러 프로세스 수는 워커 수와 상관없이 RENDER_SLOTS 로 서버 전체에서 제한됩니다. (app_for_Render.py)
+# - 무거운 모듈(numpy, PIL, shapely, Flask 앱)은 마스터에서 한 번 불러오고(preload) 워커는 fork 로 나눠 씁니다.
+#   렌더러(Inkscape 셸 풀 등)는 워커마다 시작할 때 한 번 데워 둡니다.
+# - 종료(SIGTERM) 시 새 요청을 받지 않고, 실행 중인 요청/작업이 DRAIN_SECONDS 안에 끝나기를 기다립니다.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_WORKERS', '2'))
+threads = int(os.environ.get('WEB_THREADS', '8'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+keepalive = 5
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+
+DRAIN_SECONDS = int(os.environ.get('DRAIN_SECONDS', '90'))
+# 마스터는 이 시간이 지나면 워커를 강제로 끝냅니다. (요청 마무리 + 작업 드레인 + 셸 워커 종료)
+graceful_timeout = DRAIN_SECONDS + 15
+
+# 워커가 여럿이면 같은 사용자의 후속 요청(작업 상태, 결과 이미지, /api/ratio)이 다른 워커로 갈 수 있으므로
+# 작업 상태와 결과 캐시를 모든 워커가 보는 파일로 공유합니다. (앱을 불러오기 전에 정해야 합니다)
+# 작업 결과(이미지 포함)는 클 수 있으므로 /dev/shm (Docker 기본 64MB) 이 아니라 디스크에 둡니다.
+if workers > 1:
+    os.environ.setdefault('JOB_STATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_state'))
+    os.environ.setdefault('CACHE_WRITE_THROUGH', '1')
+
+
+def post_fork(server, worker):
+    import app_for_Render
+    app_for_Render.warm_up()
+
+
+def worker_exit(server, worker):
+    import app_for_Render
+    app_for_Render.drain(DRAIN_SECONDS)
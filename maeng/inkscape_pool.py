@@ -0,0 +1,256 @@
+# inkscape_pool.py
+# Inkscape --shell 모드 프로세스를 미리 띄워두고 요청 간에 재사용하는 워커 풀
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+
+# Inkscape 셸은 명령 하나를 끝낼 때마다 "> " 프롬프트를 출력합니다.
+PROMPT = b"> "
+
+# 셸은 실패해도 프롬프트를 다시 띄우므로 출력(stdout + stderr)에서 오류 메시지를 찾습니다.
+# GTK/GLib 경고와 PDF 가져오기 중 poppler 가 내는 복구 가능한 메시지는 제외합니다.
+_ERROR_RE = re.compile(r'\b(error|failed|could not|unable to|cannot)\b', re.I)
+_NOISE_RE = re.compile(r'WARNING \*\*|^\s*\(?(Gtk|GLib|Gdk)|^\s*Syntax (Error|Warning)', re.I)
+
+
+class InkscapePoolError(RuntimeError):
+    pass
+
+
+class InkscapePoolBusyError(InkscapePoolError):
+    # 대기열이 가득 차서 작업을 받을 수 없을 때 (백프레셔)
+    status_code = 503
+
+
+class InkscapeTimeoutError(InkscapePoolError):
+    pass
+
+
+class InkscapeActionError(InkscapePoolError):
+    # 셸이 명령 실행 실패를 알렸을 때 (워커 자체는 정상)
+    def __init__(self, action, message):
+        super().__init__(f"Inkscape action '{action}' failed: {message}")
+        self.action = action
+        self.message = message
+
+
+def find_error(output):
+    for line in output.splitlines():
+        if _ERROR_RE.search(line) and not _NOISE_RE.search(line):
+            return line.strip()
+    return None
+
+
+# --- 워커: Inkscape 셸 프로세스 하나 ---
+class InkscapeWorker:
+    def __init__(self, binary="inkscape", startup_timeout=60):
+        self.binary = binary
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.jobs_done = 0
+        self._chunks = queue.Queue()
+
+    def start(self):
+        self._chunks = queue.Queue()
+        self.process = subprocess.Popen(
+            [self.binary, "--shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+        # stdout은 별도 스레드에서 읽어 큐에 쌓습니다. (타임아웃 처리를 위해)
+        threading.Thread(target=self._pump_stdout, args=(self.process, self._chunks), daemon=True).start()
+        self._read_until_prompt(self.startup_timeout)
+        self.jobs_done = 0
+
+    @staticmethod
+    def _pump_stdout(process, chunks):
+        fd = process.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b""
+            chunks.put(data)
+            if not data:
+                return
+
+    def _read_until_prompt(self, timeout):
+        deadline = time.monotonic() + timeout
+        output = b""
+        while not output.endswith(PROMPT):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise InkscapeTimeoutError(f"Inkscape did not respond within {timeout}s")
+            try:
+                data = self._chunks.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if not data:
+                raise InkscapePoolError(f"Inkscape worker exited: {output.decode('utf-8', 'replace')[-500:]}")
+            output += data
+        return output[:-len(PROMPT)].decode("utf-8", "replace")
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _send(self, action, timeout):
+        self.process.stdin.write(action.encode("utf-8") + b"\n")
+        self.process.stdin.flush()
+        return self._read_until_prompt(timeout)
+
+    # 작업 하나를 실행하고 재시작 기준이 되는 작업 수를 셉니다.
+    def run(self, actions, timeout):
+        try:
+            return self._run(actions, timeout)
+        finally:
+            self.jobs_done += 1
+
+    # 명령을 한 줄에 하나씩 보내 실패한 명령을 정확히 알 수 있게 합니다.
+    def _run(self, actions, timeout):
+        if not self.is_alive():
+            raise InkscapePoolError("Inkscape worker is not running")
+        deadline = time.monotonic() + timeout
+        outputs = []
+        for action in actions:
+            output = self._send(action, max(0.0, deadline - time.monotonic()))
+            error = find_error(output)
+            if error:
+                # 남은 명령은 보내지 않고, 열린 문서만 닫아 다음 작업에 남지 않게 합니다.
+                if action != "file-close":
+                    self._send("file-close", max(1.0, deadline - time.monotonic()))
+                raise InkscapeActionError(action, error)
+            outputs.append(output)
+        return "".join(outputs)
+
+    def ping(self, timeout=10):
+        # 가벼운 명령으로 응답 여부를 확인합니다. (작업 수에는 넣지 않습니다)
+        try:
+            self._run(["inkscape-version"], timeout)
+            return True
+        except (InkscapePoolError, OSError):
+            return False
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write(b"quit\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        finally:
+            self.process = None
+
+
+# --- 워커 풀 ---
+class InkscapePool:
+    def __init__(self, size=2, job_timeout=120, queue_size=8, queue_timeout=30,
+                 health_interval=30, max_jobs_per_worker=200, binary="inkscape"):
+        self.size = size
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.binary = binary
+        # 실행 중 + 대기 중 작업 수의 상한 (넘으면 즉시 거절)
+        self._admission = threading.BoundedSemaphore(size + queue_size)
+        self._idle = queue.Queue()
+        self._closed = False
+        self._restarts = 0
+        self._lock = threading.Lock()
+
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+        self._health_interval = health_interval
+        if health_interval:
+            threading.Thread(target=self._health_loop, daemon=True).start()
+
+    def _spawn(self):
+        worker = InkscapeWorker(self.binary)
+        try:
+            worker.start()
+        except (InkscapePoolError, OSError) as e:
+            # 시작 실패한 워커도 풀에 넣고, 사용할 때 다시 띄웁니다.
+            print(f"Inkscape worker start failed: {e}")
+            worker.stop()
+        return worker
+
+    def _restart(self, worker):
+        worker.stop()
+        with self._lock:
+            self._restarts += 1
+        try:
+            worker.start()
+        except (InkscapePoolError, OSError) as e:
+            print(f"Inkscape worker restart failed: {e}")
+            worker.stop()
+
+    def run(self, actions, timeout=None):
+        if self._closed:
+            raise InkscapePoolError("Inkscape pool is closed")
+        if not self._admission.acquire(blocking=False):
+            raise InkscapePoolBusyError("Inkscape pool queue is full")
+        try:
+            try:
+                worker = self._idle.get(timeout=self.queue_timeout)
+            except queue.Empty:
+                raise InkscapePoolBusyError(f"No Inkscape worker available within {self.queue_timeout}s")
+            try:
+                if not worker.is_alive():
+                    self._restart(worker)
+                return worker.run(actions, timeout or self.job_timeout)
+            except InkscapeActionError:
+                raise
+            except (InkscapePoolError, OSError):
+                # 타임아웃/크래시가 난 워커는 상태를 알 수 없으므로 새로 띄웁니다.
+                self._restart(worker)
+                raise
+            finally:
+                if worker.is_alive() and worker.jobs_done >= self.max_jobs_per_worker:
+                    self._restart(worker)
+                self._idle.put(worker)
+        finally:
+            self._admission.release()
+
+    def _health_loop(self):
+        while not self._closed:
+            time.sleep(self._health_interval)
+            self.health_check()
+
+    def health_check(self):
+        # 놀고 있는 워커만 점검합니다. (작업 중인 워커는 run에서 처리)
+        checked = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not worker.is_alive() or not worker.ping():
+                self._restart(worker)
+            checked.append(worker)
+        for worker in checked:
+            self._idle.put(worker)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "restarts": self._restarts,
+        }
+
+    def shutdown(self):
+        self._closed = True
+        for _ in range(self.size):
+            try:
+                worker = self._idle.get(timeout=self.job_timeout)
+            except queue.Empty:
+                break
+            worker.stop()
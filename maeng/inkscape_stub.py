@@ -0,0 +1,188 @@
+# inkscape_stub.py
+# Inkscape 가 설치되지 않은 환경(개발 PC, CI)에서 벤치마크/동작 확인용으로 쓰는 대역
+# - 앱이 쓰는 호출 방식만 흉내냅니다: 파일 인자 + --actions, --export-*, --pipe, --shell
+# - SVG 내보내기: 입력이 SVG 이면 그대로, AI 이면 INKSCAPE_STUB_SVG(기본: svg_output/250718_01.svg)를 돌려줍니다.
+# - PNG 내보내기: 요청한 영역/DPI 에 맞는 크기로, 내보내는 대상(id)마다 정해진 타원을 그립니다.
+#   영역은 실제 Inkscape 처럼 정합니다: export-area-page 는 꺼질 때까지 남고, export-area 와 함께 켜져
+#   있으면 경고를 내고 페이지 전체를 씁니다. 둘 다 없으면 export-id 가 있을 때 그 대상의 경계 상자입니다.
+# - INKSCAPE_STUB_STARTUP_MS: 프로세스 시작 지연 흉내 (기본 0)
+# - INKSCAPE_STUB_HANG_S: --pipe 변환이 멈춘 것처럼 입력을 읽지 않고 그만큼 기다림 (기본 0)
+# - INKSCAPE_STUB_STDERR_KB: --pipe 에서 입력을 읽기 전에 stderr 로 내는 경고 양 (기본 0)
+import hashlib
+import io
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from PIL import Image, ImageDraw
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_SVG = os.path.join(BASE_DIR, 'svg_output', '250718_01.svg')
+UNIT_TO_PX = {'': 1.0, 'px': 1.0, 'pt': 96 / 72, 'pc': 16.0, 'mm': 96 / 25.4, 'cm': 96 / 2.54, 'in': 96.0}
+
+
+def parse_length(value, default):
+    value = (value or '').strip()
+    number = value.rstrip('abcdefghijklmnopqrstuvwxyz%')
+    try:
+        return float(number) * UNIT_TO_PX.get(value[len(number):], 1.0)
+    except ValueError:
+        return default
+
+
+class StubState:
+    def __init__(self):
+        self.source = None
+        self.export_id = None
+        self.export_id_only = False
+        self.export_type = None
+        self.export_filename = None
+        self.export_area_page = False
+        self.export_area = None
+        self.export_dpi = 96.0
+        self._doc = None
+
+    def open(self, path):
+        self.source = path
+        self._doc = None
+
+    def document(self):
+        # (svg 여부, 원본 바이트, 페이지 px 크기, viewBox)
+        if self._doc is None:
+            data = sys.stdin.buffer.read() if self.source == '-' else open(self.source, 'rb').read()
+            is_svg = data.lstrip()[:1] == b'<'
+            svg = data if is_svg else open(os.environ.get('INKSCAPE_STUB_SVG', DEFAULT_SVG), 'rb').read()
+            root = ET.fromstring(svg)
+            width = parse_length(root.get('width'), 1000.0)
+            height = parse_length(root.get('height'), 1000.0)
+            view_box = [float(v) for v in (root.get('viewBox') or '').replace(',', ' ').split()]
+            if len(view_box) != 4:
+                view_box = [0.0, 0.0, width, height]
+            self._doc = (is_svg, data if is_svg else svg, width, height, view_box)
+        return self._doc
+
+    def set(self, key, value):
+        if key == 'export-id':
+            self.export_id = value or None
+        elif key == 'export-id-only':
+            self.export_id_only = value != 'false'
+        elif key == 'export-type':
+            self.export_type = value or None
+        elif key == 'export-filename':
+            self.export_filename = value
+        elif key == 'export-area-page':
+            self.export_area_page = value != 'false'
+        elif key == 'export-area':
+            self.export_area = [float(v) for v in value.split(':')] if value else None
+        elif key == 'export-dpi':
+            self.export_dpi = float(value)
+
+    def export(self):
+        export_type = self.export_type or os.path.splitext(self.export_filename or '')[1].lstrip('.') or 'svg'
+        data = self.render_svg() if export_type == 'svg' else self.render_png()
+        if self.export_filename in (None, '-'):
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+        else:
+            with open(self.export_filename, 'wb') as f:
+                f.write(data)
+
+    def render_svg(self):
+        return self.document()[1]
+
+    # 대상마다 페이지 안의 정해진 위치에 그리는 타원 (사용자 단위 경계 상자, 색)
+    def shape(self):
+        _, _, _, _, (vb_x, vb_y, vb_w, vb_h) = self.document()
+        digest = hashlib.md5(str(self.export_id).encode('utf-8')).digest()
+        cx = vb_x + vb_w * (0.2 + 0.6 * digest[0] / 255)
+        cy = vb_y + vb_h * (0.2 + 0.6 * digest[1] / 255)
+        rx, ry = vb_w * (0.05 + 0.15 * digest[2] / 255), vb_h * (0.05 + 0.15 * digest[3] / 255)
+        return (cx - rx, cy - ry, cx + rx, cy + ry), (digest[4], digest[5], digest[6], 255)
+
+    def area(self):
+        _, _, _, _, (vb_x, vb_y, vb_w, vb_h) = self.document()
+        page = (vb_x, vb_y, vb_x + vb_w, vb_y + vb_h)
+        if self.export_area_page:
+            if self.export_area:
+                sys.stderr.write('cannot use --export-area-page and --export-area at the same time; '
+                                 'using the page area\n')
+                sys.stderr.flush()
+            return page
+        if self.export_area:
+            return self.export_area
+        return self.shape()[0] if self.export_id else page
+
+    def render_png(self):
+        _, _, width, height, (vb_x, vb_y, vb_w, vb_h) = self.document()
+        # 사용자 단위 영역 → 문서 px → 출력 픽셀
+        x0, y0, x1, y1 = self.area()
+        scale = self.export_dpi / 96.0
+        sx, sy = width / vb_w * scale, height / vb_h * scale
+        out_w, out_h = max(1, round((x1 - x0) * sx)), max(1, round((y1 - y0) * sy))
+
+        # 잘린 영역이면 타원의 그 부분만 보입니다.
+        (ex0, ey0, ex1, ey1), color = self.shape()
+        img = Image.new('RGBA', (out_w, out_h), (0, 0, 0, 0))
+        ImageDraw.Draw(img).ellipse([(ex0 - x0) * sx, (ey0 - y0) * sy, (ex1 - x0) * sx, (ey1 - y0) * sy], fill=color)
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def run_actions(self, actions):
+        for action in actions.split(';'):
+            key, _, value = action.strip().partition(':')
+            if not key:
+                continue
+            if key == 'file-open':
+                self.open(value)
+            elif key == 'file-close':
+                self.source, self._doc = None, None
+            elif key == 'export-do':
+                self.export()
+            elif key == 'inkscape-version':
+                print('Inkscape 1.2 (stub)')
+            else:
+                self.set(key, value)
+
+
+def main(args):
+    time.sleep(int(os.environ.get('INKSCAPE_STUB_STARTUP_MS', '0')) / 1000)
+    state = StubState()
+    if '--version' in args:
+        print('Inkscape 1.2 (stub)')
+        return 0
+
+    if '--shell' in args:
+        sys.stdout.write('Inkscape interactive shell mode.\n> ')
+        sys.stdout.flush()
+        for line in sys.stdin:
+            if line.strip() == 'quit':
+                break
+            try:
+                state.run_actions(line.strip())
+            except Exception as e:  # 실제 셸처럼 오류를 출력하고 계속 받습니다.
+                print(f'stub error: {e}')
+            sys.stdout.write('> ')
+            sys.stdout.flush()
+        return 0
+
+    if '--pipe' in args:
+        time.sleep(float(os.environ.get('INKSCAPE_STUB_HANG_S', '0')))
+        for _ in range(int(os.environ.get('INKSCAPE_STUB_STDERR_KB', '0'))):
+            sys.stderr.write('W' * 1023 + '\n')
+        sys.stderr.flush()
+    files = [a for a in args if not a.startswith('-')]
+    options = dict(a[2:].split('=', 1) if '=' in a else (a[2:], '') for a in args if a.startswith('--'))
+    state.open('-' if '--pipe' in args else files[0])
+    if 'actions' in options:
+        state.run_actions(options.pop('actions'))
+        return 0
+    for key, value in options.items():
+        state.set(key, value)
+    state.export()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,271 @@
+# jobs.py
+# 백그라운드 작업 관리: 작업 id 발급, 진행 상황 이벤트 기록, 결과 보관
+# state_dir 가 주어지면 작업 상태를 파일로도 남겨, 같은 폴더를 쓰는 다른 프로세스
+# (gunicorn 워커)에서 상태/이벤트/결과를 조회할 수 있습니다.
+# - <id>.json: 상태 (작은 파일, 상태가 바뀔 때만 다시 씁니다)
+# - <id>.events: 진행 이벤트 (한 줄에 하나씩 덧붙입니다)
+# - <id>.result.json: 결과 (끝날 때 한 번만 씁니다)
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    # state_path 는 상태 파일 경로에서 확장자를 뺀 부분입니다.
+    def __init__(self, filename, state_path=None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = 'queued'
+        self.status_code = None
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cond = threading.Condition()
+        self._state_path = state_path
+        self._save_lock = threading.Lock()
+
+    def emit(self, event, **data):
+        entry = {"event": event, **data}
+        with self._cond:
+            self.events.append(entry)
+            self._cond.notify_all()
+        self._append_event(entry)
+
+    def start(self):
+        self.status = 'running'
+        self.save()
+
+    def finish(self, result=None, error=None, status_code=500):
+        entry = {"event": 'error' if error else 'done', **({"error": error} if error else {})}
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.status = entry["event"]
+            self.status_code = status_code if error else 200
+            self.finished_at = time.time()
+            self.events.append(entry)
+            self._cond.notify_all()
+        # 다른 프로세스가 'done' 상태를 읽었을 때 결과 파일이 이미 있도록 결과 → 상태 → 이벤트 순서로 씁니다.
+        if not error:
+            self._write_json(f"{self._state_path}.result.json", result)
+        self.save()
+        self._append_event(entry)
+
+    def to_state(self):
+        with self._cond:
+            return {
+                "id": self.id, "filename": self.filename, "status": self.status, "status_code": self.status_code,
+                "error": self.error, "created_at": self.created_at, "finished_at": self.finished_at,
+            }
+
+    def save(self):
+        # 저장 순서가 뒤바뀌지 않도록 한 번에 하나씩 씁니다. (나중 저장이 항상 최신 상태)
+        with self._save_lock:
+            self._write_json(f"{self._state_path}.json", self.to_state())
+
+    def _write_json(self, path, value):
+        if self._state_path is None:
+            return
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Job state write failed: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _append_event(self, entry):
+        if self._state_path is None:
+            return
+        try:
+            line = json.dumps(entry) + '\n'
+            with self._save_lock, open(f"{self._state_path}.events", 'a', encoding='utf-8') as f:
+                f.write(line)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Job event write failed: {e}")
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def wait_events(self, start, timeout):
+        # start 이후의 이벤트를 돌려줍니다. 새 이벤트가 없으면 timeout 동안 기다립니다.
+        with self._cond:
+            if len(self.events) <= start and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[start:]
+
+    def summary(self):
+        latest = next((e for e in reversed(self.events) if e["event"] == 'progress'), None)
+        data = {"job_id": self.id, "filename": self.filename, "status": self.status, "progress": latest}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+# 다른 프로세스가 파일로 남긴 작업 (읽기 전용, Job 과 같은 방식으로 조회)
+class StoredJob(Job):
+    def __init__(self, state_path):
+        super().__init__(None)
+        self._source_path = state_path
+        self._load()
+
+    def _load(self):
+        with open(f"{self._source_path}.json", 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.events = self._read_events()
+        if state["status"] == 'done':
+            with open(f"{self._source_path}.result.json", 'r', encoding='utf-8') as f:
+                self.result = json.load(f)
+        for key, value in state.items():
+            setattr(self, key, value)
+        # 끝난 상태는 저장됐지만 마지막 이벤트 줄은 아직 덧붙여지지 않은 경우
+        if self.finished and (not self.events or self.events[-1]["event"] not in ('done', 'error')):
+            self.events.append({"event": self.status, **({"error": self.error} if self.error else {})})
+
+    def _read_events(self):
+        events = []
+        try:
+            with open(f"{self._source_path}.events", 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # 아직 쓰는 중인 줄
+                    events.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        return events
+
+    def wait_events(self, start, timeout, poll_interval=0.5):
+        deadline = time.monotonic() + timeout
+        while len(self.events) <= start and not self.finished and time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            try:
+                self._load()
+            except (OSError, ValueError):
+                pass  # 쓰는 중이거나 정리된 경우: 이미 읽은 상태를 씁니다.
+        return self.events[start:]
+
+
+class JobManager:
+    def __init__(self, max_workers=2, retention_seconds=600, max_jobs=200, state_dir=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self.state_dir = state_dir
+        self.draining = False
+        self._jobs = {}
+        self._lock = threading.Lock()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, job_id) if self.state_dir else None
+
+    def submit(self, filename, func, *args, **kwargs):
+        # func 는 마지막 키워드 인자로 progress 콜백(job.emit)을 받습니다.
+        job = Job(filename)
+        job._state_path = self._state_path(job.id)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.save()
+        self.executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        if self.draining:
+            job.finish(error="Server is shutting down, please retry", status_code=503)
+            return
+        job.start()
+        job.emit('progress', stage='started')
+        try:
+            job.finish(result=func(*args, progress=job.emit, **kwargs))
+        except Exception as e:
+            job.finish(error=str(e), status_code=getattr(e, 'status_code', 500))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir and all(c in '0123456789abcdef' for c in job_id):
+            try:
+                job = StoredJob(self._state_path(job_id))
+            except (OSError, ValueError):
+                return None
+        return job
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def status_counts(self):
+        counts = {'queued': 0, 'running': 0}
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.finished:
+                    counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            self._forget(job_id)
+        # 그래도 너무 많으면 오래된 완료 작업부터 지웁니다.
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        while len(self._jobs) >= self.max_jobs and finished:
+            self._forget(finished.pop(0).id)
+        if self.state_dir:
+            self._prune_state_files(now)
+
+    # 종료된 다른 프로세스가 남긴 파일도 오래되면 지웁니다.
+    # (실행 중인 작업은 상태 파일이 오래돼도 이벤트 파일이 계속 갱신되므로 작업의 가장 최근 파일 기준)
+    def _prune_state_files(self, now):
+        files = {}
+        for name in os.listdir(self.state_dir):
+            job_id = name.split('.', 1)[0]
+            if job_id in self._jobs:
+                continue
+            path = os.path.join(self.state_dir, name)
+            try:
+                files.setdefault(job_id, []).append((path, os.path.getmtime(path)))
+            except OSError:
+                pass
+        for entries in files.values():
+            if now - max(mtime for _, mtime in entries) <= self.retention_seconds:
+                continue
+            for path, _ in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _forget(self, job_id):
+        del self._jobs[job_id]
+        if self.state_dir:
+            for suffix in ('.json', '.events', '.result.json'):
+                try:
+                    os.remove(self._state_path(job_id) + suffix)
+                except OSError:
+                    pass
+
+    # 새 작업은 받지 않고(대기 중이던 작업은 503 오류로 끝냄) 실행 중인 작업이 끝나기를 기다립니다.
+    # 시간 안에 모두 끝나면 True 를 돌려줍니다.
+    def drain(self, timeout):
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.active_count() and time.monotonic() < deadline:
+            time.sleep(0.2)
+        return self.active_count() == 0
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,70 @@
+# mask_algebra.py
+# 레이어 alpha 마스크를 비트 단위로 압축해 보관하고, 선택한 레이어들의 합집합과 그 교집합/차집합 면적을 계산합니다.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# numpy 2.0 이상은 bitwise_count 를 제공합니다. 없으면 바이트별 비트 수 표를 씁니다.
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(packed):
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(packed).sum(dtype=np.int64))
+    return int(_POPCOUNT_TABLE[packed].sum(dtype=np.int64))
+
+
+class LayerMasks:
+    def __init__(self, masks):
+        # masks: 같은 크기(H, W)의 bool 배열 목록
+        self.shape = masks[0].shape if masks else (0, 0)
+        self.packed = [np.packbits(m.ravel()) for m in masks]
+        self.empty = np.zeros_like(self.packed[0]) if masks else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.packed)
+
+    def union(self, indices):
+        if not indices:
+            return self.empty
+        return np.bitwise_or.reduce([self.packed[i] for i in indices])
+
+    def selection_areas(self, numerator, denominator):
+        num = self.union(numerator)
+        den = self.union(denominator)
+        inside = num & den
+        numerator_area = popcount(num)
+        denominator_area = popcount(den)
+        inside_area = popcount(inside)
+        return {
+            "numerator_area": numerator_area,
+            "denominator_area": denominator_area,
+            "intersection_area": inside_area,
+            "outside_area": numerator_area - inside_area,
+            "ratio": inside_area / denominator_area if denominator_area else 0.0,
+        }
+
+
+class MaskCache:
+    def __init__(self, max_items=8):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        masks = build()
+        with self._lock:
+            self._items[key] = masks
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return masks
@@ -0,0 +1,194 @@
+# metrics.py
+# 처리 단계별 시간 측정과 Prometheus 텍스트 형식(/metrics) 출력
+# - Histogram / Counter / Gauge: 외부 라이브러리 없이 필요한 만큼만 구현
+# - Trace: 요청 하나의 단계별/레이어별 시간을 모아 응답에 넣을 수 있게 합니다.
+#   (contextvars 로 전달되므로 다른 스레드에서 실행할 때는 context 를 복사해 넘깁니다)
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    # callback 이 있으면 출력할 때마다 {레이블 값 튜플: 값} 을 받아옵니다.
+    # (다른 객체가 이미 세고 있는 값 - 캐시 적중 수, 풀 크기 등 - 을 그대로 내보낼 때)
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        if self.callback is not None:
+            items = sorted(self.callback().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}' for k, v in items]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # 레이블 → [버킷별 개수..., 합계, 개수]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(round(series[-2], 6))}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# --- 요청 단위 추적 ---
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.layers = {}
+        self.subprocesses = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    # 시간(float)은 더하고, 그 밖의 값(예: reused=True)은 그대로 기록합니다.
+    def add_layer(self, index, **timings):
+        with self._lock:
+            entry = self.layers.setdefault(index, {})
+            for key, value in timings.items():
+                entry[key] = entry.get(key, 0.0) + value if isinstance(value, float) else value
+
+    def add_subprocess(self, kind, seconds):
+        with self._lock:
+            self.subprocesses.append({"kind": kind, "seconds": round(seconds, 4)})
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "total": round(time.perf_counter() - self.started, 4),
+                "stages": {k: round(v, 4) for k, v in self.stages.items()},
+                "layers": [
+                    {"index": i, **{k: round(v, 4) if isinstance(v, float) else v for k, v in t.items()}}
+                    for i, t in sorted(self.layers.items())
+                ],
+                "subprocesses": list(self.subprocesses),
+            }
+
+
+_current_trace = contextvars.ContextVar('bus_ad_trace', default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace():
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+# 스레드 풀에서도 현재 요청의 Trace 에 기록되도록 context 를 복사해 실행합니다.
+def submit_in_context(executor, func, *args):
+    return executor.submit(contextvars.copy_context().run, func, *args)
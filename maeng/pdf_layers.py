@@ -0,0 +1,138 @@
+# pdf_layers.py
+# PDF 호환 .ai 파일에서 Inkscape 변환 없이 레이어를 바로 읽어 렌더링하는 빠른 경로 (PyMuPDF 필요)
+# - PyMuPDF 는 AGPL-3.0 (또는 상용 라이선스) 입니다. 기본 requirements.txt 에는 넣지 않고
+#   requirements-pdf.txt 로 따로 설치하며, 앱에서는 PDF_LAYERS=auto 일 때만 씁니다.
+# - Illustrator 최상위 레이어는 PDF 선택적 콘텐츠 그룹(OCG)으로 저장됩니다.
+#   이름/표시 여부는 OCG 에서, 순서는 OCProperties /Order (위 레이어부터) 에서 읽습니다.
+# - 레이어마다 그 OCG 만 켠 상태로 첫 페이지를 렌더링합니다.
+#   (켜고 끄기는 렌더링에 반영되는 레이어 UI 설정으로 합니다. set_layer 의 on/off 목록은 그리는 내용을 바꾸지 않습니다)
+# - 처리할 수 없는 파일(PDF 아님, 암호화, OCG 없음, 하위 OCG, 레이어 밖의 내용 등)은
+#   PdfLayersUnsupported 를 내고, 호출하는 쪽이 기존 Inkscape 경로로 처리합니다.
+import re
+
+from PIL import Image
+
+PT_TO_PX = 96 / 72  # Inkscape 는 PDF 1pt 를 96 DPI 기준 4/3 px 로 가져옵니다.
+
+_ORDER_TOKEN_RE = re.compile(rb'\[|\]|(\d+)\s+\d+\s+R')
+
+
+class PdfLayersUnsupported(Exception):
+    pass
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf  # 1.24 이전 버전
+    return pymupdf
+
+
+def available():
+    try:
+        _import_pymupdf()
+    except ImportError:
+        return False
+    return True
+
+
+# /Order 배열에서 최상위 항목의 xref 만 (중첩 배열은 하위 레이어 묶음)
+def top_level_refs(order_source):
+    refs, depth = [], 0
+    for match in _ORDER_TOKEN_RE.finditer(order_source.encode('latin-1')):
+        token = match.group(0)
+        if token == b'[':
+            depth += 1
+        elif token == b']':
+            depth -= 1
+        elif depth == 1:
+            refs.append(int(match.group(1)))
+    return refs
+
+
+class PdfLayer:
+    def __init__(self, xref, name, visible, ui_number):
+        self.xref = xref
+        self.name = name
+        self.visible = visible
+        self.ui_number = ui_number  # layer_ui_configs() 번호 (켜고 끌 때 씁니다)
+
+
+class PdfLayerDocument:
+    def __init__(self, data):
+        pymupdf = _import_pymupdf()
+        try:
+            self.doc = pymupdf.open(stream=data, filetype='pdf')
+        except Exception as e:
+            raise PdfLayersUnsupported(f"Cannot open as PDF: {e}")
+        try:
+            if self.doc.needs_pass:
+                raise PdfLayersUnsupported("Encrypted PDF")
+            if self.doc.page_count < 1:
+                raise PdfLayersUnsupported("PDF has no pages")
+            self.layers = self._read_layers()
+            rect = self.doc[0].rect
+            self.width_px, self.height_px = rect.width * PT_TO_PX, rect.height * PT_TO_PX
+        except BaseException:
+            self.doc.close()
+            raise
+
+    def _read_layers(self):
+        ocgs = self.doc.get_ocgs()
+        if not ocgs:
+            raise PdfLayersUnsupported("No optional content groups")
+        order = self._layer_order()
+        if order is None:
+            order = list(ocgs)  # /Order 가 없으면 /OCGs 순서 (아래 레이어부터)
+        else:
+            order = list(reversed(order))
+        if set(order) != set(ocgs):
+            raise PdfLayersUnsupported("Optional content groups are nested or not listed in /Order")
+        # UI 설정 목록은 /Order 순서(위 레이어부터)입니다. 이름으로 한 번 더 맞춰 봅니다.
+        configs = self.doc.layer_ui_configs()
+        if len(configs) != len(order) or any(c['depth'] != 0 for c in configs):
+            raise PdfLayersUnsupported("Layer UI configuration does not match /Order")
+        ui_numbers = {xref: config['number'] for xref, config in zip(reversed(order), configs)}
+        if any(config['text'] != ocgs[xref]['name'] for xref, config in zip(reversed(order), configs)):
+            raise PdfLayersUnsupported("Layer UI configuration does not match /Order")
+        return [PdfLayer(xref, ocgs[xref]['name'], ocgs[xref]['on'], ui_numbers[xref]) for xref in order]
+
+    def _layer_order(self):
+        kind, value = self.doc.xref_get_key(self.doc.pdf_catalog(), 'OCProperties/D/Order')
+        if kind == 'xref':
+            value = self.doc.xref_object(int(value.split()[0]), compressed=True)
+        elif kind != 'array':
+            return None
+        return top_level_refs(value)
+
+    # 문서 크기를 Inkscape 로 변환한 SVG 와 같은 단위(96 DPI px)로 나타낸 루트 속성
+    def root_attrib(self):
+        return {'width': str(self.width_px), 'height': str(self.height_px),
+                'viewBox': f"0 0 {self.width_px} {self.height_px}"}
+
+    # xrefs 의 레이어만 켠 상태로 렌더링한 RGBA 이미지.
+    # clip 은 dpi 해상도 픽셀 영역 [left, top, right, bottom] 입니다.
+    def render(self, xrefs, dpi, clip=None):
+        pymupdf = _import_pymupdf()
+        xrefs = set(xrefs)
+        for layer in self.layers:
+            # 0: 켜기, 2: 끄기
+            self.doc.set_layer_ui_config(layer.ui_number, 0 if layer.xref in xrefs else 2)
+        rect = None if clip is None else pymupdf.Rect(*(v * 72 / dpi for v in clip))
+        pix = self.doc[0].get_pixmap(dpi=dpi, alpha=True, clip=rect)
+        # MuPDF 픽스맵은 미리 곱한(premultiplied) alpha 입니다.
+        image = Image.frombytes('RGBa', (pix.width, pix.height), pix.samples).convert('RGBA')
+        if clip is not None:
+            # 경계 반올림으로 한 픽셀 커질 수 있으므로 요청한 크기로 맞춥니다. (띠가 겹치지 않도록)
+            image = image.crop((0, 0, min(image.width, clip[2] - clip[0]), min(image.height, clip[3] - clip[1])))
+        return image
+
+    def close(self):
+        self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
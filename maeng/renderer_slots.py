@@ -0,0 +1,68 @@
+# renderer_slots.py
+# 여러 gunicorn 워커 프로세스가 함께 쓰는 렌더러 실행 슬롯 (파일 잠금 기반 세마포어)
+# - 슬롯 파일 count 개 중 하나에 flock 을 걸면 슬롯을 얻은 것입니다.
+# - 잠금은 프로세스가 죽으면 커널이 풀어 주므로 워커가 비정상 종료해도 슬롯이 새지 않습니다.
+import fcntl
+import os
+import random
+import threading
+import time
+
+from inkscape_pool import InkscapePoolBusyError
+
+
+class RendererSlotsBusyError(InkscapePoolBusyError):
+    # 정해진 시간 안에 슬롯을 얻지 못했을 때 (503)
+    pass
+
+
+class RendererSlots:
+    def __init__(self, directory, count, wait_timeout=30, poll_interval=0.05):
+        self.count = count
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._paths = [os.path.join(directory, f"slot-{i}.lock") for i in range(count)]
+        self._lock = threading.Lock()
+        self.in_use = 0    # 이 프로세스가 잡고 있는 슬롯 수
+        self.waiting = 0   # 이 프로세스에서 슬롯을 기다리는 호출 수
+        os.makedirs(directory, exist_ok=True)
+
+    def _try_acquire(self):
+        # 워커들이 같은 슬롯부터 두드리지 않도록 시작 위치를 섞습니다.
+        start = random.randrange(self.count)
+        for i in range(self.count):
+            fd = os.open(self._paths[(start + i) % self.count], os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, timeout=None):
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self.waiting += 1
+        try:
+            while True:
+                fd = self._try_acquire()
+                if fd is not None:
+                    with self._lock:
+                        self.in_use += 1
+                    return fd
+                if time.monotonic() >= deadline:
+                    raise RendererSlotsBusyError(f"No renderer slot available within {timeout}s")
+                time.sleep(self.poll_interval)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def release(self, fd):
+        os.close(fd)  # 닫으면 잠금도 풀립니다.
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"count": self.count, "in_use": self.in_use, "waiting": self.waiting}
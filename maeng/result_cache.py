@@ -0,0 +1,135 @@
+# result_cache.py
+# 업로드 파일 내용 해시 기반 결과 캐시 (메모리 LRU + 디스크 보관, 용량 제한)
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+
+def make_cache_key(file_bytes, settings):
+    # 같은 파일이라도 렌더러 설정이 다르면 다른 결과이므로 함께 해시합니다.
+    return finish_cache_key(hashlib.sha256(file_bytes), settings)
+
+
+# 파일 내용을 조각 단위로 해시해 둔 경우 (스트리밍 업로드)
+def finish_cache_key(file_sha256, settings):
+    h = file_sha256.copy()
+    h.update(b"\0")
+    h.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    # write_through 이면 넣을 때 바로 디스크에도 씁니다.
+    # (같은 디스크 폴더를 쓰는 다른 프로세스 - gunicorn 워커 - 에서도 곧바로 찾을 수 있도록)
+    def __init__(self, max_items=32, disk_dir=None, disk_max_bytes=512 * 1024 * 1024, write_through=False):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.write_through = write_through
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            evicted = self._remember(key, value)
+        self._spill(evicted)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            evicted = self._remember(key, value)
+        self._spill(evicted)
+        if self.write_through:
+            self._write_disk(key, value)
+
+    # 잠금 안에서 호출됩니다. 메모리에서 밀려난 항목을 돌려주면 호출한 쪽이 잠금 밖에서 디스크로 내려보냅니다.
+    # (JSON 쓰기와 디스크 정리가 다른 스레드의 조회를 막지 않도록)
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        evicted = []
+        while len(self._memory) > self.max_items:
+            evicted.append(self._memory.popitem(last=False))
+        return evicted
+
+    def _spill(self, evicted):
+        for old_key, old_value in evicted:
+            self._write_disk(old_key, old_value)
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # 최근 사용 시각 갱신 (디스크 LRU용)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        temp_path = f"{path}.{uuid.uuid4()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Result cache write failed: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"memory_items": len(self._memory), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,128 @@
+# svg_assembly.py
+# 레이어별 SVG 문서 조립: defs 에서 id 가 있는 항목은 레이어가 실제로 참조하는 것만 남기고,
+# (id 없는 <style>, 글꼴 등은 참조로 찾을 수 없으므로 항상 남깁니다)
+# 공통 조각(defs 항목, 레이어 그룹)은 한 번만 직렬화해 재사용합니다.
+import re
+import threading
+import weakref
+import xml.etree.ElementTree as ET
+
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+_URL_REF_RE = re.compile(r'url\(\s*["\']?#([^)"\'\s]+)')
+_HREF_ATTRS = (f'{{{XLINK_NS}}}href', 'href')
+
+
+def element_references(element):
+    # 하위 트리 전체에서 url(#id), xlink:href="#id" 로 참조하는 id 목록 (<style> 안의 CSS 포함)
+    refs = set()
+    for el in element.iter():
+        if el.text and 'url(' in el.text:
+            refs.update(_URL_REF_RE.findall(el.text))
+        for key, value in el.attrib.items():
+            if key in _HREF_ATTRS:
+                if value.startswith('#'):
+                    refs.add(value[1:])
+            elif 'url(' in value:
+                refs.update(_URL_REF_RE.findall(value))
+    return refs
+
+
+def open_close_tags(element):
+    # 빈 요소를 직렬화한 뒤 "<tag ... />" 를 여는 태그와 닫는 태그로 나눕니다.
+    empty = ET.tostring(element, encoding='unicode')
+    tag_name = empty[1:].split(None, 1)[0].rstrip('/>')
+    return empty[:-2].rstrip() + '>', f'</{tag_name}>'
+
+
+class SvgAssembler:
+    def __init__(self, root_attrib, defs):
+        self.root_attrib = root_attrib
+        self.defs = defs
+        self._lock = threading.Lock()
+        self._root_open, self._root_close = open_close_tags(ET.Element('svg', attrib=root_attrib))
+
+        self._defs_children = []
+        self._defs_index = {}
+        self._unnamed_defs = set()
+        if defs is not None:
+            self._defs_children = list(defs)
+            for i, child in enumerate(self._defs_children):
+                if not child.get('id'):
+                    self._unnamed_defs.add(i)
+                for el in child.iter():
+                    if el.get('id'):
+                        self._defs_index.setdefault(el.get('id'), i)
+            self._defs_open, self._defs_close = open_close_tags(ET.Element(defs.tag, attrib=defs.attrib))
+        self._defs_refs = {}
+        self._defs_strings = {}
+        self._group_cache = weakref.WeakKeyDictionary()
+
+    # defs 항목 i 가 (직접/간접으로) 필요로 하는 다른 defs 항목들
+    def _child_refs(self, i):
+        if i not in self._defs_refs:
+            refs = element_references(self._defs_children[i])
+            self._defs_refs[i] = {self._defs_index[r] for r in refs if r in self._defs_index} - {i}
+        return self._defs_refs[i]
+
+    def needed_defs(self, groups):
+        pending = set(self._unnamed_defs)
+        for group in groups:
+            pending |= {self._defs_index[r] for r in self._group_entry(group)[1] if r in self._defs_index}
+        needed = set()
+        while pending:
+            i = pending.pop()
+            if i in needed:
+                continue
+            needed.add(i)
+            pending |= self._child_refs(i) - needed
+        return sorted(needed)  # 원래 순서 유지
+
+    def _defs_string(self, i):
+        if i not in self._defs_strings:
+            self._defs_strings[i] = ET.tostring(self._defs_children[i], encoding='unicode')
+        return self._defs_strings[i]
+
+    def _group_entry(self, group):
+        # (직렬화 문자열, 참조 id 집합) 을 그룹별로 한 번만 계산합니다.
+        with self._lock:
+            entry = self._group_cache.get(group)
+        if entry is None:
+            entry = (ET.tostring(group, encoding='unicode'), element_references(group))
+            with self._lock:
+                self._group_cache[group] = entry
+        return entry
+
+    # 그룹들의 렌더링 결과를 정하는 조각: 참조하는 defs 항목들 + 그룹 자체 (레이어 지문용)
+    def content_parts(self, groups):
+        groups = [g for g in groups if g is not None]
+        return [self._defs_string(i) for i in self.needed_defs(groups)] + [self._group_entry(g)[0] for g in groups]
+
+    def build(self, groups, root_attrib=None):
+        # root_attrib 을 주면 루트 속성만 바꿔 씁니다. (예: 띠 렌더링용 viewBox)
+        groups = [g for g in groups if g is not None]
+        root_open = self._root_open if root_attrib is None else open_close_tags(ET.Element('svg', attrib=root_attrib))[0]
+        parts = [root_open]
+        if self.defs is not None:
+            parts.append(self._defs_open)
+            parts.extend(self._defs_string(i) for i in self.needed_defs(groups))
+            parts.append(self._defs_close)
+        parts.extend(self._group_entry(g)[0] for g in groups)
+        parts.append(self._root_close)
+        return ''.join(parts)
+
+
+# 같은 (root_attrib, defs) 조합에는 같은 조립기를 재사용합니다.
+_assemblers = weakref.WeakKeyDictionary()
+_assemblers_lock = threading.Lock()
+
+
+def get_assembler(root_attrib, defs):
+    if defs is None:
+        return SvgAssembler(root_attrib, None)
+    with _assemblers_lock:
+        assembler = _assemblers.get(defs)
+        if assembler is None or assembler.root_attrib is not root_attrib:
+            assembler = SvgAssembler(root_attrib, defs)
+            _assemblers[defs] = assembler
+        return assembler
@@ -0,0 +1,164 @@
+# svg_stream.py
+# 큰 SVG를 iterparse 로 점진적으로 읽는 파서
+# - 최상위 레이어의 id/이름/표시 여부를 시작 태그에서 바로 수집합니다.
+# - 레이어와 defs 가 아닌 최상위 요소, 보이는 레이어가 있을 때의 숨김 레이어는 읽는 대로 버립니다.
+# - <image> 의 큰 base64 데이터는 트리에 두지 않고 임시 저장소로 옮겨 두었다가,
+#   렌더링용 SVG 문자열을 만들 때만 다시 채워 넣습니다.
+import itertools
+import re
+import tempfile
+import threading
+import weakref
+import xml.etree.ElementTree as ET
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+INKSCAPE_LABEL = '{http://www.inkscape.org/namespaces/inkscape}label'
+HREF_ATTRS = ('{http://www.w3.org/1999/xlink}href', 'href')
+# 레이어 밖에 있어도 id 로 참조될 수 있어 남겨 두는 최상위 요소 (defs 는 따로 처리)
+KEPT_TOP_LEVEL = {f'{{{SVG_NS}}}{tag}' for tag in ('clipPath', 'mask', 'symbol', 'marker', 'pattern', 'filter',
+                                                   'linearGradient', 'radialGradient', 'style')}
+
+# 이보다 긴 이미지 데이터는 지연 저장소로 옮깁니다.
+LAZY_PAYLOAD_THRESHOLD = 64 * 1024
+
+_TOKEN_PREFIX = 'lazy-payload:'
+_TOKEN_RE = re.compile(r'lazy-payload:(\d+):(\d+)')
+
+
+# --- 지연 저장소: 큰 payload 를 임시 파일(작으면 메모리)에 보관 ---
+class LazyPayloadStore:
+    _ids = itertools.count(1)
+    _registry = weakref.WeakValueDictionary()
+
+    def __init__(self, spool_bytes=1024 * 1024):
+        self.id = next(self._ids)
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        self._entries = []
+        self._lock = threading.Lock()
+        self.stored_bytes = 0
+        LazyPayloadStore._registry[self.id] = self
+
+    def put(self, value):
+        data = value.encode('utf-8')
+        with self._lock:
+            self._file.seek(0, 2)
+            offset = self._file.tell()
+            self._file.write(data)
+            self._entries.append((offset, len(data)))
+            self.stored_bytes += len(data)
+            return f"{_TOKEN_PREFIX}{self.id}:{len(self._entries) - 1}"
+
+    def get(self, index):
+        with self._lock:
+            offset, length = self._entries[index]
+            self._file.seek(offset)
+            return self._file.read(length).decode('utf-8')
+
+    def close(self):
+        self._file.close()
+        LazyPayloadStore._registry.pop(self.id, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def resolve_lazy_payloads(svg_string):
+    # 직렬화된 SVG 안의 지연 토큰을 원래 데이터로 되돌립니다.
+    if _TOKEN_PREFIX not in svg_string:
+        return svg_string
+
+    def replace(match):
+        store = LazyPayloadStore._registry.get(int(match.group(1)))
+        if store is None:
+            raise RuntimeError('Lazy payload store already closed')
+        return store.get(int(match.group(2)))
+
+    return _TOKEN_RE.sub(replace, svg_string)
+
+
+class LayerInfo:
+    def __init__(self, index, attrib):
+        self.index = index
+        self.id = attrib.get('id')
+        self.label = attrib.get(INKSCAPE_LABEL)
+        self.visible = 'display:none' not in attrib.get('style', '')
+        self.element = None
+
+    @property
+    def name(self):
+        return self.label or self.id or 'Unnamed Layer'
+
+
+class SvgDocument:
+    def __init__(self):
+        self.root = None
+        self.defs = None
+        self.layers = []
+
+    @property
+    def root_attrib(self):
+        return self.root.attrib
+
+    def groups(self, visible_only=False):
+        return [l.element for l in self.layers if l.element is not None and (l.visible or not visible_only)]
+
+
+# --- 점진적 파싱 ---
+# 렌더링에 쓰는 것은 최상위 레이어(g)와 defs(및 참조될 수 있는 요소)뿐이므로 나머지 최상위 요소는
+# 다 읽는 즉시 버립니다.
+# 숨김 레이어는 보이는 레이어가 하나도 없을 때만 쓰이므로, 보이는 레이어가 나온 뒤에는
+# 읽는 동안 하위 요소를 비우고 끝나면 트리에서 뗍니다. (그 전에 나온 숨김 레이어는 그때 뗍니다)
+def parse_svg_streaming(source, store=None, lazy_threshold=LAZY_PAYLOAD_THRESHOLD):
+    doc = SvgDocument()
+    stack = []
+    seen_visible = False
+    dropping = False  # 지금 읽는 레이어를 버릴지
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if len(stack) == 1:
+                doc.root = elem
+            elif len(stack) == 2 and elem.tag == f'{{{SVG_NS}}}g':
+                layer = LayerInfo(len(doc.layers), elem.attrib)
+                if layer.visible and not seen_visible:
+                    seen_visible = True
+                    for hidden in doc.layers:
+                        _drop_layer(doc, hidden)
+                dropping = seen_visible and not layer.visible
+                doc.layers.append(layer)
+            continue
+
+        stack.pop()
+        depth = len(stack) + 1
+        if dropping and depth > 2:
+            elem.clear()
+            continue
+        if store is not None and elem.tag == f'{{{SVG_NS}}}image':
+            for key in HREF_ATTRS:
+                value = elem.get(key)
+                if value and len(value) > lazy_threshold:
+                    elem.set(key, store.put(value))
+
+        if depth == 2:
+            if elem.tag == f'{{{SVG_NS}}}g':
+                doc.layers[-1].element = elem
+                if dropping:
+                    _drop_layer(doc, doc.layers[-1])
+                    dropping = False
+            elif elem.tag == f'{{{SVG_NS}}}defs':
+                if doc.defs is None:
+                    doc.defs = elem
+            elif elem.tag not in KEPT_TOP_LEVEL:
+                doc.root.remove(elem)
+                elem.clear()
+    return doc
+
+
+def _drop_layer(doc, layer):
+    if layer.element is not None:
+        doc.root.remove(layer.element)
+        layer.element.clear()
+        layer.element = None
@@ -0,0 +1,48 @@
+# 테스트 공통 설정
+# - Inkscape 대신 inkscape_stub.py 를 PATH 의 'inkscape' 로 씁니다.
+# - 캐시는 디스크에 남기지 않고, 테스트마다 비웁니다.
+import os
+import stat
+import sys
+import tempfile
+
+import pytest
+
+MAENG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SAMPLE_DIR = os.path.join(MAENG_DIR, 'sample_data')
+SAMPLE_AI = os.path.join(SAMPLE_DIR, '250718_01.ai')
+SAMPLE_SVG = os.path.join(MAENG_DIR, 'svg_output', '250718_01.svg')
+
+_stub_dir = tempfile.mkdtemp(prefix='inkscape_stub_')
+_stub_path = os.path.join(_stub_dir, 'inkscape')
+with open(_stub_path, 'w') as f:
+    f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(MAENG_DIR, "inkscape_stub.py")}" "$@"\n')
+os.chmod(_stub_path, os.stat(_stub_path).st_mode | stat.S_IEXEC)
+
+os.environ['PATH'] = _stub_dir + os.pathsep + os.environ['PATH']
+os.environ['INKSCAPE_STUB_SVG'] = SAMPLE_SVG
+for name in ('RESULT_CACHE_DISK_MB', 'LAYER_CACHE_DISK_MB', 'LAZY_CACHE_DISK_MB'):
+    os.environ[name] = '0'
+os.environ['RENDER_SLOT_DIR'] = tempfile.mkdtemp(prefix='render_slots_')
+sys.path.insert(0, MAENG_DIR)
+
+
+@pytest.fixture
+def app_module():
+    import app_for_Render
+    for cache in (app_for_Render.result_cache, app_for_Render.layer_cache,
+                  app_for_Render.render_source_cache, app_for_Render.lazy_image_cache):
+        cache._memory.clear()
+    app_for_Render.mask_cache._items.clear()
+    return app_for_Render
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def sample_ai():
+    with open(SAMPLE_AI, 'rb') as f:
+        return f.read()
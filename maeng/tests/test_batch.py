@@ -0,0 +1,63 @@
+import io
+import json
+
+from batch_process import BatchJournal, run_batch
+from test_jobs import sse_events
+
+
+def fake_process(calls):
+    def process(data, name):
+        calls.append(name)
+        if data.endswith(b'bad'):
+            raise RuntimeError('broken file')
+        return {"layers": [{"name": 'L', "area": len(data), "bbox": None}]}
+    return process
+
+
+# 명령줄 일괄 처리: 실패는 기록으로 남고, 다시 돌리면 끝난 파일은 건너뛰고 실패한 파일만 다시 처리합니다.
+def test_run_batch_records_failures_and_resumes(tmp_path):
+    files = []
+    for name, data in (('a.ai', b'good'), ('b.ai', b'bad')):
+        (tmp_path / name).write_bytes(data)
+        files.append(str(tmp_path / name))
+    journal = BatchJournal(str(tmp_path / 'out.journal.jsonl'))
+
+    calls = []
+    records, skipped = run_batch(files, fake_process(calls), journal=journal)
+    assert [(r["status"], r.get("error")) for r in records] == [('done', None), ('error', 'broken file')]
+    assert records[0]["layers"] == [{"name": 'L', "area": 4, "bbox": None}]
+    assert skipped == 0
+
+    calls.clear()
+    records, skipped = run_batch(files, fake_process(calls), journal=journal)
+    assert calls == ['b.ai'] and skipped == 1
+
+
+# /api/batch 도 같은 파일 단위 처리를 쓰고, 끝난 파일마다 'file' 이벤트를 보냅니다.
+def test_batch_endpoint_reports_each_file(app_module, client, sample_ai, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_module, 'run_calculation', lambda data, name, options: fake_process(calls)(data, name))
+    bad = sample_ai[:4096].replace(b'%%EOF', b'') + b'bad'
+    response = client.post('/api/batch', data={'aiFile': [(io.BytesIO(sample_ai), 'a.ai'), (io.BytesIO(bad), 'b.ai')]},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202, response.get_json()
+    job = response.get_json()
+
+    body = client.get(job['events_url']).get_data(as_text=True)
+    assert sse_events(body)[-1] == 'done'
+    events = [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+    files = sorted((e['done'], e['file'], e['status']) for e in events if e.get('stage') == 'file')
+    assert [done for done, _, _ in files] == [1, 2]
+    assert {(name, status) for _, name, status in files} == {('a.ai', 'done'), ('b.ai', 'error')}
+
+    status = client.get(job['status_url']).get_json()
+    assert status['result']['failed'] == 1
+    assert [(f['file'], f.get('error')) for f in status['result']['files']] == [('a.ai', None), ('b.ai', 'broken file')]
+    csv = client.get(job['csv_url']).get_data(as_text=True).splitlines()
+    assert csv[0].startswith('file,sha256,status') and len(csv) == 3
+
+
+def test_batch_endpoint_rejects_bad_uploads(client):
+    response = client.post('/api/batch', data={'aiFile': [(io.BytesIO(b'x'), 'a.txt')]},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
@@ -0,0 +1,55 @@
+import subprocess
+import time
+
+import pytest
+
+from svg_stream import LazyPayloadStore
+
+
+@pytest.fixture
+def piped(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'INKSCAPE_POOL_SIZE', 0)
+    monkeypatch.setattr(app_module, 'INKSCAPE_JOB_TIMEOUT', 2)
+    assert app_module.use_inkscape_pipe()
+    return app_module
+
+
+def convert(app_module, source):
+    with LazyPayloadStore() as store:
+        return app_module.convert_ai_via_pipe(source, store)
+
+
+# 멈춘 변환기는 출력이 끝나기를 기다리지 않고 제한 시간에 끝냅니다.
+def test_hung_converter_is_killed_at_timeout(piped, sample_ai, monkeypatch):
+    monkeypatch.setenv('INKSCAPE_STUB_HANG_S', '60')
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        convert(piped, sample_ai)
+    assert time.monotonic() - started < 10
+
+
+# 입력을 다 읽기 전에 stderr 로 많이 쓰는 변환기와도 서로 막히지 않아야 합니다.
+def test_noisy_stderr_does_not_block_stdin(piped, sample_ai, monkeypatch):
+    monkeypatch.setenv('INKSCAPE_STUB_STDERR_KB', '512')
+    doc = convert(piped, sample_ai)
+    assert [layer.name for layer in doc.layers if layer.visible] == ['B', 'Image', 'K_Limousine']
+
+
+def post_streamed(client, data):
+    return client.post('/api/calculate?filename=a.ai&format=meta', data=data,
+                       headers={'Content-Type': 'application/pdf'})
+
+
+# 스트리밍 업로드도 같은 제한 시간으로 끝나고, 워커와 렌더러 슬롯은 다음 요청에 다시 쓰입니다.
+def test_streamed_upload_to_hung_converter_times_out(piped, client, sample_ai, monkeypatch):
+    monkeypatch.setattr(piped, 'USE_PDF_LAYERS', False)  # 변환기 경로로 처리하도록
+    monkeypatch.setenv('INKSCAPE_STUB_HANG_S', '60')
+    started = time.monotonic()
+    response = post_streamed(client, sample_ai)
+    assert response.status_code == 504, response.get_json()
+    assert time.monotonic() - started < 10
+
+    monkeypatch.delenv('INKSCAPE_STUB_HANG_S')
+    response = post_streamed(client, sample_ai)
+    assert response.status_code == 200, response.get_json()
+    assert [layer['name'] for layer in response.get_json()['layers']] == ['B', 'Image', 'K_Limousine']
@@ -0,0 +1,115 @@
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+from PIL import Image
+
+from inkscape_pool import InkscapeActionError, InkscapePool
+
+
+def post_areas(client, data, **form):
+    response = client.post('/api/calculate', data={'aiFile': (io.BytesIO(data), 'a.ai'), **form},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return [layer['area'] for layer in response.get_json()['layers']]
+
+
+@pytest.fixture
+def pooled(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'USE_PDF_LAYERS', False)  # Inkscape 경로로 처리하도록
+    monkeypatch.setattr(app_module, 'INKSCAPE_POOL_SIZE', 1)
+    monkeypatch.setattr(app_module, '_inkscape_pool', None)
+    yield app_module
+    if app_module._inkscape_pool is not None:
+        app_module._inkscape_pool.shutdown()
+    app_module._inkscape_pool = None
+
+
+# 셸 워커 하나로 dpi 가 다른 요청을 차례로 보내도 앞 요청의 내보내기 설정이 남지 않아야 합니다.
+def test_shell_worker_export_state_does_not_leak(pooled, client, sample_ai):
+    before = post_areas(client, sample_ai)
+    post_areas(client, sample_ai, dpi='192')
+    pooled.result_cache._memory.clear()
+    pooled.layer_cache._memory.clear()  # 레이어를 다시 렌더링하도록
+    after = post_areas(client, sample_ai)
+    assert after == before
+    assert pooled._inkscape_pool.stats()["size"] == 1
+
+
+# 셸이 알린 오류는 실패한 명령과 함께 바로 올라오고, 워커는 그대로 다음 작업을 받습니다.
+def test_failed_action_is_reported_with_action(tmp_path):
+    pool = InkscapePool(size=1, health_interval=0)
+    try:
+        with pytest.raises(InkscapeActionError) as error:
+            pool.run([f"file-open:{tmp_path / 'missing.svg'}", "export-type:png",
+                      f"export-filename:{tmp_path / 'out.png'}", "export-do", "file-close"])
+        assert error.value.action == 'export-do'
+        assert 'Inkscape' in pool.run(["inkscape-version"])
+        assert pool.stats()["restarts"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_queue_timeout_is_configurable(pooled, monkeypatch):
+    monkeypatch.setattr(pooled, 'INKSCAPE_QUEUE_TIMEOUT', 5)
+    assert pooled.get_inkscape_pool().queue_timeout == 5
+
+
+def png_size(data):
+    return Image.open(io.BytesIO(data)).size
+
+
+# 잘린 레이어는 그 영역만, 나머지는 페이지 전체로 내보냅니다. 같은 셸 워커에서 연달아 실행해도
+# 앞 작업의 영역 설정이 남지 않아야 합니다. (남으면 Inkscape 는 경고를 내고 페이지를 씁니다)
+@pytest.mark.parametrize('pool_size', [0, 1])
+def test_cropped_layers_export_only_their_area(pooled, monkeypatch, pool_size):
+    monkeypatch.setattr(pooled, 'INKSCAPE_POOL_SIZE', pool_size)
+    root_attrib = {'width': '200', 'height': '100', 'viewBox': '0 0 400 200'}
+    groups = [ET.fromstring(f'<g xmlns="http://www.w3.org/2000/svg" id="{name}"><rect width="9" height="9"/></g>')
+              for name in ('a', 'b')]
+    for crops in ([[10, 20, 60, 50], None], [None, [0, 0, 30, 40]]):
+        composite, pngs = pooled.render_layers_inkscape(groups, root_attrib, None, composite_groups=groups, crops=crops)
+        assert png_size(composite) == (200, 100)
+        assert [png_size(p) for p in pngs] == [(c[2] - c[0], c[3] - c[1]) if c else (200, 100) for c in crops]
+
+
+def test_crop_layers_is_off_by_default(app_module):
+    assert not app_module.CROP_LAYERS
+
+
+# 띠 렌더링도 작업 앞의 셸 초기화(페이지 영역)가 남지 않고 띠 영역만 내보내야 합니다.
+@pytest.mark.parametrize('pool_size', [0, 1])
+def test_strips_export_only_their_area(pooled, monkeypatch, pool_size):
+    monkeypatch.setattr(pooled, 'INKSCAPE_POOL_SIZE', pool_size)
+    monkeypatch.setattr(pooled, 'STRIP_PIXELS', 200 * 30)
+    root_attrib = {'width': '200', 'height': '100', 'viewBox': '0 0 200 100'}
+    group = ET.fromstring('<g xmlns="http://www.w3.org/2000/svg" id="a"><rect width="9" height="9"/></g>')
+    target_strips = [pooled.plan_strips(root_attrib, 96), pooled.plan_strips(root_attrib, 96, [10, 10, 50, 95])]
+    assert len(target_strips[0]) == 4
+    sizes = {(t, k): png_size(png) for t, k, png in
+             pooled.iter_strips_inkscape([None, group], [group], root_attrib, None, 96, target_strips)}
+    assert sizes == {(t, k): (s[2] - s[0], s[3] - s[1])
+                     for t, strips in enumerate(target_strips) for k, s in enumerate(strips)}
+
+
+# 상태 점검 ping 은 워커 재시작 기준(작업 수)에 들어가지 않습니다.
+def test_health_check_does_not_count_as_job():
+    pool = InkscapePool(size=1, health_interval=0, max_jobs_per_worker=2)
+    try:
+        for _ in range(3):
+            pool.health_check()
+        pool.run(["inkscape-version"])
+        assert pool._idle.queue[0].jobs_done == 1
+        assert pool.stats()["restarts"] == 0
+    finally:
+        pool.shutdown()
+
+
+# 앞 작업이 남긴 export-area 는 다음 작업의 페이지 영역 내보내기를 막지 않아야 합니다.
+def test_shell_reset_clears_previous_export_area(pooled, monkeypatch):
+    monkeypatch.setattr(pooled, 'STRIP_PIXELS', 200 * 30)
+    root_attrib = {'width': '200', 'height': '100', 'viewBox': '0 0 200 100'}
+    group = ET.fromstring('<g xmlns="http://www.w3.org/2000/svg" id="a"><rect width="9" height="9"/></g>')
+    list(pooled.iter_strips_inkscape([group], [group], root_attrib, None, 96, [[[0, 0, 20, 30]]]))
+    svg = pooled.build_svg_string([group], root_attrib, None)
+    assert png_size(pooled.render_svg_png_inkscape(svg)) == (200, 100)
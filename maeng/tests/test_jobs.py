@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import threading
+
+import pytest
+
+from jobs import JobManager
+
+
+def sse_events(body):
+    return [line[len('event: '):] for line in body.splitlines() if line.startswith('event: ')]
+
+
+def test_job_events_stream_until_done(client, sample_ai):
+    response = client.post('/api/jobs', data={'aiFile': (io.BytesIO(sample_ai), 'a.ai')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    job = response.get_json()
+
+    events = sse_events(client.get(job['events_url']).get_data(as_text=True))
+    assert events[0] == 'progress' and events[-1] == 'done'
+    assert events.count('done') == 1
+
+    status = client.get(f"{job['status_url']}?format=meta").get_json()
+    assert status['status'] == 'done'
+    assert [layer['name'] for layer in status['result']['layers']] == ['B', 'Image', 'K_Limousine']
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get('/api/jobs/0123abcd').status_code == 404
+    assert client.get('/api/jobs/0123abcd/events').status_code == 404
+
+
+@pytest.fixture
+def managers(tmp_path):
+    # 같은 폴더를 쓰는 두 워커 프로세스
+    owner = JobManager(max_workers=1, state_dir=str(tmp_path))
+    other = JobManager(max_workers=1, state_dir=str(tmp_path))
+    yield owner, other
+    owner.shutdown()
+    other.shutdown()
+
+
+def test_job_state_is_shared_through_files(managers, tmp_path):
+    owner, other = managers
+    release = threading.Event()
+
+    def work(progress):
+        progress('progress', stage='rendering')
+        release.wait(5)
+        return {"layers": [{"name": "a", "image": "x" * 1000}]}
+
+    job = owner.submit('a.ai', work)
+    running = other.get(job.id)
+    assert running.wait_events(0, timeout=5)[0]["event"] == 'progress'
+    # 진행 중 상태 파일에는 결과가 없고, 이벤트는 따로 덧붙여집니다.
+    with open(tmp_path / f"{job.id}.json") as f:
+        assert 'result' not in json.load(f)
+    assert not os.path.exists(tmp_path / f"{job.id}.result.json")
+
+    release.set()
+    while not running.finished:
+        running.wait_events(len(running.events), timeout=1)
+    assert running.events[-1] == {"event": 'done'}
+    assert running.result == job.result
+
+    stored = other.get(job.id)
+    assert [e["event"] for e in stored.events] == ['progress', 'progress', 'done']
+    assert stored.result["layers"][0]["name"] == 'a'
+
+
+def test_failed_job_keeps_status_code(managers):
+    owner, other = managers
+
+    def work(progress):
+        raise RuntimeError('boom')
+
+    job = owner.submit('a.ai', work)
+    owner.shutdown()  # 작업 스레드가 파일까지 다 쓸 때까지 기다립니다.
+    stored = other.get(job.id)
+    assert (stored.status, stored.status_code, stored.error) == ('error', 500, 'boom')
+    assert stored.events[-1] == {"event": 'error', "error": 'boom'}
+
+
+# 상태 파일은 끝났는데 마지막 이벤트 줄이 아직 없을 때도 이벤트 스트림은 끝나야 합니다.
+def test_stored_job_without_terminal_event(managers, tmp_path):
+    owner, other = managers
+    job = owner.submit('a.ai', lambda progress: {"layers": []})
+    owner.shutdown()  # 작업 스레드가 파일까지 다 쓸 때까지 기다립니다.
+    events_path = tmp_path / f"{job.id}.events"
+    lines = events_path.read_text().splitlines(keepends=True)
+    events_path.write_text(''.join(lines[:-1]))
+
+    stored = other.get(job.id)
+    assert stored.wait_events(0, timeout=1)[-1] == {"event": 'done'}
@@ -0,0 +1,12 @@
+import io
+
+
+# 일이 MAX_QUEUE_DEPTH 만큼 쌓여 있으면 업로드를 읽기 전에 503 + Retry-After 로 돌려보냅니다.
+def test_heavy_requests_are_shed_when_queue_is_full(app_module, client, sample_ai, monkeypatch):
+    monkeypatch.setattr(app_module, 'MAX_QUEUE_DEPTH', 0)
+    response = client.post('/api/calculate', data={'aiFile': (io.BytesIO(sample_ai), 'a.ai')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(app_module.RETRY_AFTER_SECONDS)
+    assert app_module.queue_depth() == 0  # 거절한 요청은 일로 세지 않습니다.
+    assert client.get('/api/jobs/0123abcd').status_code == 404  # 가벼운 요청은 그대로 처리
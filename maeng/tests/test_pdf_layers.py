@@ -0,0 +1,58 @@
+import io
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pymupdf')
+
+from conftest import SAMPLE_SVG  # noqa: E402
+from pdf_layers import PdfLayerDocument  # noqa: E402
+from vector_area import VectorAreaEngine  # noqa: E402
+
+
+def opaque_pixels(image):
+    return int(np.count_nonzero(np.asarray(image.getchannel('A'))))
+
+
+# 레이어를 켜고 끄면 렌더링 결과가 실제로 바뀌어야 합니다.
+def test_render_toggles_optional_content(sample_ai):
+    with PdfLayerDocument(sample_ai) as pdf:
+        assert [layer.name for layer in pdf.layers] == ['B', 'Image', 'K_Limousine']
+        everything = opaque_pixels(pdf.render([layer.xref for layer in pdf.layers], 24))
+        assert opaque_pixels(pdf.render([], 24)) == 0
+        single = [opaque_pixels(pdf.render([layer.xref], 24)) for layer in pdf.layers]
+        assert all(0 < count < everything for count in single)
+        assert len(set(single)) == len(single)
+
+
+def test_pdf_fast_path_is_opt_in(app_module):
+    assert app_module.PDF_LAYERS == 'off' and not app_module.USE_PDF_LAYERS
+
+
+def test_calculate_uses_pdf_fast_path(app_module, client, sample_ai, monkeypatch):
+    monkeypatch.setattr(app_module, 'USE_PDF_LAYERS', True)
+    response = client.post('/api/calculate', data={'aiFile': (io.BytesIO(sample_ai), 'a.ai')},
+                            content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()
+    assert data['layer_source'] == 'pdf'
+    areas = {layer['name']: layer['area'] for layer in data['layers']}
+    assert set(areas) == {'B', 'Image', 'K_Limousine'}
+    assert len(set(areas.values())) == 3
+
+
+# OCG 렌더링 결과를 같은 파일의 Inkscape 변환 SVG(svg_output) 와 비교합니다.
+# 면적은 6% (안티에일리어싱된 가장자리, 벡터 엔진의 mask 근사), 경계 상자는 1 px 안에서 같아야 합니다.
+def test_pdf_layers_match_inkscape_conversion(sample_ai):
+    root = ET.parse(SAMPLE_SVG).getroot()
+    engine = VectorAreaEngine(root)
+    inkscape = {g.get('{http://www.inkscape.org/namespaces/inkscape}label'): engine.layer_area(g)
+                for g in root.findall('{http://www.w3.org/2000/svg}g')}
+    with PdfLayerDocument(sample_ai) as pdf:
+        for layer in pdf.layers:
+            alpha = np.asarray(pdf.render([layer.xref], 96).getchannel('A'))
+            ys, xs = np.nonzero(alpha)
+            expected = inkscape[layer.name]
+            assert len(xs) == pytest.approx(expected['area'], rel=0.06), layer.name
+            assert [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1] == pytest.approx(expected['bbox'], abs=1), layer.name
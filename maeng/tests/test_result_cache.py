@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+import pytest
+
+from result_cache import ResultCache, finish_cache_key, make_cache_key
+
+
+def test_cache_key_follows_content_and_settings():
+    key = make_cache_key(b'file', {"engine": 'inkscape', "dpi": None})
+    assert key == make_cache_key(b'file', {"dpi": None, "engine": 'inkscape'})
+    assert key != make_cache_key(b'file2', {"engine": 'inkscape', "dpi": None})
+    assert key != make_cache_key(b'file', {"engine": 'inkscape', "dpi": 150})
+    # 스트리밍 업로드에서 조각 단위로 해시한 키도 같아야 합니다.
+    streamed = hashlib.sha256()
+    for chunk in (b'fi', b'le'):
+        streamed.update(chunk)
+    assert finish_cache_key(streamed, {"engine": 'inkscape', "dpi": None}) == key
+
+
+def test_evicted_items_are_spilled_outside_the_lock(tmp_path, monkeypatch):
+    cache = ResultCache(max_items=1, disk_dir=str(tmp_path))
+    write_disk = cache._write_disk
+
+    def checked_write(key, value):
+        assert not cache._lock.locked()
+        write_disk(key, value)
+
+    monkeypatch.setattr(cache, '_write_disk', checked_write)
+    cache.put('a', {"v": 1})
+    cache.put('b', {"v": 2})
+    assert os.path.exists(tmp_path / 'a.json')
+    assert cache.get('a') == {"v": 1}  # 디스크에서 다시 올라오면서 b 가 내려갑니다.
+    assert os.path.exists(tmp_path / 'b.json')
+    assert cache.stats() == {"memory_items": 1, "hits": 1, "misses": 0}
+
+
+@pytest.fixture
+def inkscape_path(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'USE_PDF_LAYERS', False)  # 레이어 캐시는 Inkscape 경로에서 씁니다.
+    return app_module
+
+
+def fingerprint_counts(app_module, data, **options):
+    events = []
+    app_module.result_cache._memory.clear()
+    app_module.run_calculation(data, 'a.ai', options, progress=lambda event, **kw: events.append(kw))
+    progress = next(kw for kw in events if kw.get('stage') == 'fingerprinted')
+    return {"reused": progress['reused'], "changed": progress['changed']}
+
+
+# 레이어 지문: 바뀐 레이어와 설정이 다른 요청만 다시 렌더링합니다.
+def test_layer_cache_invalidation(inkscape_path, sample_ai, tmp_path, monkeypatch):
+    app_module = inkscape_path
+    assert fingerprint_counts(app_module, sample_ai) == {"reused": 0, "changed": 3}
+    assert fingerprint_counts(app_module, sample_ai) == {"reused": 3, "changed": 0}
+    assert fingerprint_counts(app_module, sample_ai, dpi=150.0) == {"reused": 0, "changed": 3}
+
+    # 한 레이어만 바뀐 변환 결과
+    svg = open(os.environ['INKSCAPE_STUB_SVG'], encoding='utf-8').read()
+    changed_svg = tmp_path / 'changed.svg'
+    changed_svg.write_text(svg.replace('inkscape:label="Image"', 'inkscape:label="Image" opacity="0.5"', 1),
+                           encoding='utf-8')
+    assert 'opacity="0.5"' in changed_svg.read_text(encoding='utf-8')
+    monkeypatch.setenv('INKSCAPE_STUB_SVG', str(changed_svg))
+    assert fingerprint_counts(app_module, sample_ai) == {"reused": 2, "changed": 1}
@@ -0,0 +1,18 @@
+import xml.etree.ElementTree as ET
+
+from svg_assembly import SvgAssembler
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+
+
+def test_defs_keep_referenced_and_id_less_entries():
+    root = ET.fromstring(
+        f'<svg xmlns="{SVG_NS}"><defs>'
+        '<style>@font-face { font-family: A; src: url(a.woff); } .c { fill: url(#g2); }</style>'
+        '<linearGradient id="g1"/><linearGradient id="g2"/><clipPath id="unused"/>'
+        '<clipPath id="c1"><rect fill="url(#g1)"/></clipPath>'
+        '</defs><g id="layer" clip-path="url(#c1)"/></svg>')
+    defs, layer = root
+    svg = SvgAssembler(root.attrib, defs).build([layer])
+    kept = [el.get('id') or el.tag.split('}')[1] for el in ET.fromstring(svg).find(f'{{{SVG_NS}}}defs')]
+    assert kept == ['style', 'g1', 'g2', 'c1']
@@ -0,0 +1,34 @@
+import io
+
+from svg_stream import SVG_NS, parse_svg_streaming
+
+
+def parse(body):
+    svg = (f'<svg xmlns="{SVG_NS}" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape">'
+           f'{body}</svg>').encode('utf-8')
+    return parse_svg_streaming(io.BytesIO(svg))
+
+
+def layer(name, hidden=False):
+    style = ' style="display:none"' if hidden else ''
+    return f'<g id="{name}" inkscape:label="{name}"{style}><rect width="1" height="1"/></g>'
+
+
+# 보이는 레이어가 있으면 숨김 레이어는 (앞에 있든 뒤에 있든) 파싱 중에 트리에서 빠집니다.
+def test_hidden_layers_are_dropped_while_parsing():
+    doc = parse(layer('h1', True) + layer('v1') + layer('h2', True) + layer('v2'))
+    assert [(l.name, l.visible) for l in doc.layers] == [('h1', False), ('v1', True), ('h2', False), ('v2', True)]
+    assert [l.element is not None for l in doc.layers] == [False, True, False, True]
+    assert [child.get('id') for child in doc.root] == ['v1', 'v2']
+
+
+# 보이는 레이어가 없으면 전체를 그리기 위해 숨김 레이어를 남깁니다.
+def test_hidden_layers_are_kept_without_visible_layers():
+    doc = parse(layer('h1', True) + layer('h2', True))
+    assert [g.get('id') for g in doc.groups()] == ['h1', 'h2']
+
+
+def test_only_layers_defs_and_referenced_elements_are_kept():
+    doc = parse(f'<metadata/><defs id="d"/><clipPath id="c"/><rect id="stray"/>{layer("v1")}<text id="t">x</text>')
+    assert [child.get('id') for child in doc.root] == ['d', 'c', 'v1']
+    assert doc.defs.get('id') == 'd'
@@ -0,0 +1,112 @@
+import base64
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+from PIL import Image
+
+from conftest import SAMPLE_SVG
+from vector_area import VectorAreaEngine
+
+SVG_HEAD = ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'width="200" height="100" viewBox="0 0 200 100">')
+
+
+def layer_bounds(body, defs=''):
+    root = ET.fromstring(f'{SVG_HEAD}<defs>{defs}</defs><g id="layer">{body}</g></svg>')
+    engine = VectorAreaEngine(root)
+    return engine, engine.layer_bounds(root.find('{http://www.w3.org/2000/svg}g'))
+
+
+def test_use_of_symbol_is_bounded_by_symbol_children():
+    _, bounds = layer_bounds('<use xlink:href="#sym" x="50" y="20"/>',
+                             '<symbol id="sym"><rect x="0" y="0" width="30" height="10"/></symbol>')
+    assert bounds == pytest.approx([50, 20, 80, 30])
+
+
+def test_use_of_symbol_applies_view_box():
+    engine, bounds = layer_bounds(
+        '<use href="#sym" x="10" y="10" width="40" height="40"/>',
+        '<symbol id="sym" viewBox="0 0 10 20"><rect x="0" y="0" width="10" height="20"/></symbol>')
+    # meet: 배율 2, 가로 가운데 정렬
+    assert bounds == pytest.approx([20, 10, 40, 50])
+    root = engine.root
+    area = engine.layer_area(root.find('{http://www.w3.org/2000/svg}g'))['area']
+    assert area == pytest.approx(20 * 40)
+
+
+def test_unbounded_elements_fall_back_to_page():
+    for body in ('<path d="M 10 10 L 20"/>',                      # 깨진 경로 데이터
+                 '<image xlink:href="data:image/png;base64,"/>',  # 크기 없는 이미지
+                 '<use xlink:href="other.svg#a"/>'):              # 외부 참조
+        _, bounds = layer_bounds(f'<rect x="0" y="0" width="5" height="5"/>{body}')
+        assert bounds == [0, 0, 200, 100], body
+
+
+def test_object_bounding_box_clip_path():
+    _, bounds = layer_bounds(
+        '<rect x="100" y="40" width="80" height="40" clip-path="url(#c)"/>',
+        '<clipPath id="c" clipPathUnits="objectBoundingBox"><rect x="0" y="0" width="0.5" height="0.5"/></clipPath>')
+    assert bounds == pytest.approx([100, 40, 140, 60])
+
+
+def test_empty_layer_has_no_bounds():
+    _, bounds = layer_bounds('<rect x="0" y="0" width="0" height="5"/>')
+    assert bounds is None
+
+
+# 면적 결과의 bbox 는 pixel 엔진과 같은 페이지 픽셀 정수입니다. (viewBox 단위가 아니라)
+def test_layer_area_bbox_is_in_page_pixels():
+    root = ET.fromstring('<svg xmlns="http://www.w3.org/2000/svg" width="200pt" height="100pt" viewBox="10 0 200 100">'
+                         '<g><rect x="20" y="10" width="50.5" height="20"/></g></svg>')
+    result = VectorAreaEngine(root).layer_area(root.find('{http://www.w3.org/2000/svg}g'))
+    assert result['bbox'] == [13, 13, 81, 40]
+    assert all(isinstance(v, int) for v in result['bbox'])
+
+
+def test_stroke_miterlimit_is_inherited():
+    _, bounds = layer_bounds('<g style="stroke-miterlimit:1"><rect x="10" y="10" width="10" height="10" '
+                             'stroke="#000" stroke-width="2"/></g>')
+    assert bounds == pytest.approx([9, 9, 21, 21])
+
+
+def test_nested_svg_applies_viewport():
+    engine, bounds = layer_bounds('<svg x="100" y="10" width="20" height="20" viewBox="0 0 10 10">'
+                                  '<rect x="5" y="0" width="20" height="5"/></svg>')
+    # viewBox 배율 2, 뷰포트 밖으로 나간 부분은 잘립니다.
+    assert bounds == pytest.approx([110, 10, 120, 20])
+    area = engine.layer_area(engine.root.find('{http://www.w3.org/2000/svg}g'))['area']
+    assert area == pytest.approx(10 * 10)
+
+
+def png_data_uri(image):
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def test_image_mask_clips_to_visible_pixels():
+    half = Image.new('L', (4, 2), 0)
+    half.paste(255, (0, 0, 2, 2))  # 왼쪽 절반만 보임
+    mask = (f'<mask id="m" maskUnits="userSpaceOnUse" x="0" y="0" width="1" height="1">'
+            f'<image width="1" height="1" preserveAspectRatio="none" xlink:href="{png_data_uri(half)}"/></mask>')
+    engine, bounds = layer_bounds(
+        '<image width="1" height="1" preserveAspectRatio="none" mask="url(#m)" xlink:href="data:,"'
+        ' transform="matrix(40,0,0,20,10,10)"/>', mask)
+    area = engine.layer_area(engine.root.find('{http://www.w3.org/2000/svg}g'))['area']
+    assert area == pytest.approx(20 * 20)
+    assert bounds == pytest.approx([10, 10, 50, 30])  # 경계 상자는 mask 로 줄이지 않습니다.
+
+
+# mask 영역(1x1)이 어긋난 Illustrator 그룹 mask 때문에 보이는 이미지가 빠지면 안 됩니다.
+def test_misplaced_mask_region_does_not_drop_sample_image():
+    root = ET.parse(SAMPLE_SVG).getroot()
+    engine = VectorAreaEngine(root)
+    layer = next(g for g in root.findall('{http://www.w3.org/2000/svg}g')
+                 if g.get('{http://www.inkscape.org/namespaces/inkscape}label') == 'Image')
+    assert engine.bounds(engine.ids['g397']) is not None
+    # 래스터화한 결과 (PDF, 96 DPI): 불투명 픽셀 293805, 경계 [186, 392, 2613, 1568)
+    assert engine.layer_bounds(layer)[3] == pytest.approx(1567.1, abs=0.5)
+    result = engine.layer_area(layer)
+    assert result['bbox'] == [186, 392, 2613, 1568]
+    assert result['area'] == pytest.approx(293805, rel=0.06)  # 가장자리 안티에일리어싱 차이
@@ -0,0 +1,123 @@
+# upload_stream.py
+# 업로드 검사와 스트리밍 읽기
+# - 파일 앞부분(수십 KB)만 보고 형식(PDF 호환 AI / PostScript AI), 페이지 수, 페이지 크기를 읽어
+#   변환 프로세스를 띄우기 전에 잘못된 파일을 거릅니다.
+# - UploadStream: 요청 본문을 조각 단위로 읽으면서 크기 제한 검사와 해시 계산을 함께 합니다.
+#   (받는 대로 변환기에 넘겨 전송과 변환이 겹치도록)
+import hashlib
+import re
+
+# Illustrator 대지 최대 크기 (227 인치 = 16344 pt, 여유를 둡니다)
+MAX_PAGE_PT = 16384
+
+_PDF_HEADER_RE = re.compile(rb'%PDF-(\d\.\d)')
+_PS_HEADER_RE = re.compile(rb'%!PS-Adobe-(\d\.\d)')
+# 페이지 트리 루트: << ... /Type /Pages ... /Count n ... >> (키 순서는 파일마다 다름)
+_PAGES_DICT_RE = re.compile(rb'<<(?:(?!<<|>>).)*?/Type\s*/Pages\b(?:(?!<<|>>).)*?>>', re.S)
+_COUNT_RE = re.compile(rb'/Count\s+(\d+)')
+_LINEARIZED_RE = re.compile(rb'/Linearized\b[^>]*?/N\s+(\d+)', re.S)
+_MEDIA_BOX_RE = re.compile(rb'/MediaBox\s*\[\s*(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s*\]')
+_PS_BOX_RE = re.compile(rb'%%(?:HiRes)?BoundingBox:\s*(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)')
+_PS_PAGES_RE = re.compile(rb'%%Pages:\s*(\d+)')
+
+
+class UploadError(ValueError):
+    status_code = 400
+
+
+class UploadTooLargeError(UploadError):
+    status_code = 413
+
+
+# 업로드를 다 받은 시점에 더 처리할 필요가 없어졌을 때 (예: 같은 파일의 결과가 캐시에 있음)
+class UploadCancelled(Exception):
+    pass
+
+
+def _box_size(match):
+    x0, y0, x1, y1 = (float(v) for v in match.groups())
+    return round(abs(x1 - x0), 3), round(abs(y1 - y0), 3)
+
+
+# --- 파일 앞부분 검사 ---
+# 압축된 객체 스트림 안에 있는 값은 읽을 수 없으므로 찾지 못한 값은 None 입니다.
+def inspect_ai_header(head):
+    # PDF 규격상 헤더는 처음 1024 바이트 안 어디에 있어도 됩니다.
+    pdf = _PDF_HEADER_RE.search(head, 0, 1024)
+    ps = None if pdf else _PS_HEADER_RE.search(head, 0, 1024)
+    if pdf is None and ps is None:
+        raise UploadError("Not an Illustrator file (no PDF or PostScript header)")
+
+    info = {"format": 'pdf' if pdf else 'postscript', "version": (pdf or ps).group(1).decode('ascii'),
+            "pages": None, "width_pt": None, "height_pt": None}
+    if pdf:
+        linearized = _LINEARIZED_RE.search(head)
+        pages_dict = _PAGES_DICT_RE.search(head)
+        count = _COUNT_RE.search(pages_dict.group(0)) if pages_dict else None
+        if linearized:
+            info["pages"] = int(linearized.group(1))
+        elif count:
+            info["pages"] = int(count.group(1))
+        box = _MEDIA_BOX_RE.search(head)
+    else:
+        pages = _PS_PAGES_RE.search(head)
+        info["pages"] = int(pages.group(1)) if pages else None
+        box = _PS_BOX_RE.search(head)
+    if box:
+        info["width_pt"], info["height_pt"] = _box_size(box)
+
+    if info["pages"] == 0:
+        raise UploadError("Document has no pages")
+    for key in ("width_pt", "height_pt"):
+        if info[key] is not None and not 0 < info[key] <= MAX_PAGE_PT:
+            raise UploadError(f"Invalid page size: {info['width_pt']} x {info['height_pt']} pt")
+    return info
+
+
+# --- 스트리밍 업로드 ---
+class UploadStream:
+    def __init__(self, stream, max_bytes, chunk_size=256 * 1024):
+        self._stream = stream
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        # 마지막 조각까지 읽은 뒤 호출됩니다. True 를 돌려주면 UploadCancelled 로 처리를 멈춥니다.
+        self.on_complete = None
+        self._head = b''
+        self._consumed = False
+
+    def _read(self, size):
+        chunk = self._stream.read(size)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"File too large (max {self.max_bytes // (1024 * 1024)} MB)")
+        self.sha256.update(chunk)
+        return chunk
+
+    # 앞부분만 미리 읽습니다. (읽은 데이터는 iter_chunks 에서 그대로 다시 나옵니다)
+    def peek(self, size):
+        while len(self._head) < size:
+            chunk = self._read(size - len(self._head))
+            if not chunk:
+                break
+            self._head += chunk
+        return self._head[:size]
+
+    def iter_chunks(self):
+        if self._consumed:
+            raise RuntimeError("Upload stream already consumed")
+        self._consumed = True
+        if self._head:
+            yield self._head
+            self._head = b''
+        while True:
+            chunk = self._read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        if self.on_complete is not None and self.on_complete(self):
+            raise UploadCancelled()
+
+    def read_all(self):
+        return b''.join(self.iter_chunks())
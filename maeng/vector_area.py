@@ -0,0 +1,805 @@
+# vector_area.py
+# 래스터화 없이 SVG 경로 도형으로 레이어 면적을 계산하는 엔진
+# - 곡선/호를 선분으로 펼치고, transform 적용, 도형 합집합, 캔버스로 자르기
+# - 결과 면적 단위는 문서 px² (Inkscape 기본 96 DPI 렌더링의 픽셀 수와 같은 단위)
+# - 한계: 텍스트(<text>)는 무시, mask는 이미지로만 된 것만 그 이미지의 보이는 픽셀(축소 근사)로 자르고
+#   나머지는 무시합니다. mask 영역(x/y/width/height)은 쓰지 않습니다.
+#   (Illustrator 가 내보낸 mask 는 영역이 1x1 처럼 어긋나 있어도 실제로는 그려집니다)
+#   symbol 의 preserveAspectRatio 는 none 과 기본값(xMidYMid meet)만 지원합니다.
+import base64
+import io
+import math
+import re
+import sys
+
+import numpy as np
+from PIL import Image
+from shapely import affinity
+from shapely.geometry import LineString, Polygon, box
+from shapely.ops import unary_union
+from shapely.validation import make_valid
+
+from svg_stream import resolve_lazy_payloads
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+# 곡선을 펼칠 때 허용 오차 (문서 단위)
+FLATTEN_TOLERANCE = 0.05
+
+# 이미지 mask 를 도형으로 바꿀 때 긴 변의 최대 픽셀 수
+MASK_RASTER_SIZE = 256
+
+# 길이 단위 → px (96 DPI 기준)
+UNIT_TO_PX = {'': 1.0, 'px': 1.0, 'pt': 96 / 72, 'pc': 16.0, 'mm': 96 / 25.4, 'cm': 96 / 2.54, 'in': 96.0}
+
+_NUMBER_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_PATH_TOKEN_RE = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+_URL_RE = re.compile(r'url\(\s*#([^)\s]+)\s*\)')
+
+# 직접 그려지지 않는 요소 (참조될 때만 사용)
+NON_RENDERED = {'defs', 'clipPath', 'mask', 'symbol', 'marker', 'pattern', 'linearGradient',
+                'radialGradient', 'filter', 'metadata', 'title', 'desc', 'style', 'script', 'namedview'}
+
+# 상속되는 스타일 속성
+INHERITED = ('fill', 'fill-rule', 'stroke', 'stroke-width', 'stroke-miterlimit', 'display', 'visibility',
+             'fill-opacity', 'stroke-opacity')
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def parse_length(value, default=0.0):
+    if value is None:
+        return default
+    match = re.match(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z%]*)', value)
+    if not match:
+        return default
+    return float(match.group(1)) * UNIT_TO_PX.get(match.group(2), 1.0)
+
+
+# --- transform 파싱: (a, b, c, d, e, f) 아핀 행렬 ---
+def multiply(m1, m2):
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2, b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2, b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1, b1 * e2 + d1 * f2 + f1,
+    )
+
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def parse_transform(value):
+    matrix = IDENTITY
+    if not value:
+        return matrix
+    for name, args in _TRANSFORM_RE.findall(value):
+        v = [float(x) for x in _NUMBER_RE.findall(args)]
+        if name == 'matrix' and len(v) == 6:
+            m = tuple(v)
+        elif name == 'translate':
+            m = (1, 0, 0, 1, v[0], v[1] if len(v) > 1 else 0)
+        elif name == 'scale':
+            m = (v[0], 0, 0, v[1] if len(v) > 1 else v[0], 0, 0)
+        elif name == 'rotate':
+            r = math.radians(v[0])
+            m = (math.cos(r), math.sin(r), -math.sin(r), math.cos(r), 0, 0)
+            if len(v) == 3:
+                m = multiply(multiply((1, 0, 0, 1, v[1], v[2]), m), (1, 0, 0, 1, -v[1], -v[2]))
+        elif name == 'skewX':
+            m = (1, 0, math.tan(math.radians(v[0])), 1, 0, 0)
+        elif name == 'skewY':
+            m = (1, math.tan(math.radians(v[0])), 0, 1, 0, 0)
+        else:
+            continue
+        matrix = multiply(matrix, m)
+    return matrix
+
+
+def apply_matrix(geom, m):
+    if geom is None or geom.is_empty or m == IDENTITY:
+        return geom
+    return affinity.affine_transform(geom, list(m))
+
+
+# --- 경로(d) 파싱 → 선분으로 펼친 하위 경로 목록 ---
+def _segments_for(length):
+    return max(2, min(128, int(math.ceil(math.sqrt(length / FLATTEN_TOLERANCE)))))
+
+
+def _arc_segments(sweep_angle, radius):
+    # 현과 호 사이 거리(sagitta)가 허용 오차 이하가 되는 분할 수
+    if radius <= FLATTEN_TOLERANCE:
+        return 4
+    step = 2 * math.acos(1 - FLATTEN_TOLERANCE / radius)
+    return max(4, min(256, int(math.ceil(abs(sweep_angle) / step))))
+
+
+def _cubic(p0, p1, p2, p3):
+    n = _segments_for(math.dist(p0, p1) + math.dist(p1, p2) + math.dist(p2, p3))
+    pts = []
+    for i in range(1, n + 1):
+        t = i / n
+        mt = 1 - t
+        pts.append((
+            mt ** 3 * p0[0] + 3 * mt * mt * t * p1[0] + 3 * mt * t * t * p2[0] + t ** 3 * p3[0],
+            mt ** 3 * p0[1] + 3 * mt * mt * t * p1[1] + 3 * mt * t * t * p2[1] + t ** 3 * p3[1],
+        ))
+    return pts
+
+
+def _quad(p0, p1, p2):
+    n = _segments_for(math.dist(p0, p1) + math.dist(p1, p2))
+    pts = []
+    for i in range(1, n + 1):
+        t = i / n
+        mt = 1 - t
+        pts.append((
+            mt * mt * p0[0] + 2 * mt * t * p1[0] + t * t * p2[0],
+            mt * mt * p0[1] + 2 * mt * t * p1[1] + t * t * p2[1],
+        ))
+    return pts
+
+
+def _arc(p0, rx, ry, phi, large_arc, sweep, p1):
+    # SVG 부록 F.6 의 끝점 → 중심점 매개변수 변환
+    if p0 == p1:
+        return []
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        return [p1]
+    cos_phi, sin_phi = math.cos(math.radians(phi)), math.sin(math.radians(phi))
+    dx, dy = (p0[0] - p1[0]) / 2, (p0[1] - p1[1]) / 2
+    x1p = cos_phi * dx + sin_phi * dy
+    y1p = -sin_phi * dx + cos_phi * dy
+    lam = (x1p / rx) ** 2 + (y1p / ry) ** 2
+    if lam > 1:
+        rx, ry = rx * math.sqrt(lam), ry * math.sqrt(lam)
+    num = rx * rx * ry * ry - rx * rx * y1p * y1p - ry * ry * x1p * x1p
+    den = rx * rx * y1p * y1p + ry * ry * x1p * x1p
+    coef = math.sqrt(max(0.0, num / den)) if den else 0.0
+    if large_arc == sweep:
+        coef = -coef
+    cxp, cyp = coef * rx * y1p / ry, -coef * ry * x1p / rx
+    cx = cos_phi * cxp - sin_phi * cyp + (p0[0] + p1[0]) / 2
+    cy = sin_phi * cxp + cos_phi * cyp + (p0[1] + p1[1]) / 2
+
+    def angle(ux, uy, vx, vy):
+        return math.atan2(ux * vy - uy * vx, ux * vx + uy * vy)
+
+    theta1 = angle(1, 0, (x1p - cxp) / rx, (y1p - cyp) / ry)
+    dtheta = angle((x1p - cxp) / rx, (y1p - cyp) / ry, (-x1p - cxp) / rx, (-y1p - cyp) / ry)
+    if not sweep and dtheta > 0:
+        dtheta -= 2 * math.pi
+    elif sweep and dtheta < 0:
+        dtheta += 2 * math.pi
+
+    n = _arc_segments(dtheta, max(rx, ry))
+    pts = []
+    for i in range(1, n + 1):
+        t = theta1 + dtheta * i / n
+        x, y = rx * math.cos(t), ry * math.sin(t)
+        pts.append((cos_phi * x - sin_phi * y + cx, sin_phi * x + cos_phi * y + cy))
+    pts[-1] = p1
+    return pts
+
+
+def parse_path(d):
+    tokens = _PATH_TOKEN_RE.findall(d or '')
+    subpaths = []
+    current = []
+    closed = []
+    pos = (0.0, 0.0)
+    start = (0.0, 0.0)
+    last_ctrl = None
+    last_cmd = ''
+    cmd = ''
+    i = 0
+
+    def take(n):
+        nonlocal i
+        values = [float(t) for t in tokens[i:i + n]]
+        i += n
+        if len(values) < n:
+            raise ValueError('truncated path data')
+        return values
+
+    def finish(is_closed):
+        nonlocal current
+        if len(current) > 1:
+            subpaths.append(current)
+            closed.append(is_closed)
+        current = []
+
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            cmd = token
+            i += 1
+            if cmd in 'Zz':
+                finish(True)
+                pos = start
+                last_ctrl, last_cmd = None, cmd
+                continue
+        elif not cmd:
+            raise ValueError('path data must start with a command')
+
+        rel = cmd.islower()
+        ox, oy = pos if rel else (0.0, 0.0)
+        c = cmd.upper()
+        if c != 'M' and not current:
+            current = [pos]  # Z 다음에 M 없이 이어지는 경우
+
+        if c == 'M':
+            x, y = take(2)
+            finish(False)
+            pos = start = (ox + x, oy + y)
+            current = [pos]
+            cmd = 'l' if rel else 'L'  # M 다음 좌표는 암시적 L
+            last_ctrl = None
+        elif c == 'L':
+            x, y = take(2)
+            pos = (ox + x, oy + y)
+            current.append(pos)
+            last_ctrl = None
+        elif c == 'H':
+            (x,) = take(1)
+            pos = (ox + x, pos[1])
+            current.append(pos)
+            last_ctrl = None
+        elif c == 'V':
+            (y,) = take(1)
+            pos = (pos[0], oy + y)
+            current.append(pos)
+            last_ctrl = None
+        elif c == 'C':
+            x1, y1, x2, y2, x, y = take(6)
+            p1, p2, p3 = (ox + x1, oy + y1), (ox + x2, oy + y2), (ox + x, oy + y)
+            current.extend(_cubic(pos, p1, p2, p3))
+            pos, last_ctrl = p3, p2
+        elif c == 'S':
+            x2, y2, x, y = take(4)
+            p1 = (2 * pos[0] - last_ctrl[0], 2 * pos[1] - last_ctrl[1]) if last_ctrl and last_cmd in 'CcSs' else pos
+            p2, p3 = (ox + x2, oy + y2), (ox + x, oy + y)
+            current.extend(_cubic(pos, p1, p2, p3))
+            pos, last_ctrl = p3, p2
+        elif c == 'Q':
+            x1, y1, x, y = take(4)
+            p1, p2 = (ox + x1, oy + y1), (ox + x, oy + y)
+            current.extend(_quad(pos, p1, p2))
+            pos, last_ctrl = p2, p1
+        elif c == 'T':
+            x, y = take(2)
+            p1 = (2 * pos[0] - last_ctrl[0], 2 * pos[1] - last_ctrl[1]) if last_ctrl and last_cmd in 'QqTt' else pos
+            p2 = (ox + x, oy + y)
+            current.extend(_quad(pos, p1, p2))
+            pos, last_ctrl = p2, p1
+        elif c == 'A':
+            rx, ry, phi, large_arc, sweep, x, y = take(7)
+            p1 = (ox + x, oy + y)
+            current.extend(_arc(pos, rx, ry, phi, bool(large_arc), bool(sweep), p1))
+            pos = p1
+            last_ctrl = None
+        else:
+            raise ValueError(f'unsupported path command: {cmd}')
+        last_cmd = cmd
+    finish(False)
+    return subpaths, closed
+
+
+# --- 하위 경로 → 채우기 도형 (fill-rule 반영) ---
+def _ring_polygon(points):
+    if len(points) < 3:
+        return None
+    poly = Polygon(points)
+    if not poly.is_valid:
+        poly = make_valid(poly)
+    return poly if not poly.is_empty and poly.area > 0 else None
+
+
+def _signed_area(points):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])) / 2
+
+
+def fill_geometry(subpaths, fill_rule):
+    rings = [(p, _ring_polygon(p)) for p in subpaths]
+    rings = [(p, poly) for p, poly in rings if poly is not None]
+    if not rings:
+        return None
+    if fill_rule == 'evenodd':
+        geom = rings[0][1]
+        for _, poly in rings[1:]:
+            geom = geom.symmetric_difference(poly)
+        return geom
+
+    # nonzero: 큰 도형부터 쌓고, 안쪽에 있으면서 방향이 반대인 하위 경로는 구멍으로 처리
+    rings.sort(key=lambda r: r[1].area, reverse=True)
+    geom = None
+    directions = []
+    for points, poly in rings:
+        direction = _signed_area(points) > 0
+        container = next((d for outer, d in directions if outer.contains(poly.representative_point())), None)
+        if geom is not None and container is not None and container != direction:
+            geom = geom.difference(poly)
+        else:
+            geom = poly if geom is None else geom.union(poly)
+        directions.append((poly, direction))
+    return geom
+
+
+# --- 스타일 처리 ---
+def element_style(elem, inherited):
+    style = dict(inherited)
+    for key in INHERITED + ('opacity', 'clip-path', 'mask'):
+        if elem.get(key) is not None:
+            style[key] = elem.get(key).strip()
+    for decl in (elem.get('style') or '').split(';'):
+        if ':' in decl:
+            key, value = decl.split(':', 1)
+            style[key.strip()] = value.strip()
+    return style
+
+
+def _is_zero(value):
+    try:
+        return float(value) == 0
+    except (TypeError, ValueError):
+        return False
+
+
+def _referenced_id(value):
+    match = _URL_RE.search(value or '')
+    return match.group(1) if match else None
+
+
+def _use_href(elem):
+    return (elem.get(XLINK_HREF) or elem.get('href') or '').strip()
+
+
+# <use> 가 가리키는 symbol 의 viewBox → use 영역 변환. 지원하지 않는 조합이면 None
+def _symbol_matrix(symbol, use):
+    vb = [float(v) for v in _NUMBER_RE.findall(symbol.get('viewBox') or '')]
+    if len(vb) != 4:
+        return IDENTITY
+    if not use.get('width') or not use.get('height') or vb[2] <= 0 or vb[3] <= 0:
+        return None  # 크기가 100% (부모 뷰포트) 인 경우
+    width, height = parse_length(use.get('width')), parse_length(use.get('height'))
+    sx, sy = width / vb[2], height / vb[3]
+    align = (symbol.get('preserveAspectRatio') or 'xMidYMid meet').split()
+    if align[0] == 'none':
+        return (sx, 0.0, 0.0, sy, -vb[0] * sx, -vb[1] * sy)
+    if align[0] != 'xMidYMid' or (len(align) > 1 and align[1] != 'meet'):
+        return None
+    scale = min(sx, sy)
+    return (scale, 0.0, 0.0, scale,
+            (width - vb[2] * scale) / 2 - vb[0] * scale, (height - vb[3] * scale) / 2 - vb[1] * scale)
+
+
+# 중첩 <svg> 의 (자식 → 부모 좌표 행렬, 뷰포트 사각형). 크기가 % 나 생략이면 뷰포트 사각형은 None,
+# 그때 viewBox 까지 있으면 부모 뷰포트 크기를 알아야 해서 행렬도 None 입니다.
+def _viewport(svg, style):
+    x, y = parse_length(svg.get('x')), parse_length(svg.get('y'))
+    sized = all(v and not v.strip().endswith('%') for v in (svg.get('width'), svg.get('height')))
+    if sized:
+        matrix = _symbol_matrix(svg, svg)
+    else:
+        matrix = None if len(_NUMBER_RE.findall(svg.get('viewBox') or '')) == 4 else IDENTITY
+    if matrix is not None:
+        matrix = multiply((1.0, 0.0, 0.0, 1.0, x, y), matrix)
+    viewport = None
+    if sized and (style.get('overflow') or svg.get('overflow') or 'hidden').strip() not in ('visible', 'auto'):
+        viewport = (x, y, x + parse_length(svg.get('width')), y + parse_length(svg.get('height')))
+    return matrix, viewport
+
+
+# mask 용 <image> 의 보이는 픽셀 영역 (부모 좌표). 읽을 수 없거나 비율 유지 배치면 None
+def _image_coverage(image):
+    href = resolve_lazy_payloads(_use_href(image))
+    w, h = parse_length(image.get('width')), parse_length(image.get('height'))
+    if not href.startswith('data:') or ';base64,' not in href or w <= 0 or h <= 0:
+        return None
+    if (image.get('preserveAspectRatio') or '').split()[:1] != ['none']:
+        return None
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(href.split(',', 1)[1])))
+        img.load()
+    except Exception:
+        return None
+    # 축소할 때 BOX 평균이라 보이는 픽셀이 하나라도 있던 칸은 0 이 되지 않습니다.
+    img.thumbnail((MASK_RASTER_SIZE, MASK_RASTER_SIZE), Image.BOX)
+    rgba = np.asarray(img.convert('RGBA'), dtype=np.float32)
+    luminance = rgba[..., 0] * 0.2125 + rgba[..., 1] * 0.7154 + rgba[..., 2] * 0.0721
+    visible = luminance * rgba[..., 3] > 0
+    rows, cols = visible.shape
+    boxes = []
+    for y in range(rows):
+        # 한 줄에서 이어진 보이는 픽셀 구간마다 사각형 하나
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], visible[y].view(np.int8), [0]))))
+        boxes.extend(box(x0, y, x1, y + 1) for x0, x1 in zip(edges[0::2], edges[1::2]))
+    if not boxes:
+        return Polygon()
+    x, y = parse_length(image.get('x')), parse_length(image.get('y'))
+    geom = apply_matrix(unary_union(boxes), (w / cols, 0.0, 0.0, h / rows, x, y))
+    return apply_matrix(geom, parse_transform(image.get('transform')))
+
+
+# objectBoundingBox 단위(0~1)를 경계 상자 (x0, y0, x1, y1) 로 옮기는 행렬
+def _bbox_matrix(b):
+    return (b[2] - b[0], 0.0, 0.0, b[3] - b[1], b[0], b[1])
+
+
+class VectorAreaEngine:
+    def __init__(self, root):
+        self.root = root
+        self.ids = {el.get('id'): el for el in root.iter() if el.get('id')}
+        self._clip_cache = {}
+        self._mask_cache = {}
+        self.canvas, self.scale = self._canvas()
+
+    def _canvas(self):
+        # viewBox 영역이 캔버스이며, width/height 와의 비율로 px 환산 배율을 구합니다.
+        vb = [float(v) for v in _NUMBER_RE.findall(self.root.get('viewBox') or '')]
+        width = parse_length(self.root.get('width'), vb[2] if len(vb) == 4 else 0)
+        height = parse_length(self.root.get('height'), vb[3] if len(vb) == 4 else 0)
+        if len(vb) != 4:
+            vb = [0, 0, width, height]
+        sx = width / vb[2] if vb[2] else 1.0
+        sy = height / vb[3] if vb[3] else 1.0
+        self.axis_scale = (sx, sy)
+        return box(vb[0], vb[1], vb[0] + vb[2], vb[1] + vb[3]), sx * sy
+
+    # 요소의 도형을 "부모 좌표계"로 반환합니다.
+    def geometry(self, elem, inherited=None):
+        style = element_style(elem, inherited or {'fill': '#000000'})
+        if style.get('display') == 'none' or style.get('visibility') in ('hidden', 'collapse'):
+            return None
+        if _is_zero(style.get('opacity')):
+            return None
+
+        tag = local_name(elem.tag)
+        if tag in NON_RENDERED:
+            return None
+        child_style = {k: style[k] for k in INHERITED if k in style}
+        if tag in ('g', 'a', 'switch'):
+            parts = [self.geometry(child, child_style) for child in elem]
+            parts = [p for p in parts if p is not None and not p.is_empty]
+            geom = unary_union(parts) if parts else None
+        elif tag == 'svg':
+            geom = self.viewport_geometry(elem, style, child_style)
+        elif tag == 'use':
+            target = self.ids.get(_referenced_id(f"url({_use_href(elem)})"))
+            if target is not None and local_name(target.tag) == 'symbol':
+                geom = self.symbol_geometry(target, elem, child_style)
+            else:
+                geom = self.geometry(target, child_style) if target is not None else None
+            if geom is not None:
+                geom = affinity.translate(geom, parse_length(elem.get('x')), parse_length(elem.get('y')))
+        elif tag == 'image':
+            x, y = parse_length(elem.get('x')), parse_length(elem.get('y'))
+            w, h = parse_length(elem.get('width')), parse_length(elem.get('height'))
+            geom = box(x, y, x + w, y + h) if w > 0 and h > 0 else None
+        else:
+            geom = self.shape_geometry(elem, tag, style)
+
+        if geom is None or geom.is_empty:
+            return None
+        geom = self._apply_clip(geom, style)
+        if geom is None or geom.is_empty:
+            return None
+        return apply_matrix(geom, parse_transform(elem.get('transform')))
+
+    # symbol 은 직접 그려지지 않고 <use> 로 참조될 때만 자식들이 그려집니다.
+    def symbol_geometry(self, symbol, use, inherited):
+        matrix = _symbol_matrix(symbol, use)
+        style = element_style(symbol, inherited)
+        if matrix is None or style.get('display') == 'none':
+            return None
+        child_style = {k: style[k] for k in INHERITED if k in style}
+        parts = [self.geometry(child, child_style) for child in symbol]
+        parts = [p for p in parts if p is not None and not p.is_empty]
+        return apply_matrix(unary_union(parts), matrix) if parts else None
+
+    # 중첩 <svg>: 자식들을 viewBox → 뷰포트로 옮기고 뷰포트 사각형으로 자릅니다.
+    def viewport_geometry(self, svg, style, inherited):
+        parts = [self.geometry(child, inherited) for child in svg]
+        parts = [p for p in parts if p is not None and not p.is_empty]
+        if not parts:
+            return None
+        matrix, viewport = _viewport(svg, style)
+        # 크기를 모르는 viewBox 는 변환 없이 근사합니다. (bounds 쪽은 페이지 전체로 봅니다)
+        geom = apply_matrix(unary_union(parts), matrix or IDENTITY)
+        return geom.intersection(box(*viewport)) if viewport else geom
+
+    def shape_geometry(self, elem, tag, style):
+        subpaths, closed = self.shape_points(elem, tag)
+        if not subpaths:
+            return None
+        parts = []
+        fill = style.get('fill', '#000000')
+        if fill != 'none' and not _is_zero(style.get('fill-opacity')):
+            filled = fill_geometry(subpaths, style.get('fill-rule', 'nonzero'))
+            if filled is not None:
+                parts.append(filled)
+        stroke = style.get('stroke', 'none')
+        width = parse_length(style.get('stroke-width'), 1.0)
+        if stroke != 'none' and width > 0 and not _is_zero(style.get('stroke-opacity')):
+            for points, is_closed in zip(subpaths, closed):
+                line = LineString(points + [points[0]] if is_closed else points)
+                parts.append(line.buffer(width / 2, cap_style='flat' if not is_closed else 'round', join_style='mitre'))
+        return unary_union(parts) if parts else None
+
+    @staticmethod
+    def shape_points(elem, tag):
+        if tag == 'path':
+            return parse_path(elem.get('d'))
+        if tag == 'rect':
+            x, y = parse_length(elem.get('x')), parse_length(elem.get('y'))
+            w, h = parse_length(elem.get('width')), parse_length(elem.get('height'))
+            if w <= 0 or h <= 0:
+                return [], []
+            return [[(x, y), (x + w, y), (x + w, y + h), (x, y + h)]], [True]
+        if tag in ('circle', 'ellipse'):
+            cx, cy = parse_length(elem.get('cx')), parse_length(elem.get('cy'))
+            rx = parse_length(elem.get('r') if tag == 'circle' else elem.get('rx'))
+            ry = parse_length(elem.get('r') if tag == 'circle' else elem.get('ry'))
+            if rx <= 0 or ry <= 0:
+                return [], []
+            n = _arc_segments(2 * math.pi, max(rx, ry))
+            return [[(cx + rx * math.cos(2 * math.pi * i / n), cy + ry * math.sin(2 * math.pi * i / n))
+                     for i in range(n)]], [True]
+        if tag in ('polygon', 'polyline'):
+            v = [float(x) for x in _NUMBER_RE.findall(elem.get('points') or '')]
+            points = list(zip(v[0::2], v[1::2]))
+            return ([points], [tag == 'polygon']) if len(points) > 1 else ([], [])
+        if tag == 'line':
+            p0 = (parse_length(elem.get('x1')), parse_length(elem.get('y1')))
+            p1 = (parse_length(elem.get('x2')), parse_length(elem.get('y2')))
+            return [[p0, p1]], [False]
+        # text 등 지원하지 않는 요소
+        return [], []
+
+    def _apply_clip(self, geom, style):
+        clip_id = _referenced_id(style.get('clip-path'))
+        if clip_id:
+            clip = self.clip_geometry(clip_id)
+            if clip is not None:
+                if self.ids[clip_id].get('clipPathUnits') == 'objectBoundingBox':
+                    clip = apply_matrix(clip, _bbox_matrix(geom.bounds))
+                geom = geom.intersection(clip)
+        mask_id = _referenced_id(style.get('mask'))
+        mask = self.mask_geometry(mask_id) if mask_id else None
+        if mask is not None:
+            masked = geom.intersection(mask)
+            # 마스크 내용이 전혀 겹치지 않으면 좌표가 어긋난 mask 로 보고 무시합니다. (렌더러는 그대로 그립니다)
+            if not masked.is_empty:
+                geom = masked
+        return geom
+
+    def clip_geometry(self, clip_id):
+        if clip_id not in self._clip_cache:
+            clip = self.ids.get(clip_id)
+            geom = None
+            if clip is not None:
+                parts = [self.geometry(child, {'fill': '#000000'}) for child in clip]
+                parts = [p for p in parts if p is not None and not p.is_empty]
+                geom = unary_union(parts) if parts else Polygon()
+                geom = apply_matrix(geom, parse_transform(clip.get('transform')))
+            self._clip_cache[clip_id] = geom
+        return self._clip_cache[clip_id]
+
+    # mask 안이 이미지뿐이면 밝기 × alpha 가 0 이 아닌 픽셀의 합집합. 그 밖의 mask 는 None (무시)
+    def mask_geometry(self, mask_id):
+        if mask_id not in self._mask_cache:
+            mask = self.ids.get(mask_id)
+            geom = None
+            if mask is not None and mask.get('maskContentUnits') != 'objectBoundingBox':
+                children = [child for child in mask if local_name(child.tag) not in NON_RENDERED]
+                if children and all(local_name(child.tag) == 'image' for child in children):
+                    parts = [_image_coverage(child) for child in children]
+                    if all(p is not None for p in parts):
+                        geom = unary_union(parts)
+            self._mask_cache[mask_id] = geom
+        return self._mask_cache[mask_id]
+
+    # 레이어(최상위 g)들의 합집합 중 캔버스 안 면적(px²)과
+    # 경계 상자(페이지 픽셀, 정수 - pixel 엔진의 bbox 와 같은 [x0, y0, x1, y1) 형식)
+    def layer_area(self, *groups):
+        parts = [self.geometry(g) for g in groups]
+        parts = [p for p in parts if p is not None and not p.is_empty]
+        geom = unary_union(parts) if parts else None
+        if geom is None or geom.is_empty:
+            return {"area": 0.0, "bbox": None}
+        geom = geom.intersection(self.canvas)
+        if geom.is_empty:
+            return {"area": 0.0, "bbox": None}
+        x0, y0, x1, y1 = self.page_bounds(geom.bounds)
+        return {"area": geom.area * self.scale, "bbox": [math.floor(x0), math.floor(y0), math.ceil(x1), math.ceil(y1)]}
+
+    # --- 경계 상자만 빠르게 계산 (도형 합집합 없이, 실제보다 작아지지 않게) ---
+    # 필터/마커/텍스트처럼 범위를 알 수 없는 요소가 있으면 UNBOUNDED 를 돌려줍니다.
+    def bounds(self, elem, inherited=None):
+        style = element_style(elem, inherited or {'fill': '#000000'})
+        if style.get('display') == 'none' or style.get('visibility') in ('hidden', 'collapse'):
+            return None
+        if _is_zero(style.get('opacity')):
+            return None
+
+        tag = local_name(elem.tag)
+        if tag in NON_RENDERED:
+            return None
+        if any(style.get(k) or elem.get(k) for k in UNBOUNDED_STYLES) or tag in UNBOUNDED_TAGS:
+            return UNBOUNDED
+        child_style = {k: style[k] for k in INHERITED if k in style}
+        if tag in ('g', 'a', 'switch'):
+            result = union_bounds(self.bounds(child, child_style) for child in elem)
+        elif tag == 'svg':
+            result = self.viewport_bounds(elem, style, child_style)
+        elif tag == 'use':
+            href = _use_href(elem)
+            if href and not href.startswith('#'):
+                return UNBOUNDED  # 외부 파일 참조
+            target = self.ids.get(href[1:])
+            if target is not None and local_name(target.tag) == 'symbol':
+                result = self.symbol_bounds(target, elem, child_style)
+            else:
+                result = self.bounds(target, child_style) if target is not None else None
+            if result not in (None, UNBOUNDED):
+                dx, dy = parse_length(elem.get('x')), parse_length(elem.get('y'))
+                result = (result[0] + dx, result[1] + dy, result[2] + dx, result[3] + dy)
+        elif tag == 'image':
+            if elem.get('width') is None or elem.get('height') is None:
+                return UNBOUNDED  # 원본 이미지 크기로 그려짐
+            x, y = parse_length(elem.get('x')), parse_length(elem.get('y'))
+            w, h = parse_length(elem.get('width')), parse_length(elem.get('height'))
+            result = (x, y, x + w, y + h) if w > 0 and h > 0 else None
+        elif tag in SHAPE_TAGS:
+            try:
+                result = self.shape_bounds(elem, tag, style)
+            except ValueError:
+                return UNBOUNDED  # 깨진 경로 데이터 (렌더러는 깨지기 전까지는 그립니다)
+        else:
+            return UNBOUNDED
+
+        if result in (None, UNBOUNDED):
+            return result
+        result = self._clip_bounds(result, style)
+        if result is None:
+            return None
+        return transform_bounds(result, parse_transform(elem.get('transform')))
+
+    def symbol_bounds(self, symbol, use, inherited):
+        matrix = _symbol_matrix(symbol, use)
+        if matrix is None:
+            return UNBOUNDED
+        style = element_style(symbol, inherited)
+        if style.get('display') == 'none':
+            return None
+        child_style = {k: style[k] for k in INHERITED if k in style}
+        result = union_bounds(self.bounds(child, child_style) for child in symbol)
+        return result if result in (None, UNBOUNDED) else transform_bounds(result, matrix)
+
+    def viewport_bounds(self, svg, style, inherited):
+        matrix, viewport = _viewport(svg, style)
+        if matrix is None:
+            return UNBOUNDED
+        result = union_bounds(self.bounds(child, inherited) for child in svg)
+        if result is UNBOUNDED:
+            return viewport or UNBOUNDED
+        if result is None:
+            return None
+        result = transform_bounds(result, matrix)
+        return intersect_bounds(result, viewport) if viewport else result
+
+    def shape_bounds(self, elem, tag, style):
+        subpaths, _ = self.shape_points(elem, tag)
+        points = [p for sub in subpaths for p in sub]
+        if not points:
+            return None
+        xs, ys = [p[0] for p in points], [p[1] for p in points]
+        pad = 0.0
+        if style.get('stroke', 'none') != 'none':
+            # 마이터 이음은 선 두께의 절반 × miterlimit(기본 4) 까지 튀어나올 수 있습니다.
+            pad = parse_length(style.get('stroke-width'), 1.0) / 2 * max(1.0, parse_length(style.get('stroke-miterlimit'), 4.0))
+        return (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def _clip_bounds(self, result, style):
+        clip = self.ids.get(_referenced_id(style.get('clip-path')) or '')
+        if clip is not None:
+            clip_box = union_bounds(self.bounds(child, {'fill': '#000000'}) for child in clip)
+            if clip_box is None:
+                return None
+            if clip_box is not UNBOUNDED:
+                matrix = parse_transform(clip.get('transform'))
+                if clip.get('clipPathUnits') == 'objectBoundingBox':
+                    # 요소 경계 상자 기준 (선 두께까지 넣은 상자라 실제보다 작아지지 않습니다)
+                    matrix = multiply(_bbox_matrix(result), matrix)
+                result = intersect_bounds(result, transform_bounds(clip_box, matrix))
+        return result
+
+    # 레이어들의 경계 상자를 페이지 픽셀(96 DPI, viewBox 원점 기준)로. 내용이 없으면 None
+    def layer_bounds(self, *groups):
+        result = union_bounds(self.bounds(g) for g in groups)
+        cx0, cy0, cx1, cy1 = self.canvas.bounds
+        if result is UNBOUNDED:
+            result = (cx0, cy0, cx1, cy1)
+        if result is not None:
+            result = intersect_bounds(result, (cx0, cy0, cx1, cy1))
+        if result is None:
+            return None
+        return self.page_bounds(result)
+
+    # 문서 단위 (x0, y0, x1, y1) → 페이지 픽셀(96 DPI, viewBox 원점 기준)
+    def page_bounds(self, b):
+        cx0, cy0 = self.canvas.bounds[:2]
+        sx, sy = self.axis_scale
+        return [(b[0] - cx0) * sx, (b[1] - cy0) * sy, (b[2] - cx0) * sx, (b[3] - cy0) * sy]
+
+
+# 경계 상자 (x0, y0, x1, y1) 연산
+UNBOUNDED = 'unbounded'
+UNBOUNDED_TAGS = {'text', 'foreignObject'}
+UNBOUNDED_STYLES = ('filter', 'marker', 'marker-start', 'marker-mid', 'marker-end')
+SHAPE_TAGS = {'path', 'rect', 'circle', 'ellipse', 'polygon', 'polyline', 'line'}
+
+
+def union_bounds(items):
+    result = None
+    for b in items:
+        if b is UNBOUNDED:
+            return UNBOUNDED
+        if b is None:
+            continue
+        result = b if result is None else (
+            min(result[0], b[0]), min(result[1], b[1]), max(result[2], b[2]), max(result[3], b[3]))
+    return result
+
+
+def intersect_bounds(a, b):
+    x0, y0, x1, y1 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+
+def transform_bounds(b, m):
+    a, bb, c, d, e, f = m
+    corners = [(x, y) for x in (b[0], b[2]) for y in (b[1], b[3])]
+    xs = [a * x + c * y + e for x, y in corners]
+    ys = [bb * x + d * y + f for x, y in corners]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def compute_layer_areas(root, groups):
+    engine = VectorAreaEngine(root)
+    return [engine.layer_area(g) for g in groups]
+
+
+# --- 픽셀 엔진과 비교: python vector_area.py svg_output/*.svg [--compare] ---
+if __name__ == '__main__':
+    import xml.etree.ElementTree as ET
+
+    files = [a for a in sys.argv[1:] if not a.startswith('--')]
+    compare = '--compare' in sys.argv
+    if compare:
+        from app_for_Render import create_pngs_for_layers, ns
+
+    for path in files:
+        root = ET.parse(path).getroot()
+        groups = [g for g in root.findall(f'{{{SVG_NS}}}g') if 'display:none' not in g.get('style', '')]
+        areas = compute_layer_areas(root, groups)
+        pixel_areas = [None] * len(groups)
+        if compare:
+            defs = root.find('svg:defs', ns)
+            _, layer_pngs = create_pngs_for_layers(groups, root.attrib, defs)
+            pixel_areas = [p['area'] for p in layer_pngs]
+        print(path)
+        for g, vec, pix in zip(groups, areas, pixel_areas):
+            label = g.get('{http://www.inkscape.org/namespaces/inkscape}label') or g.get('id')
+            line = f"  {label:<20} vector={vec['area']:>14.1f}"
+            if pix is not None:
+                diff = (vec['area'] - pix) / pix * 100 if pix else 0.0
+                line += f"  pixel={pix:>10d}  diff={diff:+.2f}%"
+            print(line)